@@ -1,13 +1,17 @@
-from utils import compile_teal, algod_client, \
+from utils import compile_program, algod_client, suggested_params, \
 	inner_asset_transfer, group_cond, \
 	deposit_cond, global_must_get, no_op_on_complete, send_wait_txn, \
-	groupTxns, app_address
+	app_address, dispatch
+from batch_sign import sign_group, with_signer
 from Vote_lib import has_voted, is_resolved, current_stake
 from algosdk.future.transaction import StateSchema, ApplicationCreateTxn, ApplicationNoOpTxn, PaymentTxn, AssetTransferTxn
 from pyteal import *
 
 # TODO: Go through and double check application array for including proper apps
 
+# Activate runs once, so it is left out and checked last
+METHOD_HOTNESS = {"Stake": 100, "Unstake": 80}
+
 @Subroutine(TealType.uint64)
 def no_vote(address, vote_i) -> Expr:
 	# Checks if there is no active vote by `address` in vote contract at index `vote_i`
@@ -171,18 +175,23 @@ def stake_program(asset_id, launcher):
 		Approve()
 	)
 	
-	program = Cond(
-		[Txn.application_id() == Int(0), Approve()],
-		[Txn.on_completion() == OnComplete.CloseOut, close_out(sender, asset_id)],
-		[Txn.on_completion() == OnComplete.OptIn, Approve()],
-		[Txn.on_completion() == OnComplete.DeleteApplication, Reject()],
-		[Txn.on_completion() == OnComplete.UpdateApplication, Reject()],
-		[Txn.application_args[0] == Bytes("Add_vote"), add_vote_app],
-		[Txn.application_args[0] == Bytes("Remove_vote"), remove_vote_app],
-		[Txn.application_args[0] == Bytes("Lock_vote"), lock_vote_app],
-		[Txn.application_args[0] == Bytes("Stake"), stake],
-		[Txn.application_args[0] == Bytes("Unstake"), unstake],
-		[Txn.application_args[0] == Bytes("Activate"), activate],
+	program = dispatch(
+		Approve(),
+		[
+			(OnComplete.CloseOut, close_out(sender, asset_id)),
+			(OnComplete.OptIn, Approve()),
+			(OnComplete.DeleteApplication, Reject()),
+			(OnComplete.UpdateApplication, Reject()),
+		],
+		[
+			("Add_vote", add_vote_app),
+			("Remove_vote", remove_vote_app),
+			("Lock_vote", lock_vote_app),
+			("Stake", stake),
+			("Unstake", unstake),
+			("Activate", activate),
+		],
+		METHOD_HOTNESS
 	)
 	
 	return program
@@ -191,19 +200,19 @@ def stake_clear_state(asset_id):
 	return close_out(Txn.sender(), asset_id)
 
 def add_vote_app(client, sender, new_vote_app_id, app_id):
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationNoOpTxn(sender['pk'], params, app_id, ["Add_vote", new_vote_app_id])
 	stxn = txn.sign(sender['sk'])
 	return send_wait_txn(client, stxn)
 
 def remove_vote_app(client, sender, app_id):
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationNoOpTxn(sender['pk'], params, app_id, ["Remove_vote"])
 	stxn = txn.sign(sender['sk'])
 	return send_wait_txn(client, stxn)
 
 def lock_vote_app(client, sender, app_id):
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationNoOpTxn(sender['pk'], params, app_id, ["Lock_vote"])
 	stxn = txn.sign(sender['sk'])
 	return send_wait_txn(client, stxn)
@@ -211,34 +220,38 @@ def lock_vote_app(client, sender, app_id):
 def stake(client, sender, app_id, asset_id, amount):
 
 	# Transfers the DAO token
-	params = client.suggested_params()
+	params = suggested_params(client)
 	transfer_txn = AssetTransferTxn(sender['address'], params, app_address(app_id), amount, asset_id)
 	
 	# Stakes
-	params = client.suggested_params()
+	params = suggested_params(client)
 	stake_txn = ApplicationNoOpTxn(sender['pk'], params, app_id, ["Stake"])
-	stxns = groupTxns(sender, transfer_txn, stake_txn)
-	return send_wait_txn(client, stxn, multi=True)
+	stxns = sign_group(with_signer([transfer_txn, stake_txn], sender['key']))
+	return send_wait_txn(client, stxns, multi=True)
 
 def unstake(client, sender, app_id, amount):
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationNoOpTxn(sender['address'], params, app_id, ["Unstake", amount])
 	stxn = txn.sign(sender['key'])
 	return send_wait_txn(client, stxn)
 
-def activate(client, sender, app_id, manager_app_id, dao_token_id):
-	# XXX: This must be called for proper functionality
+def activate_group(client, sender, app_id, manager_app_id, dao_token_id):
+	# Builds the signed activation group without sending it
 	
 	# Funds the account due to the activation
-	params = client.suggested_params()
+	params = suggested_params(client)
 	fund_txn = PaymentTxn(sender['address'], params, app_address(app_id), 200000)
 	
 	# Activation includes an inner transaction, so you must pay 2x the fees needed
-	params = client.suggested_params()
+	params = suggested_params(client)
 	params.flat_fee = True
 	params.fee = 2000
 	activate_txn = ApplicationNoOpTxn(sender['address'], params, app_id, ["Activate", manager_app_id], foreign_assets=[dao_token_id])
-	stxns = groupTxns(sender, fund_txn, activate_txn)
+	return sign_group(with_signer([fund_txn, activate_txn], sender['key']))
+
+def activate(client, sender, app_id, manager_app_id, dao_token_id):
+	# XXX: This must be called for proper functionality
+	stxns = activate_group(client, sender, app_id, manager_app_id, dao_token_id)
 	return send_wait_txn(client, stxns, multi=True)
 
 def create(client, sender, asset_id):
@@ -254,11 +267,11 @@ def create(client, sender, asset_id):
 	
 	# Compiles
 	asset_id = Int(asset_id)
-	main_program, _ = compile_teal(client, stake_program(asset_id, sender['address']), mode=Mode.Application, version=6)
-	clear_program, _ = compile_teal(client, stake_clear_state(asset_id), mode=Mode.Application, version=6)
+	main_program, _ = compile_program(client, stake_program, asset_id, sender['address'], mode=Mode.Application, version=6)
+	clear_program, _ = compile_program(client, stake_clear_state, asset_id, mode=Mode.Application, version=6)
 	
 	# Creates and sends the txn
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationCreateTxn(sender['address'], params, no_op_on_complete(), main_program, clear_program, global_schema, local_schema)
 	stxn = txn.sign(sender['key'])
 	send_wait_txn(client, stxn)
@@ -1,4 +1,4 @@
-from utils import compile_teal, algod_client, no_op_on_complete, send_wait_txn
+from utils import compile_program, algod_client, no_op_on_complete, send_wait_txn, suggested_params, dispatch
 from Vote_lib import cancel_vote_check, init_vote_core, close_vote_core, \
 	send_vote_core, current_stake
 from algosdk.future.transaction import StateSchema, ApplicationCreateTxn, ApplicationNoOpTxn
@@ -13,6 +13,8 @@ VOTE_LENGTH = Int(86400)
 MIN_VAL = 0
 MAX_VAL = 30
 STARTING_RESULT = Int(20)
+# Stakers vote on the fee each period, Init and Close run once per period
+METHOD_HOTNESS = {"Vote": 100, "Cancel": 20, "Init": 1, "Close": 1}
 
 def cancel_vote_seq(address):
 	old_vote_choice = App.localGet(address, Bytes("Choice"))
@@ -142,16 +144,21 @@ def vote_program(staking_id, assetTotal=ASSET_TOTAL, \
 	)
 	
 	# Switch for choosing path
-	program = Cond(
-		[Txn.application_id() == Int(0), on_creation],
-		[Txn.on_completion() == OnComplete.OptIn, Approve()],
-		[Txn.on_completion() == OnComplete.DeleteApplication, Reject()],
-		[Txn.on_completion() == OnComplete.UpdateApplication, Reject()],
-		[Txn.on_completion() == OnComplete.CloseOut, on_closeout],
-		[Txn.application_args[0] == Bytes("Vote"), send_vote],
-		[Txn.application_args[0] == Bytes("Cancel"), cancel_vote],
-		[Txn.application_args[0] == Bytes("Init"), init_vote],
-		[Txn.application_args[0] == Bytes("Close"), close_vote],
+	program = dispatch(
+		on_creation,
+		[
+			(OnComplete.OptIn, Approve()),
+			(OnComplete.DeleteApplication, Reject()),
+			(OnComplete.UpdateApplication, Reject()),
+			(OnComplete.CloseOut, on_closeout),
+		],
+		[
+			("Vote", send_vote),
+			("Cancel", cancel_vote),
+			("Init", init_vote),
+			("Close", close_vote),
+		],
+		METHOD_HOTNESS
 	)
 	
 	return program
@@ -165,7 +172,7 @@ def fee_clear_state():
 	)
 
 def send_vote(client, sender, app_id, vote):
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationNoOpTxn(sender['address'], params, app_id, ["Vote", vote])
 	stxn = txn.sign(sender['key'])
 	return send_wait_txn(client, stxn)
@@ -185,11 +192,11 @@ def create(client, sender, staking_id, min_val=MIN_VAL, max_val=MAX_VAL):
 	local_schema = StateSchema(local_ints, local_bytes)
 	
 	# Compiles
-	main_program, _ = compile_teal(client, vote_program(staking_id, min_val=Int(min_val), max_val=Int(max_val)), mode=Mode.Application, version=6)
-	clear_program, _ = compile_teal(client, fee_clear_state(), mode=Mode.Application, version=6)
+	main_program, _ = compile_program(client, vote_program, staking_id, min_val=Int(min_val), max_val=Int(max_val), mode=Mode.Application, version=6)
+	clear_program, _ = compile_program(client, fee_clear_state, mode=Mode.Application, version=6)
 	
 	# Creates and sends the txn
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationCreateTxn(sender['address'], params, no_op_on_complete(), main_program, clear_program, global_schema, local_schema)
 	# stxn = txn.sign(sender['key'])
 	# send_wait_txn(client, stxn)
@@ -2,7 +2,7 @@
 Voting utility methods
 '''
 
-from utils import global_must_get, increment_global, local_must_get, send_wait_txn
+from utils import global_must_get, increment_global, local_must_get, send_wait_txn, suggested_params
 from pyteal import Subroutine, TealType, Expr, Bytes, App, Seq, Assert, And, \
 	Global, Int, Not, Txn
 from algosdk.future.transaction import ApplicationNoOpTxn
@@ -139,19 +139,19 @@ def send_vote_core(valid_vote_check, new_vote, stake_app_id):
 # send_vote must be implemented in each vote instance
 
 def cancel_vote(client, sender, app_id):
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationNoOpTxn(sender['pk'], params, app_id, ["Cancel"])
 	stxn = txn.sign(sender['sk'])
 	return send_wait_txn(client, stxn)
 
 def init_vote(client, sender, app_id):
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationNoOpTxn(sender['pk'], params, app_id, ["Init"])
 	stxn = txn.sign(sender['sk'])
 	return send_wait_txn(client, stxn)
 
 def close_vote(client, sender, app_id):
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationNoOpTxn(sender['pk'], params, app_id, ["Close"])
 	stxn = txn.sign(sender['sk'])
 	return send_wait_txn(client, stxn)
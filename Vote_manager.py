@@ -1,4 +1,4 @@
-from utils import compile_teal, algod_client, no_op_on_complete, send_wait_txn
+from utils import compile_program, algod_client, no_op_on_complete, send_wait_txn, suggested_params, dispatch
 from Vote_lib import cancel_vote_check, init_vote_core, \
 	send_vote_core, close_vote_core, current_stake
 from algosdk.future.transaction import StateSchema, ApplicationCreateTxn, ApplicationNoOpTxn
@@ -8,6 +8,8 @@ from pyteal import *
 VOTE_INTERVAL = Int(7884000 - 86400)
 VOTE_LENGTH = Int(86400)
 STARTING_MANAGER = Addr("2AJW53433XKGFNFS4GNRSWSVQ5NWT4QQGPWEETJ7DQZVW63OVHR3MK4PYQ")
+# Stakers vote for the manager each period, Init and Close run once per period
+METHOD_HOTNESS = {"Vote": 100, "Cancel": 20, "Init": 1, "Close": 1}
 
 
 def cancel_vote_seq(address):
@@ -138,16 +140,21 @@ def manager_approval(staking_id, vote_interval=VOTE_INTERVAL, vote_length=VOTE_L
 		Approve(),
 	)
 	
-	program = Cond(
-		[Txn.application_id() == Int(0), on_creation],
-		[Txn.on_completion() == OnComplete.OptIn, Approve()],
-		[Txn.on_completion() == OnComplete.DeleteApplication, Reject()],
-		[Txn.on_completion() == OnComplete.UpdateApplication, Reject()],
-		[Txn.on_completion() == OnComplete.CloseOut, on_closeout],
-		[Txn.application_args[0] == Bytes("Vote"), send_vote],
-		[Txn.application_args[0] == Bytes("Cancel"), cancel_vote],
-		[Txn.application_args[0] == Bytes("Init"), init_vote],
-		[Txn.application_args[0] == Bytes("Close"), close_vote],
+	program = dispatch(
+		on_creation,
+		[
+			(OnComplete.OptIn, Approve()),
+			(OnComplete.DeleteApplication, Reject()),
+			(OnComplete.UpdateApplication, Reject()),
+			(OnComplete.CloseOut, on_closeout),
+		],
+		[
+			("Vote", send_vote),
+			("Cancel", cancel_vote),
+			("Init", init_vote),
+			("Close", close_vote),
+		],
+		METHOD_HOTNESS
 	)
 	
 	return program
@@ -161,7 +168,7 @@ def manager_clear_state():
 	)
 
 def send_vote(client, sender, vote_recipient):
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationNoOpTxn(sender['address'], params, app_id, ["Vote", vote_recipient])
 	stxn = txn.sign(sender['key'])
 	return send_wait_txn(client, stxn)
@@ -178,11 +185,11 @@ def create(client, sender, staking_id, init_manager=None):
 	local_schema = StateSchema(local_ints, local_bytes)
 	
 	# Compiles
-	main_program, _ = compile_teal(client, manager_approval(staking_id, init_manager=Addr(init_manager)), mode=Mode.Application, version=6)
-	clear_program, _ = compile_teal(client, manager_clear_state(), mode=Mode.Application, version=6)
+	main_program, _ = compile_program(client, manager_approval, staking_id, init_manager=Addr(init_manager), mode=Mode.Application, version=6)
+	clear_program, _ = compile_program(client, manager_clear_state, mode=Mode.Application, version=6)
 	
 	# Creates and sends the txn
-	params = client.suggested_params()
+	params = suggested_params(client)
 	txn = ApplicationCreateTxn(sender['address'], params, no_op_on_complete(), main_program, clear_program, global_schema, local_schema)
 	# stxn = txn.sign(sender['key'])
 	# send_wait_txn(client, stxn)
@@ -0,0 +1,153 @@
+# account_index.py
+
+'''
+Targeted account reads and an in-memory index of holdings.
+
+account_info returns every asset holding, app local state and created app
+or asset of an account, which is large and slow for accounts holding many
+of them. The helpers here use the narrow v2 endpoints instead:
+
+    GET /v2/accounts/{address}/assets/{asset-id}        one asset holding
+    GET /v2/accounts/{address}/applications/{app-id}    one app local state
+    GET /v2/accounts/{address}?exclude=all              balance and totals only
+
+AccountIndex caches what they return per address. Opt-in status and local
+state are kept until invalidate(), or until our own submissions record a
+change with set_holding()/set_local_state(), so repeated checks cost nothing.
+'''
+
+import base64
+import threading
+import weakref
+from algosdk import error
+
+# Not read yet, as opposed to a cached None for "not opted in"
+_MISSING = object()
+
+def _not_found(e):
+    return getattr(e, "code", None) == 404
+
+def account_summary(client, address):
+    # Balance, minimum balance and opt-in totals, without the asset and app lists
+    return client.algod_request("GET", "/accounts/" + address, params={"exclude": "all"})
+
+def asset_holding(client, address, asset_id):
+    # The account's holding of asset_id, or None if it has not opted in
+    try:
+        info = client.algod_request("GET", "/accounts/{}/assets/{}".format(address, asset_id))
+    except error.AlgodHTTPError as e:
+        if _not_found(e):
+            return None
+        raise
+    return info.get("asset-holding")
+
+def local_state(client, address, app_id):
+    """
+    The account's local state in app_id as {key: value} with keys decoded to
+    bytes and values as int or bytes, or None if it has not opted in.
+    """
+    try:
+        info = client.algod_request("GET", "/accounts/{}/applications/{}".format(address, app_id))
+    except error.AlgodHTTPError as e:
+        if _not_found(e):
+            return None
+        raise
+    state = info.get("app-local-state")
+    if state is None:
+        return None
+    return decode_state(state.get("key-value", []))
+
+def decode_state(key_values):
+    state = {}
+    for entry in key_values:
+        value = entry["value"]
+        state[base64.b64decode(entry["key"])] = value["uint"] if value["type"] == 2 else base64.b64decode(value["bytes"])
+    return state
+
+def min_balance(summary):
+    # Minimum balance of an account_summary(), as algod reports it or computed from the totals
+    if "min-balance" in summary:
+        return summary["min-balance"]
+    schema = summary.get("apps-total-schema", {})
+    opted = summary["total-apps-opted-in"] + summary["total-assets-opted-in"] + \
+        summary["total-created-assets"] + summary["total-created-apps"]
+    return 101000 + 100000*opted + 50000*schema.get("num-byte-slice", 0) + 28500*schema.get("num-uint", 0)
+
+class AccountIndex:
+    """
+    Per-address cache of asset holdings and app local states.
+
+    Entries are read on first use and kept until invalidate(). Record changes
+    made by our own confirmed submissions with set_holding() and
+    set_local_state() instead of reading them back.
+    """
+
+    def __init__(self, client):
+        # Held weakly so that index_for's entry goes away with the client
+        self._client = weakref.ref(client)
+        self._holdings = {}
+        self._local = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        client = self._client()
+        if client is None:
+            raise RuntimeError("the client of this index was garbage collected")
+        return client
+
+    def _cached(self, table, address, key, read):
+        with self._lock:
+            value = table.get(address, {}).get(key, _MISSING)
+        if value is _MISSING:
+            value = read(self.client, address, key)
+            with self._lock:
+                table.setdefault(address, {})[key] = value
+        return value
+
+    def holding(self, address, asset_id):
+        # The amount is as of the read, the index is meant for opt-in checks
+        return self._cached(self._holdings, address, asset_id, asset_holding)
+
+    def opted_in(self, address, asset_id):
+        return self.holding(address, asset_id) is not None
+
+    def local_state(self, address, app_id):
+        return self._cached(self._local, address, app_id, local_state)
+
+    def set_holding(self, address, asset_id, holding):
+        # holding is an asset-holding dict, or None for an account that opted out
+        with self._lock:
+            self._holdings.setdefault(address, {})[asset_id] = holding
+
+    def set_local_state(self, address, app_id, state):
+        # state is {key: value} as local_state() returns, or None after a close out
+        with self._lock:
+            self._local.setdefault(address, {})[app_id] = state
+
+    def invalidate(self, address=None, asset_id=None, app_id=None):
+        # Drops one entry, every entry of address, or everything
+        with self._lock:
+            if address is None:
+                self._holdings.clear()
+                self._local.clear()
+                return
+            if asset_id is None and app_id is None:
+                self._holdings.pop(address, None)
+                self._local.pop(address, None)
+                return
+            if asset_id is not None:
+                self._holdings.get(address, {}).pop(asset_id, None)
+            if app_id is not None:
+                self._local.get(address, {}).pop(app_id, None)
+
+_indexes = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+def index_for(client):
+    # One shared index per client, dropped along with the client
+    with _indexes_lock:
+        index = _indexes.get(client)
+        if index is None:
+            index = _indexes[client] = AccountIndex(client)
+        return index
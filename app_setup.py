@@ -7,17 +7,19 @@
 import base64
 from algosdk import encoding, mnemonic
 from algosdk.v2client import algod
-from algosdk.future.transaction import PaymentTxn, LogicSig, ApplicationCreateTxn, ApplicationCallTxn, StateSchema, OnComplete, calculate_group_id
+from algosdk.future.transaction import PaymentTxn, LogicSig, ApplicationCreateTxn, ApplicationCallTxn, StateSchema, OnComplete
 from price_validator import approval_program, clear_state_program
 from treasury import treasury_approval, treasury_clear_state
 from Stake import create as create_staking
-from Stake import activate as activate_staking
+from Stake import activate_group as activation_group
 from Vote_fee import create as create_fee
 from Vote_manager import create as create_manager
 from create_dao import create_dao_token
 from create_reserve import create_token, print_differences, finalize_reserve
 from pyteal import compileTeal, Mode, Int, Bytes
-from utils import algod_client, wait_for_confirmation, send_wait_txn
+from utils import algod_client, wait_for_confirmation, send_wait_txn, compile_program, suggested_params, get_params
+from txn_pipeline import Pipeline, wait_all
+from batch_sign import sign_group, with_signer
 
 def create_validator(cl, key, address, open_id, close_id, manager_id, stable_id):
     # declare application state storage (immutable)
@@ -29,20 +31,16 @@ def create_validator(cl, key, address, open_id, close_id, manager_id, stable_id)
     local_schema = StateSchema(local_ints, local_bytes)
 
     # compile program to TEAL assembly
-    compiled = compileTeal(approval_program(open_id, close_id, manager_id, stable_id), mode=Mode.Application, version=6)
-    node_response = cl.compile(compiled)
-    approval = base64.b64decode(node_response["result"])
+    approval, _ = compile_program(cl, approval_program, open_id, close_id, manager_id, stable_id, mode=Mode.Application, version=6)
 
     # compile program to TEAL assembly
-    compiled = compileTeal(clear_state_program(), mode=Mode.Application, version=6)
-    node_response = cl.compile(compiled)
-    clear_state = base64.b64decode(node_response["result"])
+    clear_state, _ = compile_program(cl, clear_state_program, mode=Mode.Application, version=6)
 
     # declare on_complete as NoOp
     on_complete = OnComplete.NoOpOC.real
 
     # get node suggested parameters
-    params = cl.suggested_params()
+    params = suggested_params(cl)
     params.flat_fee = True
     params.fee = 1000
 
@@ -79,20 +77,16 @@ def create_treasury(cl, key, address, manager_id, stable_id, dao_id, validator_i
     local_schema = StateSchema(local_ints, local_bytes)
 
     # compile program to TEAL assembly
-    compiled = compileTeal(treasury_approval(manager_id, stable_id, dao_id, validator_id), mode=Mode.Application, version=6)
-    node_response = cl.compile(compiled)
-    approval = base64.b64decode(node_response["result"])
+    approval, _ = compile_program(cl, treasury_approval, manager_id, stable_id, dao_id, validator_id, mode=Mode.Application, version=6)
 
     # compile program to TEAL assembly
-    compiled = compileTeal(treasury_clear_state(), mode=Mode.Application, version=6)
-    node_response = cl.compile(compiled)
-    clear_state = base64.b64decode(node_response["result"])
+    clear_state, _ = compile_program(cl, treasury_clear_state, mode=Mode.Application, version=6)
 
     # declare on_complete as NoOp
     on_complete = OnComplete.NoOpOC.real
 
     # get node suggested parameters
-    params = cl.suggested_params()
+    params = suggested_params(cl)
     params.flat_fee = True
     params.fee = 1000
 
@@ -111,24 +105,25 @@ def create_treasury(cl, key, address, manager_id, stable_id, dao_id, validator_i
     print("Treasury app-id:", app_id)
     app_addr = encoding.encode_address(encoding.checksum(b'appID'+(app_id).to_bytes(8, 'big')))
     print("Treasury App Address: " + app_addr)
+    return app_id, app_addr
 
+def fund_treasury(key, address, params, app_addr):
     txn = PaymentTxn(address, params, app_addr, 301000)
-    stxn = txn.sign(key)
-    txid = cl.send_transaction(stxn)
-    wait_for_confirmation(cl, txid)
-    return app_id, app_addr
+    return txn.sign(key)
 
-def opt_app(client, key, address, app_id, token1_id, token2_id):
+def opt_app_group(client, key, address, app_id, token1_id, token2_id):
     # Transaction parameters   
-    params = client.suggested_params()
+    params = suggested_params(client)
     params.flat_fee = True
     params.fee = 3000
     app_args = ["Opt_In".encode()]
 
     tx1 = ApplicationCallTxn(address, params, app_id, 0, app_args=app_args, foreign_assets=[token1_id, token2_id])
     stx1 = tx1.sign(key)
+    return [stx1]
 
-    signed_group = [stx1]
+def opt_app(client, key, address, app_id, token1_id, token2_id):
+    signed_group = opt_app_group(client, key, address, app_id, token1_id, token2_id)
     txid = client.send_transactions(signed_group)
     wait_for_confirmation(client, txid)
     
@@ -146,13 +141,12 @@ def main(key, address, user_key=None, user_address=None, liquid_key=None, liquid
     print("Staking app-id: " + str(staking_id))
     fee_txn1 = create_fee(cl, sender, staking_id)
     fee_txn2 = create_fee(cl, sender, staking_id)
+    # Both fee apps are otherwise identical transactions, which would share a txid
+    fee_txn1.note = b"Opening fee"
+    fee_txn2.note = b"Closing fee"
     man_txn = create_manager(cl, sender, staking_id, init_manager=address) 
     token_txn = create_token(key, address) 
-    gid = calculate_group_id([fee_txn1, fee_txn2, man_txn, token_txn])
-    stxns = []
-    for each in [fee_txn1, fee_txn2, man_txn, token_txn]:
-        each.group = gid
-        stxns.append(each.sign(key))
+    stxns = sign_group(with_signer([fee_txn1, fee_txn2, man_txn, token_txn], key))
     open_id, close_id, manager_id, stable_id = send_apps(stxns, cl)
     print("Opening Fee app-id: " + str(open_id)) 
     print("Closing Fee app-id: " + str(close_id)) 
@@ -160,11 +154,17 @@ def main(key, address, user_key=None, user_address=None, liquid_key=None, liquid
     print("Stable asa-id: " + str(stable_id))
     validator_id = create_validator(cl, key, address, open_id, close_id, manager_id, stable_id)
     treasury_id, treasury_addr = create_treasury(cl, key, address, manager_id, stable_id, dao_id, validator_id) 
-    activate_staking(cl, sender, staking_id, manager_id, dao_id)
-    opt_app(cl, key, address, treasury_id, stable_id, dao_id) 
+
+    # From here on nothing needs a new id, so independent steps share rounds
+    pipeline = Pipeline(cl)
+    funded = pipeline.submit(fund_treasury(key, address, get_params(cl), treasury_addr), task="Fund treasury")
+    activated = pipeline.submit(activation_group(cl, sender, staking_id, manager_id, dao_id), task="Activate staking")
+    opted = pipeline.submit(opt_app_group(cl, key, address, treasury_id, stable_id, dao_id), after=[funded], task="Treasury opt-in")
+    template, layout = print_differences(stable_id, validator_id, treasury_addr)
+    # The treasury receives half of the supply, so it has to be opted in first
+    finalize_reserve(stable_id, validator_id, treasury_addr, template, layout, key, address, pipeline=pipeline, after=[opted])
+    wait_all([funded, activated, opted])
     print("App Setup Complete!")
-    template = print_differences(stable_id, validator_id, treasury_addr)
-    finalize_reserve(stable_id, validator_id, treasury_addr, template, key, address)
     print("Reserve Setup Complete!")
     
 if __name__ == "__main__":
@@ -0,0 +1,161 @@
+# auction_planner.py
+
+'''
+Bid timing for auctions in progress.
+
+price_validator.liquidate accepts a bid once the GARD sent in Gtxn[2..4]
+covers max(GARD_DEBT, auction_price()), where auction_price falls from 115%
+of the debt by GARD_DEBT/2400 per second from UNIX_START. Gtxn[2] repays the
+debt to the reserve, and the devfee leg Gtxn[3] is a quarter (rounded down)
+of the user leg Gtxn[4]. The keeper receives the escrow's ALGO and pays the
+group's fees.
+
+Both the required payment and the cost of each leg fall over time, so each
+auction has one earliest timestamp from which bidding is profitable at our
+ALGO price. plan() computes it in closed form for every auction at once.
+Schedule holds those timestamps, so the keeper submits when they come due
+instead of re-checking every auction each round.
+'''
+
+import heapq
+from collections import namedtuple
+from liquidation_engine import auction_price_ref
+
+# Seconds for auction_price to fall by the whole debt
+DECAY_SECONDS = 2400
+# Fee of the 5 transaction liquidate group, paid by the keeper
+GROUP_FEE = 5000
+
+# at: earliest unix timestamp the bid is profitable, legs: (reserve, devfee, user)
+# GARD amounts that satisfy liquidate from `at` on, profit: GARD left over at `at`
+Plan = namedtuple("Plan", ["account", "at", "legs", "profit"])
+
+def payment_legs(debt, required):
+    """
+    Cheapest (reserve, devfee, user) GARD amounts with reserve == debt,
+    devfee == user // 4 and a total of at least `required`.
+    """
+    excess = max(required - debt, 0)
+    # user + user // 4 takes every value except 4 mod 5
+    k, r = divmod(excess, 5)
+    user = 4 * k + r if r < 4 else 4 * k + 4
+    return debt, user // 4, user
+
+def _affordable_excess(budget):
+    # Largest user + user // 4 that is at most budget
+    return budget - 1 if budget % 5 == 4 else budget
+
+def earliest_profitable(debt, balance, start, now, price, decimals, group_fee=GROUP_FEE, min_profit=0):
+    """
+    (timestamp, legs, profit) for the earliest time from `now` on at which
+    bidding on the auction leaves at least `min_profit` GARD, valuing the
+    collateral at `price` with `decimals`. None if it never will, or if the
+    contract would fail on this position.
+    """
+    required = auction_price_ref(debt, start, start)
+    if debt == 0 or required is None or balance <= group_fee:
+        return None
+    value = (balance - group_fee) * price // 10**decimals
+    budget = value - min_profit - debt
+    if budget < 0:
+        return None
+    # Latest point of the decay at which the legs fit the budget
+    allowed = debt + _affordable_excess(budget)
+    at = now
+    if required > allowed:
+        # floor(debt * elapsed / 2400) >= required - allowed
+        elapsed = -(-(required - allowed) * DECAY_SECONDS // debt)
+        at = max(now, start + elapsed)
+    required = max(debt, auction_price_ref(debt, start, at))
+    legs = payment_legs(debt, required)
+    return at, legs, value - sum(legs)
+
+def plan(auctions, now, price, decimals, group_fee=GROUP_FEE, min_profit=0):
+    """
+    Plans every auction in `auctions`, an iterable of (account, GARD_DEBT,
+    escrow balance, UNIX_START). Returns the Plans of the auctions that become
+    profitable, earliest first.
+    """
+    plans = []
+    for account, debt, balance, start in auctions:
+        result = earliest_profitable(debt, balance, start, now, price, decimals, group_fee, min_profit)
+        if result is not None:
+            plans.append(Plan(account, *result))
+    plans.sort(key=lambda p: (p.at, -p.profit))
+    return plans
+
+class Schedule:
+    """
+    Plans keyed by timestamp. Adding a plan for an account replaces its
+    previous plan, so re-planning after a price move only re-adds.
+
+    auction_price reads the latest block's timestamp, so pass the latest
+    block time (not the wall clock) to due().
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._plans = {}
+
+    def __len__(self):
+        return len(self._plans)
+
+    def add(self, plan):
+        self._plans[plan.account] = plan
+        heapq.heappush(self._heap, (plan.at, -plan.profit, id(plan), plan))
+
+    def replace(self, plans):
+        # Drops every plan and adds `plans`, for a fresh plan() of the whole book
+        self._heap = []
+        self._plans = {}
+        for p in plans:
+            self.add(p)
+
+    def cancel(self, account):
+        # Stale heap entries are skipped when they surface
+        self._plans.pop(account, None)
+
+    def next_time(self):
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def due(self, now):
+        # Removes and returns the plans due at `now`, most profitable first among equal times
+        plans = []
+        self._discard_stale()
+        while self._heap and self._heap[0][0] <= now:
+            plan = heapq.heappop(self._heap)[3]
+            del self._plans[plan.account]
+            plans.append(plan)
+            self._discard_stale()
+        return plans
+
+    def _discard_stale(self):
+        while self._heap and self._plans.get(self._heap[0][3].account) is not self._heap[0][3]:
+            heapq.heappop(self._heap)
+
+def check(auctions=300, seed=0):
+    # Compares earliest_profitable with a second by second search
+    import random
+    rng = random.Random(seed)
+    now = 1650000000
+    for _ in range(auctions):
+        debt = rng.randrange(1, 10**9)
+        start = now - rng.randrange(0, 600) | 1
+        price, decimals = rng.randrange(10**5, 3 * 10**6), 6
+        balance = debt * 10**decimals // price * rng.randrange(80, 130) // 100
+        min_profit = rng.randrange(0, debt // 50 + 1)
+        result = earliest_profitable(debt, balance, start, now, price, decimals, min_profit=min_profit)
+        expected = None
+        value = (balance - GROUP_FEE) * price // 10**decimals
+        for t in range(now, start + DECAY_SECONDS):
+            legs = payment_legs(debt, max(debt, auction_price_ref(debt, start, t)))
+            if value - sum(legs) >= min_profit:
+                expected = t, legs, value - sum(legs)
+                break
+        if result != expected:
+            raise AssertionError("debt {} start {}: planned {}, expected {}".format(debt, start, result, expected))
+    print("{} auctions ok".format(auctions))
+
+if __name__ == "__main__":
+    check()
@@ -0,0 +1,168 @@
+# batch_sign.py
+
+'''
+Parallel signing for large transaction batches.
+
+Group ids and signatures are computed in a process pool, a chunk of groups
+per task, so thousands of groups (airdrops, bulk staking, keeper
+liquidations) are not signed one after another in the calling thread.
+Transactions are signed with a private key or wrapped with a LogicSig in the
+same call, and every batch reports its throughput for sizing the pool.
+'''
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from algosdk.future.transaction import LogicSig, LogicSigAccount, LogicSigTransaction, calculate_group_id
+
+class BatchStats:
+
+    def __init__(self, workers, groups=0, transactions=0, seconds=0.0):
+        self.workers = workers
+        self.groups = groups
+        self.transactions = transactions
+        self.seconds = seconds
+
+    def add(self, other):
+        self.groups += other.groups
+        self.transactions += other.transactions
+        self.seconds += other.seconds
+
+    @property
+    def rate(self):
+        # Signed transactions per second
+        return self.transactions / self.seconds if self.seconds else 0.0
+
+    @property
+    def rate_per_worker(self):
+        return self.rate / max(self.workers, 1)
+
+    def __str__(self):
+        return "{} txns in {} groups, {:.3f}s, {:.0f} txn/s ({:.0f} per worker, {} workers)".format(
+            self.transactions, self.groups, self.seconds, self.rate, self.rate_per_worker, self.workers)
+
+def with_signer(txns, signer):
+    # Pairs every transaction of a group with the same signer
+    return [(txn, signer) for txn in txns]
+
+def _sign(txn, signer):
+    if isinstance(signer, (LogicSig, LogicSigAccount)):
+        return LogicSigTransaction(txn, signer)
+    return txn.sign(signer)
+
+def _assign_group(group):
+    txns = [txn for txn, _ in group]
+    if len(txns) > 1:
+        gid = calculate_group_id(txns)
+        for txn in txns:
+            txn.group = gid
+
+def sign_group(group, assign_group=True):
+    """
+    Signs one group given as a list of (txn, signer) pairs, where signer is a
+    private key or a LogicSig. Groups of more than one transaction get their
+    group id set first unless `assign_group` is False.
+    """
+    if assign_group:
+        _assign_group(group)
+    return [_sign(txn, signer) for txn, signer in group]
+
+def _sign_chunk(groups, assign_group):
+    # Runs in a worker
+    return [sign_group(group, assign_group) for group in groups]
+
+def _chunks(groups, size):
+    chunk = []
+    for group in groups:
+        chunk.append(group)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class BatchSigner:
+    """
+    Signs batches of groups across a process pool that is kept between batches.
+
+    Args:
+        workers     (int) - size of the process pool, defaults to the cpu count.
+                            0 signs in the calling thread
+        chunk_size  (int) - groups handed to a worker per task
+        max_pending (int) - tasks in flight at once, bounds memory use
+
+    Use as a context manager, or call close() when done.
+    """
+
+    def __init__(self, workers=None, chunk_size=128, max_pending=None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending or 4 * max(self.workers, 1)
+        self.pool = ProcessPoolExecutor(self.workers) if self.workers else None
+        self.stats = BatchStats(self.workers)
+        self.last = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def sign(self, groups, assign_group=True):
+        """
+        Returns the signed groups, in input order, for an iterable of groups
+        of (txn, signer) pairs. As with sign_group, the group ids are set on
+        the given transactions, also when the pool signs copies of them.
+        """
+        start = time.perf_counter()
+        signed = []
+        if self.pool is None:
+            signed = _sign_chunk(list(groups), assign_group)
+        else:
+            pending = deque()
+            for chunk in _chunks(groups, self.chunk_size):
+                if assign_group:
+                    for group in chunk:
+                        _assign_group(group)
+                pending.append(self.pool.submit(_sign_chunk, chunk, False))
+                if len(pending) >= self.max_pending:
+                    signed += pending.popleft().result()
+            while pending:
+                signed += pending.popleft().result()
+        self.last = BatchStats(self.workers, len(signed), sum(len(g) for g in signed), time.perf_counter() - start)
+        self.stats.add(self.last)
+        return signed
+
+def sign_groups(groups, workers=None, chunk_size=128, assign_group=True):
+    # One-off batch, returns (signed groups, BatchStats)
+    with BatchSigner(workers, chunk_size) as signer:
+        signed = signer.sign(groups, assign_group)
+        return signed, signer.last
+
+def benchmark(groups, worker_counts=(0, 1, 2, 4, 8), chunk_size=128):
+    # Signs the same batch with each pool size and returns {workers: BatchStats}
+    groups = list(groups)
+    results = {}
+    for workers in worker_counts:
+        with BatchSigner(workers, chunk_size) as signer:
+            # Warms the pool up before timing
+            signer.sign(groups[:max(workers, 1)])
+            signer.sign(groups)
+            results[workers] = signer.last
+    return results
+
+if __name__ == "__main__":
+    from algosdk import account
+    from algosdk.future.transaction import PaymentTxn, SuggestedParams
+
+    key, address = account.generate_account()
+    params = SuggestedParams(1000, 1, 1000, "SGO1GKSzyE7IEPItTxCByw9x8FmnrCDexi9/cOUJOiI=", flat_fee=True)
+    groups = [with_signer([PaymentTxn(address, params, address, i), PaymentTxn(address, params, address, i + 1)], key) for i in range(2000)]
+    for workers, stats in benchmark(groups).items():
+        print(stats)
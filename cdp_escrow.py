@@ -52,18 +52,21 @@ def cdp(user, cdp_id, stab_id, valid_id, devfee_add):
     
     # To liquidate accounts with insufficient collateral
     # arg_id = 1
-    # txn 0 -> Application call to price validator (application args["liquidate"])
-    # txn 1 -> payment to buyer
-    # txn 2 -> payment to reserve (in GARD)
-    # txn 3 -> payment to devfee address (in GARD)
-    # txn 4 -> payment to user address (in GARD)
+    # Indices are relative to the validator call at txn base, so a group can
+    # hold up to three liquidations
+    # txn base -> Application call to price validator (CloseOut)
+    # txn base + 1 -> payment to buyer
+    # txn base + 2 -> payment to reserve (in GARD)
+    # txn base + 3 -> payment to devfee address (in GARD)
+    # txn base + 4 -> payment to user address (in GARD)
+    base = Txn.group_index() - (Txn.type_enum() == TxnType.Payment)
     Liquidate = And(
-        Global.group_size() == Int(5),
-        Gtxn[0].on_completion() == OnComplete.CloseOut,
-        Gtxn[0].application_id() == validator_id,
-        Gtxn[0].assets[0] == stable_id,
-        Gtxn[3].asset_receiver() == devfee_address,
-        Gtxn[4].asset_receiver() == user_address
+        base + Int(5) <= Global.group_size(),
+        Gtxn[base].on_completion() == OnComplete.CloseOut,
+        Gtxn[base].application_id() == validator_id,
+        Gtxn[base].assets[0] == stable_id,
+        Gtxn[base + Int(3)].asset_receiver() == devfee_address,
+        Gtxn[base + Int(4)].asset_receiver() == user_address
     )
 
     # For user to redeem outstanding stable tokens for collateral w/ fee
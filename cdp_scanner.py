@@ -0,0 +1,73 @@
+# cdp_scanner.py
+
+'''
+Bulk discovery of CDP escrow addresses.
+
+Derives the escrow address of every (user, cdp_id) candidate with the
+template splice from reserve_logic.reserve (see cdp_template.py) and spreads
+the SHA-512/256 work over a process pool. Results are streamed, so millions
+of candidates can be checked against validator opt-in data without holding
+them all in memory.
+'''
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from cdp_template import CDPTemplate, MAX_CDP_ID
+
+# Per-process template, set by the pool initializer
+_template = None
+
+def _init_worker(template, layout):
+    global _template
+    _template = CDPTemplate(template, layout)
+
+def _derive_chunk(users, cdp_ids):
+    # Runs in a worker: derives every address for a chunk of users
+    return [(user, cdp_id, _template.address(user, cdp_id)) for user in users for cdp_id in cdp_ids]
+
+def _chunks(users, size):
+    chunk = []
+    for user in users:
+        chunk.append(user)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def scan(template, layout, users, cdp_ids=range(MAX_CDP_ID + 1), workers=None, chunk_size=64, max_pending=None):
+    """
+    Yields (user, cdp_id, escrow_address) for every user in `users` and every id in `cdp_ids`.
+
+    Args:
+        template    (str) - base64 CDP template from create_reserve.print_differences
+        layout      (TemplateLayout) - splice points saved with the template
+        users       (iterable) - user addresses, may be a generator
+        cdp_ids     (iterable) - cdp_ids to derive for each user
+        workers     (int) - size of the process pool, defaults to the cpu count
+        chunk_size  (int) - users handed to a worker per task
+        max_pending (int) - tasks in flight at once, bounds memory use
+
+    Results come back in input order.
+    """
+    cdp_ids = list(cdp_ids)
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 4 * workers
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(template, layout)) as pool:
+        pending = deque()
+        for chunk in _chunks(users, chunk_size):
+            pending.append(pool.submit(_derive_chunk, chunk, cdp_ids))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def find_positions(template, layout, users, opted_in, **kwargs):
+    """
+    Yields (user, cdp_id, escrow_address) for candidates whose escrow is in `opted_in`,
+    a set of addresses opted into the price validator.
+    """
+    for user, cdp_id, escrow in scan(template, layout, users, **kwargs):
+        if escrow in opted_in:
+            yield user, cdp_id, escrow
@@ -0,0 +1,137 @@
+# cdp_template.py
+
+'''
+Client-side derivation of CDP escrow programs and addresses.
+
+The reserve (reserve_logic.py) recomputes a position's escrow address by
+splicing the user's public key and the uvarint of the cdp_id into the
+template saved by create_reserve.print_differences, at the offsets measured
+by find_layout:
+
+    Sha512_256("Program" + x1 + user + x2 + Itovi(cdp_id) + x3)
+
+This module does the same splice in Python, so the escrow bytecode, LogicSig
+and address of any position can be built without compiling cdp() through algod.
+'''
+
+import base64
+import json
+import os
+from collections import namedtuple
+from algosdk import encoding
+from algosdk.future.transaction import LogicSig
+
+PREFIX = b"Program"
+
+# Where the user's public key and the cdp_id uvarint sit in "Program" + template,
+# measured by find_layout. The offsets move with the varint sizes of the ids the
+# template embeds, so a template is only ever used with the layout saved with it
+TemplateLayout = namedtuple("TemplateLayout", ["user_start", "id_start", "length"])
+
+# The cdp_id occupies a single byte in the template, and branches elsewhere in
+# the escrow jump over it, so only ids with a 1-byte uvarint give a valid program
+MAX_CDP_ID = 127
+
+# Template and layout saved by create_reserve.print_differences
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cdp_template.json")
+
+# Takes a uint64 and returns it as a uvarint, mirrors reserve_logic.Itovi
+def itovi(num):
+    output = bytearray()
+    while num >= 128:
+        output.append((num & 127) | 128)
+        num >>= 7
+    output.append(num)
+    return bytes(output)
+
+def find_layout(program, other, user, other_user, cdp_id, other_id):
+    """
+    Measures the splice points of a template from two compiled escrow programs
+    that differ only in the user (`user`, `other_user`) and the cdp_id
+    (`cdp_id`, `other_id`, two different ids up to MAX_CDP_ID).
+
+    Raises ValueError unless the programs differ exactly at one copy of the
+    user's key and one cdp_id byte.
+    """
+    program, other = PREFIX + program, PREFIX + other
+    if len(program) != len(other):
+        raise ValueError("Sample programs differ in length: {} and {}".format(len(program), len(other)))
+    if cdp_id == other_id or not 0 <= min(cdp_id, other_id) <= max(cdp_id, other_id) <= MAX_CDP_ID:
+        raise ValueError("Sample cdp_ids must differ and be between 0 and " + str(MAX_CDP_ID))
+
+    key, other_key = encoding.decode_address(user), encoding.decode_address(other_user)
+    user_start = program.find(key)
+    if user_start < 0 or program.find(key, user_start + 1) >= 0:
+        raise ValueError("User address must appear exactly once in the template")
+    user_end = user_start + len(key)
+    if other[user_start:user_end] != other_key:
+        raise ValueError("User address is at different offsets in the sample programs")
+
+    differences = [i for i in range(len(program)) if program[i] != other[i] and not user_start <= i < user_end]
+    if len(differences) != 1 or program[differences[0]:differences[0] + 1] != itovi(cdp_id) \
+            or other[differences[0]:differences[0] + 1] != itovi(other_id):
+        raise ValueError("Programs must differ only in the user address and a single cdp_id byte, "
+                         "found differences at " + str(differences))
+    return TemplateLayout(user_start, differences[0], len(program))
+
+def save_template(template, layout, path=TEMPLATE_FILE):
+    with open(path, "w") as f:
+        json.dump({"template": template, "layout": layout._asdict()}, f, indent=4)
+
+def load_template(path=TEMPLATE_FILE):
+    # Returns (template, layout) as saved by save_template
+    with open(path) as f:
+        saved = json.load(f)
+    return saved["template"], TemplateLayout(**saved["layout"])
+
+class CDPTemplate:
+    """Escrow program template for one deployment (stable_id, validator_id, devfee address)"""
+
+    def __init__(self, template, layout):
+        # template is the base64 program returned by create_reserve.print_differences
+        y = PREFIX + base64.b64decode(template)
+        if len(y) != layout.length:
+            raise ValueError("Incorrect template program length: " + str(len(y)))
+        self.template = template
+        self.layout = layout
+        # Constant bytes and the names of the values spliced between them, in program order
+        splices = sorted([(layout.user_start, 32, "user"), (layout.id_start, 1, "cdp_id")])
+        self.parts = []
+        offset = 0
+        for start, length, name in splices:
+            self.parts += [y[offset:start], name]
+            offset = start + length
+        self.parts.append(y[offset:])
+
+    @classmethod
+    def load(cls, path=TEMPLATE_FILE):
+        return cls(*load_template(path))
+
+    def splice(self, values):
+        # Joins the template parts, taking spliced values from `values` by name
+        return b"".join(values[part] if isinstance(part, str) else part for part in self.parts)
+
+    def _splice(self, user, cdp_id):
+        if not 0 <= cdp_id <= MAX_CDP_ID:
+            raise ValueError("cdp_id must be between 0 and " + str(MAX_CDP_ID))
+        return self.splice({"user": encoding.decode_address(user), "cdp_id": itovi(cdp_id)})
+
+    def program(self, user, cdp_id):
+        # Escrow bytecode of the position, without the "Program" prefix
+        return self._splice(user, cdp_id)[len(PREFIX):]
+
+    def address(self, user, cdp_id):
+        # Same hash the reserve computes in its Core branch
+        return encoding.encode_address(encoding.checksum(self._splice(user, cdp_id)))
+
+    def logicsig(self, user, cdp_id, arg_id):
+        # arg_id selects the branch of cdp_escrow.cdp, see the comments there
+        return LogicSig(self.program(user, cdp_id), args=[arg_id.to_bytes(8, 'big')])
+
+    def verify(self, client, user, cdp_id, stable_id, validator_id, devfee_addr):
+        # One-off check of the derived address against algod compiling cdp() directly
+        from cdp_escrow import cdp
+        from pyteal import compileTeal, Mode
+        compiled = compileTeal(cdp(user, cdp_id, stable_id, validator_id, devfee_addr), Mode.Signature, version=6)
+        response = client.compile(compiled)
+        return response['hash'] == self.address(user, cdp_id)
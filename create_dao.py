@@ -13,7 +13,7 @@ import base64
 from algosdk import account, mnemonic
 from algosdk.v2client import algod
 from algosdk.future.transaction import AssetConfigTxn
-from utils import algod_client, wait_for_confirmation
+from utils import algod_client, wait_for_confirmation, suggested_params
 
 # Creates GARD ASA, returns created asset id
 def create_dao_token(key, address):
@@ -22,7 +22,7 @@ def create_dao_token(key, address):
     cl = algod_client()
 
     # Transaction Parameters
-    params = cl.suggested_params()
+    params = suggested_params(cl)
     params.fee = 1000
     params.flat_fee = True
 
@@ -12,11 +12,15 @@ serve much purpose for interacting with GARD.
 import base64
 from algosdk import account, encoding, mnemonic
 from algosdk.v2client import algod
-from algosdk.future.transaction import PaymentTxn, LogicSig, LogicSigTransaction, AssetConfigTxn, AssetTransferTxn, calculate_group_id
+from algosdk.future.transaction import PaymentTxn, LogicSig, AssetConfigTxn, AssetTransferTxn
 from reserve_logic import reserve
 from cdp_escrow import cdp
+from cdp_template import CDPTemplate, find_layout, save_template, TEMPLATE_FILE
 from pyteal import compileTeal, Mode
-from utils import algod_client, wait_for_confirmation
+from utils import algod_client, wait_for_confirmation, compile_program, suggested_params
+import teal_asm
+from txn_pipeline import Pipeline, wait_all
+from batch_sign import sign_group, with_signer
 
 # Creates GARD ASA, returns created asset id
 def create_token(key, address):
@@ -25,7 +29,7 @@ def create_token(key, address):
     cl = algod_client()
 
     # Transaction Parameters
-    params = cl.suggested_params()
+    params = suggested_params(cl)
     params.fee = 1000
     params.flat_fee = True
 
@@ -50,69 +54,59 @@ def create_token(key, address):
     '''
     return txn
 
-def print_differences(stable_id, validator_id, devfee_addr):
-    cl = algod_client()
+def print_differences(stable_id, validator_id, devfee_addr, path=TEMPLATE_FILE, client=None):
+    # The template has to be algod's bytes
+    cl = client if client is not None else algod_client()
 
-    # Use this portion to get the template to be put into reserve_logic.py
-    program = cdp("RHN53AKL3IJGOIF5BJTIUFDOH4KMPR45XS4JM63W46PWMFFR3PPZXF5DOQ", 12, stable_id, validator_id, devfee_addr)
-    compiled = compileTeal(program, Mode.Signature, version=6)
-    response = cl.compile(compiled)
-    f = response["result"] 
-    test = "Program".encode() + base64.decodebytes(f.encode())
+    # Compiles the CDP template for this deployment and a second sample with another
+    # user and cdp_id, then measures where the two are spliced in (see cdp_template.find_layout)
+    user, cdp_id = "RHN53AKL3IJGOIF5BJTIUFDOH4KMPR45XS4JM63W46PWMFFR3PPZXF5DOQ", 12
+    other_user, other_id = "X3U6WGN4ZH4Z7HJMQ3ZYIPGEQSJK2XQW6RXQ35I4QSK5UZYN3JRJ3J74ZI", 116
+    logic, _ = compile_program(cl, cdp, user, cdp_id, stable_id, validator_id, devfee_addr, version=6)
+    f = base64.b64encode(logic).decode()
     print("CDP Template: " + f)
-    program = cdp("X3U6WGN4ZH4Z7HJMQ3ZYIPGEQSJK2XQW6RXQ35I4QSK5UZYN3JRJ3J74ZI", 116, stable_id, validator_id, devfee_addr)
-    compiled = compileTeal(program, Mode.Signature, version=6)
-    response = cl.compile(compiled)
-    f = response["result"] 
-    test1 = "Program".encode() + base64.decodebytes(f.encode()) 
-
-    '''
-    print(len(test), len(test1))
-    for i in range(len(test)):
-        if test[i] != test1[i]:
-            print(i)
-    '''
-
-    # Used to see where differences are between template and custom contract
-    if len(test) != 561 or len(test1) != len(test):
-        raise RuntimeError("Incorrect template program length: " + str(len(test)))
-    for i in range(len(test1)):
-        if test1[i] != test[i] and (test[i-1] == test1[i-1] or test[i+1] == test1[i+1]):
-            if i not in [30, 61, 455]:
-                raise RuntimeError("Incorrect template values")
-    return f
-    
-
-
-def finalize_reserve(stable_id, validator_id, devfee_addr, template, key, address):
+    other, _ = compile_program(cl, cdp, other_user, other_id, stable_id, validator_id, devfee_addr, version=6)
+
+    # teal_asm assembles the template for teal_cost and fake_algod, so it has to agree with algod here too
+    if teal_asm.assemble(compileTeal(cdp(user, cdp_id, stable_id, validator_id, devfee_addr), Mode.Signature, version=6)) != logic:
+        print("Warning: teal_asm does not reproduce algod's CDP template, record its outputs again with teal_asm.py --record")
+
+    layout = find_layout(logic, other, user, other_user, cdp_id, other_id)
+    print("CDP Template layout: " + str(layout))
+    # A third position, spliced from the template, has to match algod compiling it directly
+    if not CDPTemplate(f, layout).verify(cl, "FI6PQIJLOWYY45EHPOEKTRPC6UVLFJEQSVOY7NYZSPHRLOTG3P36XQZGWU", 73, stable_id, validator_id, devfee_addr):
+        raise RuntimeError("Incorrect template values")
+    # Saved for the client side (cdp_template.CDPTemplate.load)
+    if path:
+        save_template(f, layout, path)
+    return f, layout
+
+def finalize_reserve(stable_id, validator_id, devfee_addr, template, layout, key, address, pipeline=None, after=()):
     # Make a Client
     cl = algod_client()
 
+    # Steps are sent as soon as the ones they depend on confirm
+    # `after` holds futures the supply transfer must wait for (e.g. the treasury opt-in)
+    if pipeline is None:
+        pipeline = Pipeline(cl)
+
     # Broadcast transaction parameters
-    params = cl.suggested_params()
+    params = suggested_params(cl)
     params.flat_fee = True
     params.fee = 1000
 
     # Make Reserve account 
-    program = reserve(stable_id, validator_id, devfee_addr, template)
-    compiled = compileTeal(program, Mode.Signature, version=6)
-
     # Compile and get program logic and reserve address
-    response = cl.compile(compiled)
-    program, reserve_addr = response['result'], response['hash']
-    print("Reserve Logic: " + program)
+    logic2, reserve_addr = compile_program(cl, reserve, stable_id, validator_id, devfee_addr, template, layout, version=6)
+    reserve_addr = reserve_addr['pk']
+    print("Reserve Logic: " + base64.b64encode(logic2).decode())
     # print(reserve_addr)
-
-    # Convert to base64
-    logic2_str = program.encode()
-    logic2 = base64.decodebytes(logic2_str)
     print(len(logic2)) # Must be under 1000 bytes 
 
     # Fund Reserve
     unsigned_txn = PaymentTxn(address, params, reserve_addr, 201000)
     signed = unsigned_txn.sign(key)
-    txid = cl.send_transaction(signed)
-    wait_for_confirmation(cl, txid)
+    funded = pipeline.submit(signed, task="Fund reserve")
 
     # print("FUNDED!!!")
 
@@ -128,14 +122,8 @@ def finalize_reserve(stable_id, validator_id, devfee_addr, template, key, addres
     txn1 = PaymentTxn(address, params, address, 0)
     params.fee = 0
     txn2 = AssetTransferTxn(reserve_addr, params, reserve_addr, 0, stable_id)
-    g_id = calculate_group_id([txn1, txn2])
-    txn1.group = g_id
-    txn2.group = g_id
-    stxn1 = txn1.sign(key)
-    stxn2 = LogicSigTransaction(txn2, lsig)
-    signed_group = [stxn1, stxn2]
-    txid = cl.send_transactions(signed_group)
-    wait_for_confirmation(cl, txid)
+    signed_group = sign_group([(txn1, key), (txn2, lsig)])
+    opted = pipeline.submit(signed_group, after=[funded], task="Reserve opt-in")
 
     # print("Stable Opted")
 
@@ -143,22 +131,16 @@ def finalize_reserve(stable_id, validator_id, devfee_addr, template, key, addres
     params.fee = 1000
     txn1 = AssetTransferTxn(address, params, reserve_addr, 18400000000000000000//2, stable_id)
     txn2 = AssetTransferTxn(address, params, devfee_addr, 18400000000000000000//2, stable_id)
-
-    gid = calculate_group_id([txn1, txn2])
-    txn1.group = gid
-    txn2.group = gid
-    stxn1 = txn1.sign(key)
-    stxn2 = txn2.sign(key)
-    txid = cl.send_transactions([stxn1, stxn2])
-    wait_for_confirmation(cl, txid)
+    transferred = pipeline.submit(sign_group(with_signer([txn1, txn2], key)), after=[opted, *after], task="Supply transfer")
 
     
     # print("Coins transferred!")
 
-    # Set the token reserve to the reserve account
+    # Set the token reserve to the reserve account, independent of the steps above
     txn1 = AssetConfigTxn(address, params, index=stable_id, manager="", reserve=reserve_addr, strict_empty_address_check=False)
     stxn1 = txn1.sign(key)
-    txid = cl.send_transaction(stxn1)
-    wait_for_confirmation(cl, txid)
+    configured = pipeline.submit(stxn1, task="Asset config")
+
+    wait_all([funded, opted, transferred, configured])
 
     # print("Asset Config Updated")
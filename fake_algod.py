@@ -0,0 +1,700 @@
+# fake_algod.py
+
+'''
+In-process stand-in for algod, for benchmarking without a live network.
+
+Serves the v2 endpoints the deployment and user flows call (suggested
+params, send, pending info, status, wait-for-block-after, blocks in msgpack,
+account info with its exclude projection, account-asset and
+account-application info, application and asset info, compile) from a simple
+ledger. Rounds advance on
+a fixed clock, or only when advance() is called, and every request can be
+delayed, jittered or failed at configured rates with a seeded generator so
+runs are repeatable.
+
+The ledger tracks balances, asset holdings, app creation and opt-ins, fees
+and minimum balances. TEAL is not evaluated: LogicSigs and app calls are
+accepted as long as the transaction itself is valid, and inner transactions
+are not simulated. Since apps opt their accounts in to assets with inner
+transactions, app accounts are opted in to an asset on first receipt.
+
+Compile returns teal_asm's bytes, not algod's: they only match where teal_asm
+has been checked against algod (see teal_asm.py --check), so templates and
+addresses compiled here prove nothing about the deployed ones.
+
+Point the flows at it with GARD_ALGOD_ADDRESS (see utils.algod_client), or
+run it standalone with `python fake_algod.py --port 4001`.
+'''
+
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import msgpack
+from algosdk import encoding
+from algosdk.future.transaction import PaymentTxn, AssetTransferTxn, AssetConfigTxn, ApplicationCallTxn, OnComplete
+import teal_asm
+
+GENESIS_ID = "fakenet-v1"
+GENESIS_HASH = base64.b64encode(b"gard-fake-algod-genesis-hash-000").decode()
+CONSENSUS_VERSION = "fake-consensus-v1"
+MIN_FEE = 1000
+FIRST_ID = 700000000
+# Timestamp of round 0, block timestamps follow from it and the round so runs are repeatable
+GENESIS_TIME = 1650000000
+MIN_BALANCE = 100000
+# Per schema entry, as in consensus
+UINT_COST = 28500
+BYTES_COST = 50000
+
+class LedgerError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def app_address(app_id):
+    return encoding.encode_address(encoding.checksum(b'appID' + app_id.to_bytes(8, 'big')))
+
+def _b64(value):
+    return base64.b64encode(value).decode() if value else None
+
+class Ledger:
+
+    def __init__(self, genesis=None, start_round=1, default_balance=0, genesis_time=GENESIS_TIME, block_time=1):
+        self.round = start_round
+        self.default_balance = default_balance
+        self.genesis_time = genesis_time
+        self.block_time = block_time
+        self.accounts = {}
+        self.assets = {}
+        self.apps = {}
+        self.app_accounts = set()
+        # Mainnet sized ids, so programs embedding them assemble to their mainnet length
+        self.next_id = FIRST_ID
+        # (txid, signed transaction) waiting for the next round
+        self.pool = []
+        self.txns = {}
+        self.blocks = {}
+        self._seal([])
+        for address, amount in (genesis or {}).items():
+            self.fund(address, amount)
+
+    # Accounts
+
+    def _new_account(self, address, amount):
+        return {"amount": amount, "assets": {}, "local": {}, "apps": set(), "created_assets": set()}
+
+    def fund(self, address, amount):
+        account = self.accounts.setdefault(address, self._new_account(address, 0))
+        account["amount"] += amount
+
+    def _get(self, address, journal):
+        # Every account a group touches is saved first so a failed group can be rolled back
+        if address not in journal:
+            account = self.accounts.get(address)
+            journal[address] = None if account is None else _copy_account(account)
+        account = self.accounts.get(address)
+        if account is None:
+            account = self.accounts[address] = self._new_account(address, self.default_balance)
+        return account
+
+    def min_balance(self, account):
+        total = MIN_BALANCE * (1 + len(account["assets"]) + len(account["local"]))
+        for app_id in account["apps"]:
+            app = self.apps[app_id]
+            total += MIN_BALANCE * (1 + app["extra_pages"])
+            total += UINT_COST * app["global_schema"][0] + BYTES_COST * app["global_schema"][1]
+        for app_id in account["local"]:
+            schema = self.apps[app_id]["local_schema"] if app_id in self.apps else (0, 0)
+            total += UINT_COST * schema[0] + BYTES_COST * schema[1]
+        return total
+
+    # Transactions
+
+    def submit(self, stxns):
+        """Validates and applies a group, returns its txids. Raises LedgerError if rejected"""
+        txids = [stxn.get_txid() for stxn in stxns]
+        for i, txid in enumerate(txids):
+            if txid in self.txns or txid in txids[:i]:
+                raise LedgerError("transaction already in ledger: " + txid)
+        txns = [stxn.transaction for stxn in stxns]
+        for txn in txns:
+            if not txn.first_valid_round <= self.round + 1 <= txn.last_valid_round:
+                raise LedgerError("txn dead: round {} outside of {}--{}".format(self.round + 1, txn.first_valid_round, txn.last_valid_round))
+        if len(txns) > 1:
+            group = txns[0].group
+            if group is None or any(txn.group != group for txn in txns):
+                raise LedgerError("transactionGroup: incomplete group")
+        if sum(txn.fee for txn in txns) < MIN_FEE * len(txns):
+            raise LedgerError("txgroup had {} in fees, which is less than the minimum {}".format(sum(txn.fee for txn in txns), MIN_FEE * len(txns)))
+
+        journal = {}
+        created = [None] * len(txns)
+        next_id, apps, assets = self.next_id, dict(self.apps), dict(self.assets)
+        try:
+            for i, txn in enumerate(txns):
+                created[i] = self._apply(txn, journal)
+            for address in journal:
+                account = self.accounts.get(address)
+                if account is not None and account["amount"] < self.min_balance(account):
+                    raise LedgerError("account {} balance {} below min {}".format(address, account["amount"], self.min_balance(account)))
+        except LedgerError:
+            for address, account in journal.items():
+                if account is None:
+                    self.accounts.pop(address, None)
+                else:
+                    self.accounts[address] = account
+            self.next_id, self.apps, self.assets = next_id, apps, assets
+            raise
+        for txid, stxn, index in zip(txids, stxns, created):
+            txn = stxn.transaction
+            info = {"pool-error": "", "txn": {"txn": {"type": txn.type, "snd": txn.sender}}}
+            if index is not None:
+                info[index[0]] = index[1]
+            self.txns[txid] = info
+            self.pool.append((txid, stxn))
+        return txids
+
+    def _allocate(self):
+        self.next_id += 1
+        return self.next_id
+
+    def _apply(self, txn, journal):
+        sender = self._get(txn.sender, journal)
+        if sender["amount"] < txn.fee:
+            raise LedgerError("overspend: {} cannot pay fee {}".format(txn.sender, txn.fee))
+        sender["amount"] -= txn.fee
+        if isinstance(txn, PaymentTxn):
+            return self._pay(txn, sender, journal)
+        if isinstance(txn, AssetTransferTxn):
+            return self._transfer(txn, sender, journal)
+        if isinstance(txn, AssetConfigTxn):
+            return self._configure(txn, sender, journal)
+        if isinstance(txn, ApplicationCallTxn):
+            return self._call(txn, sender, journal)
+        # Key registration and freezes only pay the fee
+
+    def _pay(self, txn, sender, journal):
+        if sender["amount"] < txn.amt:
+            raise LedgerError("overspend: {} tried to spend {}".format(txn.sender, txn.amt))
+        sender["amount"] -= txn.amt
+        self._get(txn.receiver, journal)["amount"] += txn.amt
+        if txn.close_remainder_to:
+            if sender["assets"] or sender["local"] or sender["apps"]:
+                raise LedgerError("cannot close account {} with holdings".format(txn.sender))
+            self._get(txn.close_remainder_to, journal)["amount"] += sender["amount"]
+            del self.accounts[txn.sender]
+
+    def _transfer(self, txn, sender, journal):
+        asset = self.assets.get(txn.index)
+        if asset is None:
+            raise LedgerError("asset {} does not exist".format(txn.index))
+        source = txn.revocation_target or txn.sender
+        if txn.revocation_target and txn.sender != asset["clawback"]:
+            raise LedgerError("{} is not the clawback of asset {}".format(txn.sender, txn.index))
+        if txn.amount == 0 and txn.receiver == txn.sender and not txn.close_assets_to:
+            # Opt-in
+            sender["assets"].setdefault(txn.index, 0)
+            return
+        holder = self._get(source, journal)
+        receiver = self._get(txn.receiver, journal)
+        if txn.index not in holder["assets"]:
+            raise LedgerError("asset {} missing from {}".format(txn.index, source))
+        if txn.index not in receiver["assets"] and txn.receiver in self.app_accounts:
+            receiver["assets"][txn.index] = 0
+        if txn.index not in receiver["assets"]:
+            raise LedgerError("asset {} missing from {}".format(txn.index, txn.receiver))
+        if holder["assets"][txn.index] < txn.amount:
+            raise LedgerError("underflow on subtracting {} from sender amount {}".format(txn.amount, holder["assets"][txn.index]))
+        holder["assets"][txn.index] -= txn.amount
+        receiver["assets"][txn.index] += txn.amount
+        if txn.close_assets_to:
+            closer = self._get(txn.close_assets_to, journal)
+            if txn.index not in closer["assets"]:
+                raise LedgerError("asset {} missing from {}".format(txn.index, txn.close_assets_to))
+            closer["assets"][txn.index] += holder["assets"].pop(txn.index)
+
+    def _configure(self, txn, sender, journal):
+        if not txn.index:
+            asset_id = self._allocate()
+            self.assets[asset_id] = {
+                "creator": txn.sender, "total": txn.total, "decimals": txn.decimals,
+                "default-frozen": bool(txn.default_frozen), "unit-name": txn.unit_name,
+                "name": txn.asset_name, "url": txn.url, "metadata-hash": _b64(txn.metadata_hash),
+                "manager": txn.manager, "reserve": txn.reserve, "freeze": txn.freeze, "clawback": txn.clawback,
+            }
+            sender["assets"][asset_id] = txn.total
+            sender["created_assets"].add(asset_id)
+            return ("asset-index", asset_id)
+        asset = self.assets.get(txn.index)
+        if asset is None:
+            raise LedgerError("asset {} does not exist".format(txn.index))
+        if txn.sender != asset["manager"]:
+            raise LedgerError("{} is not the manager of asset {}".format(txn.sender, txn.index))
+        addresses = {"manager": txn.manager, "reserve": txn.reserve, "freeze": txn.freeze, "clawback": txn.clawback}
+        if not any(addresses.values()):
+            creator = self._get(asset["creator"], journal)
+            if creator["assets"].get(txn.index) != asset["total"]:
+                raise LedgerError("cannot destroy asset {} while it is held by others".format(txn.index))
+            del creator["assets"][txn.index]
+            creator["created_assets"].discard(txn.index)
+            del self.assets[txn.index]
+            return
+        self.assets[txn.index] = dict(asset, **{k: v or None for k, v in addresses.items()})
+
+    def _call(self, txn, sender, journal):
+        if not txn.index:
+            app_id = self._allocate()
+            self.apps[app_id] = {
+                "creator": txn.sender, "approval": txn.approval_program, "clear": txn.clear_program,
+                "global_schema": _schema(txn.global_schema), "local_schema": _schema(txn.local_schema),
+                "extra_pages": txn.extra_pages or 0,
+            }
+            sender["apps"].add(app_id)
+            self.app_accounts.add(app_address(app_id))
+            if txn.on_complete == OnComplete.OptInOC:
+                sender["local"][app_id] = {}
+            return ("application-index", app_id)
+        app = self.apps.get(txn.index)
+        if app is None and txn.on_complete != OnComplete.ClearStateOC:
+            raise LedgerError("application {} does not exist".format(txn.index))
+        if txn.on_complete == OnComplete.OptInOC:
+            if txn.index in sender["local"]:
+                raise LedgerError("account {} has already opted in to app {}".format(txn.sender, txn.index))
+            sender["local"][txn.index] = {}
+        elif txn.on_complete in (OnComplete.CloseOutOC, OnComplete.ClearStateOC):
+            if txn.index not in sender["local"]:
+                raise LedgerError("account {} is not opted in to app {}".format(txn.sender, txn.index))
+            del sender["local"][txn.index]
+        elif txn.on_complete == OnComplete.UpdateApplicationOC:
+            app["approval"], app["clear"] = txn.approval_program, txn.clear_program
+        elif txn.on_complete == OnComplete.DeleteApplicationOC:
+            self._get(app["creator"], journal)["apps"].discard(txn.index)
+            del self.apps[txn.index]
+
+    def commit(self):
+        # Confirms everything in the pool in the next round
+        self.round += 1
+        entries = []
+        for txid, stxn in self.pool:
+            info = self.txns[txid]
+            info["confirmed-round"] = self.round
+            entries.append(_block_entry(stxn, info))
+        self._seal(entries)
+        self.pool = []
+
+    def _seal(self, entries):
+        self.blocks[self.round] = {"gen": GENESIS_ID, "gh": base64.b64decode(GENESIS_HASH), "rnd": self.round,
+                                   "ts": self.genesis_time + int(self.round * self.block_time), "txns": entries}
+
+    # JSON views, as served by algod
+
+    def account_info(self, address, exclude=None):
+        # exclude="all" drops the asset and app lists, as algod does
+        account = self.accounts.get(address) or self._new_account(address, self.default_balance)
+        schemas = [self.apps[i]["local_schema"] if i in self.apps else (0, 0) for i in account["local"]]
+        info = {
+            "address": address,
+            "amount": account["amount"],
+            "amount-without-pending-rewards": account["amount"],
+            "min-balance": self.min_balance(account),
+            "pending-rewards": 0,
+            "rewards": 0,
+            "round": self.round,
+            "status": "Offline",
+            "assets": [{"asset-id": i, "amount": a, "creator": self.assets[i]["creator"] if i in self.assets else "", "is-frozen": False}
+                       for i, a in sorted(account["assets"].items())],
+            "apps-local-state": [{"id": i, "key-value": [], "schema": _schema_json(self.apps[i]["local_schema"]) if i in self.apps else _schema_json((0, 0))}
+                                 for i in sorted(account["local"])],
+            "created-apps": [self.application_info(i) for i in sorted(account["apps"])],
+            "created-assets": [self.asset_info(i) for i in sorted(account["created_assets"])],
+            "total-apps-opted-in": len(account["local"]),
+            "total-assets-opted-in": len(account["assets"]),
+            "total-created-apps": len(account["apps"]),
+            "total-created-assets": len(account["created_assets"]),
+            "apps-total-schema": _schema_json((sum(s[0] for s in schemas), sum(s[1] for s in schemas))),
+        }
+        if exclude == "all":
+            for field in ("assets", "apps-local-state", "created-apps", "created-assets"):
+                del info[field]
+        return info
+
+    def account_asset_info(self, address, asset_id):
+        account = self.accounts.get(address)
+        if account is None or asset_id not in account["assets"]:
+            raise LedgerError("account asset info not found", 404)
+        info = {"round": self.round, "asset-holding": {
+            "asset-id": asset_id, "amount": account["assets"][asset_id], "is-frozen": False,
+            "creator": self.assets[asset_id]["creator"] if asset_id in self.assets else ""}}
+        if asset_id in account["created_assets"]:
+            info["created-asset"] = self.asset_info(asset_id)["params"]
+        return info
+
+    def account_application_info(self, address, app_id):
+        account = self.accounts.get(address)
+        if account is None or (app_id not in account["local"] and app_id not in account["apps"]):
+            raise LedgerError("account application info not found", 404)
+        info = {"round": self.round}
+        if app_id in account["local"]:
+            schema = self.apps[app_id]["local_schema"] if app_id in self.apps else (0, 0)
+            info["app-local-state"] = {"id": app_id, "key-value": [], "schema": _schema_json(schema)}
+        if app_id in account["apps"]:
+            info["created-app"] = self.application_info(app_id)["params"]
+        return info
+
+    def application_info(self, app_id):
+        app = self.apps.get(app_id)
+        if app is None:
+            raise LedgerError("application does not exist", 404)
+        return {"id": app_id, "params": {
+            "creator": app["creator"],
+            "approval-program": _b64(app["approval"]),
+            "clear-state-program": _b64(app["clear"]),
+            "extra-program-pages": app["extra_pages"],
+            "global-state": [],
+            "global-state-schema": _schema_json(app["global_schema"]),
+            "local-state-schema": _schema_json(app["local_schema"]),
+        }}
+
+    def asset_info(self, asset_id):
+        asset = self.assets.get(asset_id)
+        if asset is None:
+            raise LedgerError("asset does not exist", 404)
+        return {"index": asset_id, "params": {k: v for k, v in asset.items() if v is not None}}
+
+    def pending_info(self, txid):
+        info = self.txns.get(txid)
+        if info is None:
+            raise LedgerError("txn does not exist", 404)
+        return info
+
+    def block(self, rnd):
+        block = self.blocks.get(rnd)
+        if block is None:
+            raise LedgerError("ledger does not have entry {}".format(rnd), 404)
+        return {"block": block}
+
+def _block_entry(stxn, info):
+    # Signed transaction as stored in a block: the genesis id and hash are left to
+    # the block header ("hgi" records that the id was set), with the created id as apply data
+    entry = stxn.dictify()
+    txn = dict(entry["txn"])
+    txn.pop("gh", None)
+    if txn.pop("gen", None):
+        entry["hgi"] = True
+    entry["txn"] = txn
+    if info.get("application-index"):
+        entry["apid"] = info["application-index"]
+    if info.get("asset-index"):
+        entry["caid"] = info["asset-index"]
+    return entry
+
+def _copy_account(account):
+    return {"amount": account["amount"], "assets": dict(account["assets"]), "local": dict(account["local"]),
+            "apps": set(account["apps"]), "created_assets": set(account["created_assets"])}
+
+def _schema(schema):
+    return (schema.num_uints or 0, schema.num_byte_slices or 0) if schema else (0, 0)
+
+def _schema_json(schema):
+    return {"num-uint": schema[0], "num-byte-slice": schema[1]}
+
+def decode_group(data):
+    # Splits a raw POST /v2/transactions body into signed transaction objects
+    stxns = []
+    unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+    unpacker.feed(data)
+    for obj in unpacker:
+        stxns.append(encoding.future_msgpack_decode(obj))
+    return stxns
+
+class FakeAlgod:
+    """
+    Fake algod server.
+
+    Args:
+        genesis         (dict) - {address: microalgos} funded at start
+        round_time      (float) - seconds per round, None to advance only with advance()
+        latency         (float) - seconds added to every request
+        jitter          (float) - up to this many seconds added or removed at random
+        error_rate      (float) - fraction of requests failed with a 503
+        endpoint_errors (dict) - per-endpoint error rates, keyed by route name
+        seed            (int) - seed for the jitter and error draws
+        default_balance (int) - microalgos given to accounts on first use
+        genesis_time    (int) - timestamp of round 0
+        block_time      (float) - seconds between block timestamps, round_time by default
+                                  (1 without a clock)
+        port            (int) - port to listen on, 0 picks a free one
+    """
+
+    def __init__(self, genesis=None, round_time=1.0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 endpoint_errors=None, seed=0, default_balance=0, start_round=1, host="127.0.0.1", port=0,
+                 genesis_time=GENESIS_TIME, block_time=None):
+        if block_time is None:
+            block_time = round_time if round_time is not None else 1
+        self.ledger = Ledger(genesis, start_round, default_balance, genesis_time, block_time)
+        self.round_time = round_time
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.endpoint_errors = endpoint_errors or {}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.new_round = threading.Condition(self.lock)
+        self.start = time.monotonic()
+        self.start_round = start_round
+        self.requests = 0
+        self.server = ThreadingHTTPServer((host, port), _handler(self))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def environ(self):
+        # Environment for utils.algod_client to use this server
+        return {"GARD_ALGOD_ADDRESS": self.address, "GARD_ALGOD_TOKEN": ""}
+
+    def client(self):
+        from algosdk.v2client import algod
+        return algod.AlgodClient("", self.address)
+
+    def start_server(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-algod", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start_server()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Round clock
+
+    def _tick(self):
+        # Commits every round the clock has passed, called with the lock held
+        if self.round_time is None:
+            return
+        target = self.start_round + int((time.monotonic() - self.start) / self.round_time)
+        if target > self.ledger.round:
+            while self.ledger.round < target:
+                self.ledger.commit()
+            self.new_round.notify_all()
+
+    def advance(self, rounds=1):
+        with self.lock:
+            for _ in range(rounds):
+                self.ledger.commit()
+            self.new_round.notify_all()
+
+    def fund(self, address, amount):
+        with self.lock:
+            self.ledger.fund(address, amount)
+
+    def _wait_after(self, current, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            self._tick()
+            while self.ledger.round <= current:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if self.round_time is not None:
+                    # Sleeps until the next round boundary
+                    elapsed = time.monotonic() - self.start
+                    remaining = min(remaining, self.round_time - elapsed % self.round_time + 1e-3)
+                self.new_round.wait(remaining)
+                self._tick()
+            return self._status()
+
+    def _status(self):
+        return {
+            "last-round": self.ledger.round,
+            "last-version": CONSENSUS_VERSION,
+            "next-version": CONSENSUS_VERSION,
+            "next-version-round": self.ledger.round + 1,
+            "next-version-supported": True,
+            "time-since-last-round": 0,
+            "catchup-time": 0,
+            "stopped-at-unsupported-round": False,
+        }
+
+    # Faults
+
+    def _inject(self, route):
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+            rate = self.endpoint_errors.get(route, self.error_rate)
+            fail = rate > 0 and self.random.random() < rate
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise LedgerError("injected failure", 503)
+
+    # Endpoints
+
+    def handle(self, method, path, body, query=None):
+        # GET handlers get the parsed query string in place of the body
+        for route_method, pattern, name in ROUTES:
+            match = pattern.fullmatch(path)
+            if match and route_method == method:
+                self._inject(name)
+                return getattr(self, "_" + name)(body if method == "POST" else query or {}, *match.groups())
+        raise LedgerError("not found", 404)
+
+    def _params(self, body):
+        with self.lock:
+            self._tick()
+            return {"consensus-version": CONSENSUS_VERSION, "fee": 0, "genesis-hash": GENESIS_HASH,
+                    "genesis-id": GENESIS_ID, "last-round": self.ledger.round, "min-fee": MIN_FEE}
+
+    def _send(self, body):
+        try:
+            stxns = decode_group(body)
+        except Exception as e:
+            raise LedgerError("could not decode transactions: {}".format(e))
+        with self.lock:
+            self._tick()
+            txids = self.ledger.submit(stxns)
+        return {"txId": txids[0]}
+
+    def _pending(self, body, txid):
+        with self.lock:
+            self._tick()
+            return self.ledger.pending_info(txid)
+
+    def _status_now(self, body):
+        with self.lock:
+            self._tick()
+            return self._status()
+
+    def _wait(self, body, current):
+        return self._wait_after(int(current))
+
+    def _block(self, query, rnd):
+        # Only the msgpack format, which is what round_watcher reads
+        if query.get("format", ["json"])[0] != "msgpack":
+            raise LedgerError("only format=msgpack is served")
+        with self.lock:
+            self._tick()
+            return msgpack.packb(self.ledger.block(int(rnd)), use_bin_type=True)
+
+    def _account(self, query, address):
+        with self.lock:
+            self._tick()
+            return self.ledger.account_info(address, query.get("exclude", [None])[0])
+
+    def _account_asset(self, query, address, asset_id):
+        with self.lock:
+            self._tick()
+            return self.ledger.account_asset_info(address, int(asset_id))
+
+    def _account_application(self, query, address, app_id):
+        with self.lock:
+            self._tick()
+            return self.ledger.account_application_info(address, int(app_id))
+
+    def _application(self, body, app_id):
+        with self.lock:
+            return self.ledger.application_info(int(app_id))
+
+    def _asset(self, body, asset_id):
+        with self.lock:
+            return self.ledger.asset_info(int(asset_id))
+
+    def _compile(self, body):
+        try:
+            return teal_asm.compile(body.decode())
+        except teal_asm.AssemblyError as e:
+            raise LedgerError(str(e))
+
+    def _health(self, body):
+        return {}
+
+    def _versions(self, body):
+        return {"genesis_id": GENESIS_ID, "genesis_hash_b64": GENESIS_HASH, "versions": ["v2"],
+                "build": {"major": 0, "minor": 0, "build_number": 0, "branch": "fake", "channel": "fake", "commit_hash": ""}}
+
+ROUTES = [(method, re.compile(pattern), name) for method, pattern, name in [
+    ("GET", r"/v2/transactions/params", "params"),
+    ("POST", r"/v2/transactions", "send"),
+    ("GET", r"/v2/transactions/pending/([A-Z2-7]+)", "pending"),
+    ("GET", r"/v2/status", "status_now"),
+    ("GET", r"/v2/status/wait-for-block-after/(\d+)", "wait"),
+    ("GET", r"/v2/blocks/(\d+)", "block"),
+    ("GET", r"/v2/accounts/([A-Z2-7]{58})", "account"),
+    ("GET", r"/v2/accounts/([A-Z2-7]{58})/assets/(\d+)", "account_asset"),
+    ("GET", r"/v2/accounts/([A-Z2-7]{58})/applications/(\d+)", "account_application"),
+    ("GET", r"/v2/applications/(\d+)", "application"),
+    ("GET", r"/v2/assets/(\d+)", "asset"),
+    ("POST", r"/v2/teal/compile", "compile"),
+    ("GET", r"/health", "health"),
+    ("GET", r"/versions", "versions"),
+]]
+
+def _handler(fake):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _respond(self, method):
+            path, _, query = self.path.partition("?")
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            try:
+                status, result = 200, fake.handle(method, path, body, parse_qs(query))
+            except LedgerError as e:
+                status, result = e.status, {"message": str(e)}
+            # Handlers return bytes for msgpack responses
+            raw = isinstance(result, bytes)
+            data = result if raw else json.dumps(result).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/msgpack" if raw else "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            self._respond("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake algod")
+    parser.add_argument("--port", type=int, default=4001)
+    parser.add_argument("--round-time", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--default-balance", type=int, default=10**12)
+    parser.add_argument("--genesis-time", type=int, default=GENESIS_TIME)
+    parser.add_argument("--block-time", type=float, default=None)
+    args = parser.parse_args()
+
+    fake = FakeAlgod(round_time=args.round_time, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                     seed=args.seed, default_balance=args.default_balance, port=args.port,
+                     genesis_time=args.genesis_time, block_time=args.block_time)
+    print("Fake algod listening on " + fake.address)
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,345 @@
+# gard_client.py
+
+'''
+Position manager client.
+
+GardClient holds one deployment's IDs, the reserve LogicSig and address
+(compiled once through the teal cache), and the client's account_index,
+which keeps the GARD opt-in status of the accounts it has seen. Position
+holds one CDP's escrow LogicSigs, address and known validator state.
+open(), mint(), close() and vote() send their groups through a
+txn_pipeline.Pipeline, returning the confirmation future without blocking.
+Each group waits only for what it needs: a NewPosition for its position's
+opt-in group (and the user's GARD opt-in), and any operation for the previous
+one on the same position. Groups are built and signed when they are sent, not
+when called, so a group queued behind others still gets current params and
+NewPosition a current timestamp.
+
+open_positions(), mint_positions() and close_positions() do the same for a
+list of positions of one user at once, so the groups of every position share
+rounds and 50 opens confirm in two rounds instead of 100.
+
+Chain state is read once, when a cache is cold, and after that is only
+changed by our own submissions: a submitted group updates the caches and a
+failed one drops them, so the next call reads the chain again. Suggested
+params come from params_cache, which the round watcher refreshes every round.
+'''
+
+import threading
+from collections import namedtuple
+from concurrent.futures import CancelledError, Future
+from time import time
+from algosdk.future.transaction import PaymentTxn, AssetTransferTxn, LogicSig
+from algosdk.future.transaction import ApplicationCallTxn, ApplicationOptInTxn, ApplicationClearStateTxn
+from batch_sign import sign_group, with_signer
+from reserve_logic import reserve
+from txn_pipeline import Pipeline
+import account_index
+import utils
+
+# Branches of cdp_escrow.cdp
+VOTE, LIQUIDATE, CLOSE_FEE, CLOSE_NO_FEE, VALIDATOR_OPT_IN, MORE_GARD, START_AUCTION = range(7)
+# Branches of reserve_logic.reserve
+RESERVE_OPT_IN, RESERVE_NEW_POSITION, RESERVE_MORE_GARD = range(3)
+
+# Minimum balance the escrow is funded with before opting in to the validator
+ESCROW_FUNDING = 300000
+
+# cdp_id and the microAlgos of collateral and GARD to open or mint with
+PositionSpec = namedtuple("PositionSpec", ["cdp_id", "collateral", "gard"], defaults=[0, 0])
+# confirmation is the pending transaction info of the position's last group, or None with error
+PositionResult = namedtuple("PositionResult", ["cdp_id", "confirmation", "error"])
+
+def collect(submitted):
+    # Waits for (cdp_id, future) pairs and returns their PositionResults, in order
+    results = []
+    for cdp_id, future in submitted:
+        try:
+            results.append(PositionResult(cdp_id, future.result(), None))
+        except Exception as e:
+            results.append(PositionResult(cdp_id, None, e))
+    return results
+
+def devfee(gard, price):
+    # Open and mint fee in microAlgos for `gard` at `price` USD/Algo, with a margin over the validator's minimum
+    return int(gard/(50*price)) + 10000
+
+class GardClient:
+    """
+    One deployment of the protocol.
+
+    Args:
+        client        (AlgodClient)
+        stable_id, validator_id, open_app_id, closing_app_id, price_app_id (int)
+        devfee_addr   (str)
+        template      (CDPTemplate) - escrow template of the deployment
+    """
+
+    def __init__(self, client, stable_id, validator_id, open_app_id, closing_app_id, price_app_id, devfee_addr, template):
+        self.client = client
+        self.stable_id = stable_id
+        self.validator_id = validator_id
+        self.open_app_id = open_app_id
+        self.closing_app_id = closing_app_id
+        self.price_app_id = price_app_id
+        self.devfee_addr = devfee_addr
+        self.template = template
+        self.pipeline = Pipeline(client)
+        self.accounts = account_index.index_for(client)
+        self._reserve = None
+        self._reserve_lsigs = {}
+        self._positions = {}
+        # Pending GARD opt-in group per user, for the NewPosition groups that need it
+        self._opt_ins = {}
+        self._lock = threading.Lock()
+
+    # Reserve
+
+    def _reserve_program(self):
+        if self._reserve is None:
+            program, addr = utils.compile_program(self.client, reserve, self.stable_id, self.validator_id, self.devfee_addr,
+                                                  self.template.template, self.template.layout, version=6)
+            self._reserve = program, addr['pk']
+        return self._reserve
+
+    @property
+    def reserve_address(self):
+        return self._reserve_program()[1]
+
+    def reserve_logicsig(self, arg_id):
+        lsig = self._reserve_lsigs.get(arg_id)
+        if lsig is None:
+            lsig = self._reserve_lsigs[arg_id] = LogicSig(self._reserve_program()[0], [arg_id.to_bytes(8, 'big')])
+        return lsig
+
+    # Accounts
+
+    def opted_in(self, address):
+        # Whether `address` holds GARD, read from the chain only the first time
+        return self.accounts.opted_in(address, self.stable_id)
+
+    def position(self, user, cdp_id):
+        # The same Position object for every call with this user and cdp_id
+        with self._lock:
+            position = self._positions.get((user, cdp_id))
+            if position is None:
+                position = self._positions[(user, cdp_id)] = Position(self, user, cdp_id)
+            return position
+
+    # Bulk operations, on many positions of one user
+
+    def open_positions(self, key, user, specs, price, wait=True):
+        """
+        Opens every PositionSpec in `specs`. All opt-in groups are sent at
+        once, then each NewPosition as soon as its opt-in confirms. Returns
+        PositionResults, or the (cdp_id, future) pairs if not `wait`.
+        """
+        submitted = [(spec.cdp_id, self.position(user, spec.cdp_id).open(key, spec.collateral, spec.gard, price))
+                     for spec in specs]
+        return collect(submitted) if wait else submitted
+
+    def mint_positions(self, key, user, specs, price, wait=True):
+        # Mints spec.gard more on every PositionSpec in `specs`, see open_positions
+        submitted = [(spec.cdp_id, self.position(user, spec.cdp_id).mint(key, spec.gard, price)) for spec in specs]
+        return collect(submitted) if wait else submitted
+
+    def close_positions(self, key, user, cdp_ids, price=None, wait=True):
+        # Closes every position in `cdp_ids`, with a fee if `price` is given, see open_positions
+        submitted = [(cdp_id, self.position(user, cdp_id).close(key, price)) for cdp_id in cdp_ids]
+        return collect(submitted) if wait else submitted
+
+    def params(self, fee=0):
+        return utils.get_params(self.client, fee)
+
+    def submit(self, group, after=(), task=None, on_confirmed=None, on_failed=None):
+        """
+        Signs `group`, (txn, signer) pairs, and sends it through the pipeline
+        once `after` confirm. `group` may also be a zero-argument callable
+        returning the pairs, called only then. on_confirmed() or on_failed()
+        runs when the group resolves, before the returned confirmation future
+        does.
+        """
+        result = Future()
+        def resolved(f):
+            # A cancelled pipeline future counts as failed, exception() would raise on it
+            error = CancelledError("cancelled") if f.cancelled() else f.exception()
+            callback = on_failed if error is not None else on_confirmed
+            if callback is not None:
+                callback()
+            # Unless the caller cancelled it meanwhile
+            if not result.set_running_or_notify_cancel():
+                return
+            if error is not None:
+                result.set_exception(error)
+            else:
+                result.set_result(f.result())
+        build = group if callable(group) else lambda: group
+        self.pipeline.submit(lambda: sign_group(build()), after, task).add_done_callback(resolved)
+        return result
+
+class Position:
+    """
+    One CDP, the escrow of (user, cdp_id).
+
+    debt is the GARD_DEBT the position will hold once its submitted groups
+    confirm, None when unknown, and opened whether the escrow will be opted in
+    to the validator. Both are updated when we submit a group and dropped if
+    it fails, or read by refresh(). Operations on a position are sent in the
+    order they are called, each after the previous one confirms, and each
+    group is built only then.
+    """
+
+    def __init__(self, gard, user, cdp_id):
+        self.gard = gard
+        self.user = user
+        self.cdp_id = cdp_id
+        self.address = gard.template.address(user, cdp_id)
+        self.debt = None
+        self.opened = None
+        self._lsigs = {}
+        self._last = None
+
+    def logicsig(self, arg_id):
+        lsig = self._lsigs.get(arg_id)
+        if lsig is None:
+            lsig = self._lsigs[arg_id] = self.gard.template.logicsig(self.user, self.cdp_id, arg_id)
+        return lsig
+
+    def refresh(self):
+        # Reads the escrow's validator state, for positions not opened through this client
+        accounts = self.gard.accounts
+        accounts.invalidate(self.address, app_id=self.gard.validator_id)
+        state = accounts.local_state(self.address, self.gard.validator_id)
+        self.opened = state is not None
+        self.debt = (state or {}).get(b"GARD_DEBT", 0)
+
+    def _known_debt(self):
+        if self.debt is None:
+            self.refresh()
+        return self.debt
+
+    def _forget(self):
+        self.debt = None
+        self.opened = None
+
+    def _after(self, after):
+        # `after` plus this position's last group while it is pending
+        after = list(after)
+        if self._last is not None and not self._last.done():
+            after.append(self._last)
+        return after
+
+    def _submit(self, build, after, task, forget=True):
+        # Sends the group build() returns after the previous group of the position, dropping the known state if it fails
+        self._last = self.gard.submit(build, self._after(after), task, on_failed=self._forget if forget else None)
+        return self._last
+
+    def open(self, key, collateral, gard_amount, price, after=()):
+        """
+        Funds the escrow, opts it in to the validator (and the user in to
+        GARD if needed), then mints `gard_amount` GARD against `collateral`
+        microAlgos. Returns the future of the NewPosition group.
+        """
+        g = self.gard
+        escrow, user = self.address, self.user
+        on_failed = None
+        user_opt_in = g._opt_ins.get(user)
+        opt_in_user = not g.opted_in(user)
+        if opt_in_user:
+            # Later calls must not add a second opt-in, unless this one fails
+            g.accounts.set_holding(user, g.stable_id, {"asset-id": g.stable_id, "amount": 0, "is-frozen": False})
+            on_failed = lambda: g.accounts.invalidate(user, asset_id=g.stable_id)
+
+        def opt_in():
+            params = g.params(2000)
+            txns = [(PaymentTxn(user, params, escrow, ESCROW_FUNDING), key)]
+            params.fee = 0
+            txns.append((ApplicationOptInTxn(escrow, params, g.validator_id), self.logicsig(VALIDATOR_OPT_IN)))
+            if opt_in_user:
+                params.fee = 1000
+                txns.append((AssetTransferTxn(user, params, user, 0, g.stable_id), key))
+            return txns
+        opted = g.submit(opt_in, self._after(after), task="Open CDP {}".format(self.cdp_id), on_failed=on_failed)
+        if on_failed is not None:
+            user_opt_in = g._opt_ins[user] = opted
+        self.opened = True
+
+        def new_position():
+            # Built once the opt-ins confirm, since the validator wants the timestamp within 30s of the block's
+            params = g.params(0)
+            validator_args = ["NewPosition".encode(), int(time()).to_bytes(8, 'big')]
+            tx1 = ApplicationCallTxn(user, params, g.validator_id, 0, app_args=validator_args, accounts=[escrow],
+                                     foreign_apps=[g.price_app_id, g.open_app_id], foreign_assets=[g.stable_id, self.cdp_id])
+            params.fee = 4000
+            tx2 = PaymentTxn(user, params, escrow, collateral)
+            params.fee = 0
+            tx3 = PaymentTxn(user, params, g.devfee_addr, devfee(gard_amount, price))
+            tx4 = AssetTransferTxn(g.reserve_address, params, user, gard_amount, g.stable_id)
+            return with_signer([tx1, tx2, tx3], key) + [(tx4, g.reserve_logicsig(RESERVE_NEW_POSITION))]
+        # The GARD transfer needs the user's opt-in, which may be in another position's group
+        after = [opted] + ([user_opt_in] if user_opt_in is not None and not user_opt_in.done() else [])
+        self.debt = gard_amount
+        return self._submit(new_position, after, "Mint on CDP {}".format(self.cdp_id))
+
+    def mint(self, key, gard_amount, price, after=()):
+        # Mints `gard_amount` more GARD against the position's collateral
+        g = self.gard
+
+        def more_gard():
+            params = g.params(0)
+            validator_args = ["MoreGARD".encode()]
+            tx1 = ApplicationCallTxn(self.address, params, g.validator_id, 0, app_args=validator_args, accounts=[self.address],
+                                     foreign_apps=[g.price_app_id, g.open_app_id], foreign_assets=[g.stable_id])
+            params.fee = 3000
+            tx2 = PaymentTxn(self.user, params, g.devfee_addr, devfee(gard_amount, price))
+            params.fee = 0
+            tx3 = AssetTransferTxn(g.reserve_address, params, self.user, gard_amount, g.stable_id)
+            return [(tx1, self.logicsig(MORE_GARD)), (tx2, key), (tx3, g.reserve_logicsig(RESERVE_MORE_GARD))]
+        if self.debt is not None:
+            self.debt += gard_amount
+        return self._submit(more_gard, after, "Mint more on CDP {}".format(self.cdp_id))
+
+    def close(self, key, price=None, after=()):
+        """
+        Repays the debt and returns the collateral to the user. Without a
+        price the position is closed without a fee, which only the validator
+        accepts within 5 minutes of opening.
+        """
+        g = self.gard
+        escrow, user = self.address, self.user
+        # The debt the groups before this one leave, as projected now
+        debt = self._known_debt()
+        if price is None:
+            selector, arg_id, apps, fee = "CloseNoFee", CLOSE_NO_FEE, [g.price_app_id], 4000
+        else:
+            selector, arg_id, apps, fee = "CloseFee", CLOSE_FEE, [g.price_app_id, g.closing_app_id], 5000
+        lsig = self.logicsig(arg_id)
+
+        def close_out():
+            params = g.params(0)
+            tx1 = ApplicationCallTxn(escrow, params, g.validator_id, 0, app_args=[selector.encode()], accounts=[escrow],
+                                     foreign_apps=apps, foreign_assets=[g.stable_id])
+            params.fee = fee
+            tx2 = AssetTransferTxn(user, params, g.reserve_address, debt, g.stable_id)
+            params.fee = 0
+            tx3 = ApplicationClearStateTxn(escrow, params, g.validator_id)
+            # The escrow closes to the user, so only the fee needs an amount
+            if price is None:
+                tx4 = PaymentTxn(escrow, params, user, 0, close_remainder_to=user)
+            else:
+                tx4 = PaymentTxn(escrow, params, g.devfee_addr, devfee(debt, price), close_remainder_to=user)
+            return [(tx1, lsig), (tx2, key), (tx3, lsig), (tx4, lsig)]
+        self.opened, self.debt = False, 0
+        return self._submit(close_out, after, "Close CDP {}".format(self.cdp_id))
+
+    def vote(self, key, after=()):
+        # Self-payment of cdp_id from the user paired with a 0 payment from the escrow
+        g = self.gard
+
+        def vote():
+            params = g.params(2000)
+            tx1 = PaymentTxn(self.user, params, self.user, self.cdp_id)
+            params.fee = 0
+            tx2 = PaymentTxn(self.address, params, self.user, 0, note="Heyo World!".encode())
+            return [(tx1, key), (tx2, self.logicsig(VOTE))]
+        return self._submit(vote, after, "Vote from CDP {}".format(self.cdp_id), forget=False)
@@ -0,0 +1,182 @@
+# keeper.py
+
+'''
+Asynchronous liquidation keeper.
+
+Builds the 5 transactions that cdp_escrow.cdp's Liquidate branch and
+price_validator's liquidate arm expect, relative to the CloseOut at base:
+
+    txn base     -> validator CloseOut from the escrow (LogicSig, fee 0)
+    txn base + 1 -> payment from the escrow closing its ALGO to the keeper (LogicSig, fee 0)
+    txn base + 2 -> GARD debt to the reserve (pays the fees of the 5)
+    txn base + 3 -> GARD devfee leg, a quarter of the user leg
+    txn base + 4 -> GARD user leg
+
+and packs up to MAX_BATCH liquidations into one atomic group. A batch that
+algod refuses is retried one liquidation per group, so a single stale plan
+does not sink the others. Groups are built, signed and sent on a thread
+pool, at most max_in_flight at a time. Confirmations are
+awaited through the client's round watcher, so a slow confirmation never
+holds up the next batch. Candidates are auction_planner Plans whose account
+is the position's (user, cdp_id).
+'''
+
+import asyncio
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from algosdk.future.transaction import ApplicationCloseOutTxn, PaymentTxn, AssetTransferTxn
+from batch_sign import sign_group, with_signer
+import round_watcher
+from utils import suggested_params
+
+# Arg selecting cdp_escrow.cdp's Liquidate branch
+LIQUIDATE_ARG = 1
+# Liquidations per group, 5 transactions each within the group limit of 16
+MAX_BATCH = 3
+# Seconds the latest block timestamp, which auction_price reads, can trail the wall clock
+BLOCK_LAG = 5
+
+# txid is None when the group was not sent, error is None on success
+Outcome = namedtuple("Outcome", ["plan", "txid", "confirmation", "error"])
+
+class Keeper:
+    """
+    Args:
+        client       (AlgodClient)
+        key, address - keeper account, pays the GARD legs and receives the collateral
+        template     (CDPTemplate) - escrow template of the deployment
+        validator_id, stable_id (int)
+        reserve, devfee (str) - reserve address and the escrows' devfee address
+        max_in_flight (int) - groups being built and sent at once
+        fee          (int) - per transaction fee, txn base + 2 pays it for all 5
+        batch_size   (int) - liquidations per group, 1 to MAX_BATCH
+    """
+
+    def __init__(self, client, key, address, template, validator_id, stable_id, reserve, devfee, max_in_flight=32, fee=1000,
+                 batch_size=MAX_BATCH):
+        if not 1 <= batch_size <= MAX_BATCH:
+            raise ValueError("batch_size must be between 1 and {}".format(MAX_BATCH))
+        self.client = client
+        self.key = key
+        self.address = address
+        self.template = template
+        self.validator_id = validator_id
+        self.stable_id = stable_id
+        self.reserve = reserve
+        self.devfee = devfee
+        self.max_in_flight = max_in_flight
+        self.fee = fee
+        self.batch_size = batch_size
+        self.watcher = round_watcher.watcher_for(client)
+        self.in_flight = set()
+        self._logicsigs = {}
+        self._executor = ThreadPoolExecutor(max_in_flight, thread_name_prefix="keeper")
+        self._semaphore = None
+
+    def close(self):
+        self._executor.shutdown()
+
+    def logicsig(self, user, cdp_id):
+        # (LogicSig, escrow address), built once per position
+        entry = self._logicsigs.get((user, cdp_id))
+        if entry is None:
+            lsig = self.template.logicsig(user, cdp_id, LIQUIDATE_ARG)
+            entry = self._logicsigs[(user, cdp_id)] = (lsig, lsig.address())
+        return entry
+
+    def liquidation(self, plan, params):
+        """The 5 transactions liquidating `plan` as (txn, signer) pairs"""
+        user, cdp_id = plan.account
+        lsig, escrow = self.logicsig(user, cdp_id)
+        reserve_leg, devfee_leg, user_leg = plan.legs
+        params.flat_fee = True
+        params.fee = 0
+        close_out = ApplicationCloseOutTxn(escrow, params, self.validator_id, foreign_assets=[self.stable_id])
+        collect = PaymentTxn(escrow, params, self.address, 0, close_remainder_to=self.address)
+        params.fee = 5 * self.fee
+        repay = AssetTransferTxn(self.address, params, self.reserve, reserve_leg, self.stable_id)
+        params.fee = 0
+        to_devfee = AssetTransferTxn(self.address, params, self.devfee, devfee_leg, self.stable_id)
+        to_user = AssetTransferTxn(self.address, params, user, user_leg, self.stable_id)
+        return with_signer([close_out, collect], lsig) + with_signer([repay, to_devfee, to_user], self.key)
+
+    def group(self, plans, params):
+        """One atomic group liquidating every plan in `plans`, as (txn, signer) pairs for batch_sign.sign_group"""
+        if not 1 <= len(plans) <= MAX_BATCH:
+            raise ValueError("a group holds 1 to {} liquidations".format(MAX_BATCH))
+        pairs = []
+        for plan in plans:
+            pairs += self.liquidation(plan, params)
+        return pairs
+
+    def _send(self, plans):
+        # Runs on the thread pool
+        signed = sign_group(self.group(plans, suggested_params(self.client)))
+        txid = self.client.send_transactions(signed)
+        return txid, signed[0].transaction.last_valid_round
+
+    async def liquidate(self, plans):
+        """
+        Builds, signs and sends one group for `plans`, then waits for it.
+        Returns an Outcome per plan, sharing the group's txid and confirmation.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        try:
+            async with self._semaphore:
+                txid, last_valid = await asyncio.get_running_loop().run_in_executor(self._executor, self._send, plans)
+        except Exception as e:
+            if len(plans) > 1:
+                outcomes = await asyncio.gather(*[self.liquidate([plan]) for plan in plans])
+                return [outcome for single in outcomes for outcome in single]
+            return [Outcome(plans[0], None, None, e)]
+        try:
+            confirmation = await asyncio.wrap_future(self.watcher.watch(txid, last_valid))
+            return [Outcome(plan, txid, confirmation, None) for plan in plans]
+        except Exception as e:
+            return [Outcome(plan, txid, None, e) for plan in plans]
+
+    def submit(self, plans):
+        # Starts a task per group of up to batch_size plans, skipping positions that already have a group in flight
+        fresh = []
+        for plan in plans:
+            if plan.account not in self.in_flight:
+                self.in_flight.add(plan.account)
+                fresh.append(plan)
+        tasks = []
+        for i in range(0, len(fresh), self.batch_size):
+            batch = fresh[i:i + self.batch_size]
+            task = asyncio.ensure_future(self.liquidate(batch))
+            task.add_done_callback(lambda _, accounts=[p.account for p in batch]: self.in_flight.difference_update(accounts))
+            tasks.append(task)
+        return tasks
+
+    async def run(self, batches):
+        """
+        Submits every batch of plans from `batches`, an iterable or async
+        iterable, as it arrives. Returns the Outcomes, one per plan, once all
+        are resolved.
+        """
+        tasks = []
+        if hasattr(batches, "__aiter__"):
+            async for plans in batches:
+                tasks += self.submit(plans)
+        else:
+            for plans in batches:
+                tasks += self.submit(plans)
+        return [outcome for outcomes in await asyncio.gather(*tasks) for outcome in outcomes]
+
+async def due_plans(schedule, clock=time.time, lag=BLOCK_LAG, poll=1.0):
+    """
+    Yields the plans of an auction_planner.Schedule as they come due, until
+    the schedule is empty. A plan is due once clock() - lag reaches its time,
+    since its legs only satisfy auction_price from that block timestamp on.
+    """
+    while len(schedule):
+        plans = schedule.due(clock() - lag)
+        if plans:
+            yield plans
+        next_time = schedule.next_time()
+        if next_time is not None:
+            await asyncio.sleep(min(max(next_time + lag - clock(), 0), poll))
@@ -0,0 +1,267 @@
+# liquidation_engine.py
+
+'''
+Vectorized health checks for the whole CDP book.
+
+Every position's GARD debt, collateral balance and UNIX_START are held in
+uint64 NumPy arrays. On each oracle price the engine re-evaluates all of
+them at once and returns, ranked, the positions a keeper can act on:
+
+    auction      price_validator's start_auction condition holds,
+                 GARD_DEBT*23/20 > Balance*price/10**decimals,
+                 and no auction is running yet (UNIX_START is even)
+    liquidation  an auction is running (UNIX_START is odd) and the collateral
+                 is worth more than the GARD the liquidate arm asks for,
+                 max(GARD_DEBT, auction_price)
+
+Results match the contract exactly. The uint64 divisions round down as
+they do in TEAL, and the 128-bit products behind each comparison are built
+from 32-bit limbs. Positions whose arithmetic would fail in the contract
+(a uint64 overflow) are never returned. The whole book only goes through a
+float64 screen with a safety margin. The exact comparison runs on the
+positions near the auction threshold and the ones already in auction. The *_ref functions are the
+per-position Python reference, and `python liquidation_engine.py` checks
+the engine against them and times a 1M position book.
+'''
+
+from collections import namedtuple
+import numpy as np
+
+UINT64_MAX = 2**64 - 1
+
+# Ranked position indices, most urgent or most profitable first
+Candidates = namedtuple("Candidates", ["auction", "liquidation"])
+
+_U64 = np.uint64
+_MASK32 = _U64(2**32 - 1)
+_SHIFT32 = _U64(32)
+_ZERO = _U64(0)
+_ONE = _U64(1)
+
+# Relative margin of the float screen, far above float64 rounding
+_SCREEN_MARGIN = 1e-9
+
+def mul_wide(a, b):
+    # 128-bit products of uint64 arrays (or scalars) as (high, low) words
+    a, b = np.asarray(a, dtype=_U64), np.asarray(b, dtype=_U64)
+    a0, a1 = a & _MASK32, a >> _SHIFT32
+    b0, b1 = b & _MASK32, b >> _SHIFT32
+    ll, lh, hl = a0 * b0, a0 * b1, a1 * b0
+    mid = (ll >> _SHIFT32) + (lh & _MASK32) + (hl & _MASK32)
+    low = (ll & _MASK32) | ((mid & _MASK32) << _SHIFT32)
+    high = a1 * b1 + (lh >> _SHIFT32) + (hl >> _SHIFT32) + (mid >> _SHIFT32)
+    return high, low
+
+def wide_gt(a, b):
+    # a > b for (high, low) pairs
+    return (a[0] > b[0]) | ((a[0] == b[0]) & (a[1] > b[1]))
+
+def _scale(decimals):
+    if not 0 <= decimals <= 19:
+        raise ValueError("10**decimals must fit a uint64")
+    return 10**decimals
+
+def _threshold(debt):
+    # floor(debt*23/20), 0 where debt*23 overflows so the position never qualifies
+    return np.where(debt <= _U64(UINT64_MAX // 23), debt * _U64(23) // _U64(20), _ZERO)
+
+class LiquidationEngine:
+    """
+    The CDP book as arrays, indexed by position.
+
+    Load it in bulk with load(), keep it current with upsert() and remove()
+    as debts, balances and auction starts change, and call evaluate() on every
+    oracle price. accounts[i] is the escrow address of position i.
+    """
+
+    def __init__(self, capacity=1024):
+        self.accounts = []
+        self.index = {}
+        self.size = 0
+        self._debt = np.zeros(capacity, dtype=_U64)
+        self._balance = np.zeros(capacity, dtype=_U64)
+        self._start = np.zeros(capacity, dtype=_U64)
+        # Kept alongside for the float screen
+        self._threshold = np.zeros(capacity)
+        self._balance_f = np.zeros(capacity)
+        self._running = np.zeros(capacity, dtype=bool)
+
+    @property
+    def debt(self):
+        return self._debt[:self.size]
+
+    @property
+    def balance(self):
+        return self._balance[:self.size]
+
+    @property
+    def start(self):
+        return self._start[:self.size]
+
+    def load(self, accounts, debts, balances, starts):
+        # Replaces the whole book
+        self.accounts = list(accounts)
+        self.index = {account: i for i, account in enumerate(self.accounts)}
+        self.size = len(self.accounts)
+        self._debt = np.array(debts, dtype=_U64)
+        self._balance = np.array(balances, dtype=_U64)
+        self._start = np.array(starts, dtype=_U64)
+        if not len(self._debt) == len(self._balance) == len(self._start) == self.size:
+            raise ValueError("accounts, debts, balances and starts must have the same length")
+        self._threshold = _threshold(self._debt).astype(float)
+        self._balance_f = self._balance.astype(float)
+        self._running = (self._start & _ONE) == _ONE
+
+    def upsert(self, account, debt, balance, start):
+        i = self.index.get(account)
+        if i is None:
+            if self.size == len(self._debt):
+                capacity = max(2 * self.size, 1024)
+                for name in ("_debt", "_balance", "_start", "_threshold", "_balance_f", "_running"):
+                    array = getattr(self, name)
+                    grown = np.zeros(capacity, dtype=array.dtype)
+                    grown[:self.size] = array[:self.size]
+                    setattr(self, name, grown)
+            i = self.index[account] = self.size
+            self.accounts.append(account)
+            self.size += 1
+        self._debt[i] = debt
+        self._balance[i] = balance
+        self._start[i] = start
+        self._threshold[i] = debt * 23 // 20 if debt * 23 <= UINT64_MAX else 0
+        self._balance_f[i] = balance
+        self._running[i] = start % 2 == 1
+
+    def remove(self, account):
+        # The last position takes the removed one's index
+        i = self.index.pop(account)
+        last = self.size - 1
+        if i != last:
+            moved = self.accounts[last]
+            self.accounts[i] = moved
+            self.index[moved] = i
+            for array in (self._debt, self._balance, self._start, self._threshold, self._balance_f, self._running):
+                array[i] = array[last]
+        self.accounts.pop()
+        self.size -= 1
+
+    def evaluate(self, price, decimals, now):
+        """
+        Returns Candidates for the oracle's `price` and `decimals` at unix time
+        `now`: auction indices, least collateralized first, and liquidation
+        indices, largest collateral surplus first.
+        """
+        scale = _scale(decimals)
+        n = self.size
+
+        # Positions clearly above the start_auction threshold are screened out in float64
+        screen = self._threshold[:n] * float(scale) > self._balance_f[:n] * (price * (1 - _SCREEN_MARGIN))
+        near = np.flatnonzero(screen & ~self._running[:n])
+        # threshold > floor(balance*price / scale)  <=>  threshold * scale > balance*price
+        threshold = _threshold(self._debt[near])
+        value = mul_wide(self._balance[near], price)
+        auction = near[wide_gt(mul_wide(threshold, scale), value)]
+
+        running = np.flatnonzero(self._running[:n])
+        debt, balance, start = self._debt[running], self._balance[running], self._start[running]
+        # debt*23 overflowing fails auction_price
+        valid = debt <= _U64(UINT64_MAX // 23)
+        threshold = _threshold(debt)
+        # auction_price: decays from 115% of the debt by debt/2400 per second
+        elapsed = np.where(now > start, _U64(now) - start, _ZERO)
+        decay_high, decay = mul_wide(debt, elapsed)
+        valid &= decay_high == _ZERO
+        decay //= _U64(2400)
+        cost = np.maximum(debt, np.where(threshold > decay, threshold - decay, _ZERO))
+        # floor(balance*price / scale) > cost  <=>  balance*price > (cost + 1) * scale - 1
+        valid &= cost < _U64(UINT64_MAX)
+        bound_high, bound_low = mul_wide(cost + _ONE, scale)
+        bound = (bound_high - (bound_low == _ZERO).astype(_U64), bound_low - _ONE)
+        profitable = valid & wide_gt(mul_wide(balance, price), bound)
+        liquidation, cost = running[profitable], cost[profitable]
+
+        # Rankings only order candidates, so floating point is enough there
+        ratio = self._balance_f[auction] * price / (self._threshold[auction] * scale)
+        surplus = self._balance_f[liquidation] * price / scale - cost.astype(float)
+        return Candidates(auction[np.argsort(ratio, kind="stable")], liquidation[np.argsort(-surplus, kind="stable")])
+
+    def accounts_at(self, indices):
+        return [self.accounts[i] for i in indices]
+
+# Python reference, one position at a time as the contract computes it.
+# None stands for a call the contract would reject with an error
+
+def auction_ok_ref(debt, balance, price, decimals):
+    if debt * 23 > UINT64_MAX:
+        return None
+    value = balance * price // _scale(decimals)
+    return debt * 23 // 20 > value if value <= UINT64_MAX else None
+
+def auction_price_ref(debt, start, now):
+    if debt * 23 > UINT64_MAX:
+        return None
+    price = debt * 23 // 20
+    if now > start:
+        if debt * (now - start) > UINT64_MAX:
+            return None
+        decay = debt * (now - start) // 2400
+        price = price - decay if price > decay else 0
+    return price
+
+def liquidation_surplus_ref(debt, balance, start, price, decimals, now):
+    # GARD value of the collateral above what liquidate asks for
+    auction_price = auction_price_ref(debt, start, now)
+    if auction_price is None:
+        return None
+    return balance * price // _scale(decimals) - max(debt, auction_price)
+
+def check(positions=20000, seed=0):
+    # Compares the engine with the reference on a random book with edge cases mixed in
+    rng = np.random.default_rng(seed)
+    edges = [0, 1, 2, 19, 20, 21, 2**32 - 1, 2**32, UINT64_MAX // 23, UINT64_MAX // 23 + 1, 2**63, UINT64_MAX]
+    def column(high):
+        values = [int(v) for v in rng.integers(0, high, positions, dtype=np.uint64, endpoint=True)]
+        for i in rng.choice(positions, positions // 10, replace=False):
+            values[i] = edges[rng.integers(len(edges))]
+        return values
+    now = 1650000000
+    debts = column(10**13)
+    balances = column(10**14)
+    starts = [now - v if v % 3 and v <= now else v for v in column(10**5)]
+    starts = [s | 1 if i % 2 else s & ~1 for i, s in enumerate(starts)]
+    engine = LiquidationEngine()
+    engine.load(range(positions), debts, balances, starts)
+    for price, decimals in [(1595100, 6), (1, 0), (UINT64_MAX, 19), (10**9, 3)]:
+        auction, liquidation = engine.evaluate(price, decimals, now)
+        expected_auction = {i for i in range(positions)
+                            if starts[i] % 2 == 0 and auction_ok_ref(debts[i], balances[i], price, decimals)}
+        expected_liquidation = set()
+        for i in range(positions):
+            surplus = liquidation_surplus_ref(debts[i], balances[i], starts[i], price, decimals, now)
+            if starts[i] % 2 == 1 and surplus is not None and surplus > 0:
+                expected_liquidation.add(i)
+        if set(auction.tolist()) != expected_auction or set(liquidation.tolist()) != expected_liquidation:
+            raise AssertionError("engine and reference disagree at price {} decimals {}".format(price, decimals))
+        print("price {:<22} {:>6} auction {:>6} liquidation  ok".format(price, len(auction), len(liquidation)))
+
+def benchmark(positions=1000000, repeat=5, seed=0):
+    import time
+    rng = np.random.default_rng(seed)
+    engine = LiquidationEngine()
+    # Collateral ratios spread around the 115% threshold, 1% of positions in auction
+    debts = rng.integers(10**6, 10**11, positions, dtype=np.uint64)
+    balances = (debts * rng.uniform(0.9, 4.0, positions) / 1.5951).astype(np.uint64)
+    starts = rng.integers(1640000000, 1650000000, positions, dtype=np.uint64) & ~np.uint64(1)
+    starts[rng.choice(positions, positions // 100, replace=False)] |= np.uint64(1)
+    engine.load(range(positions), debts, balances, starts)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        candidates = engine.evaluate(1595100, 6, 1650000000)
+        best = min(best, time.perf_counter() - start)
+    print("{} positions: {:.1f} ms, {} auction, {} liquidation candidates".format(
+        positions, best * 1000, len(candidates.auction), len(candidates.liquidation)))
+
+if __name__ == "__main__":
+    check()
+    benchmark()
@@ -0,0 +1,180 @@
+# liquidation_index.py
+
+'''
+Positions sorted by liquidation price, for crossing detection on price ticks.
+
+Under price_validator's start_auction rule a position can be auctioned once
+
+    floor(GARD_DEBT*23/20) > floor(Balance*price / 10**decimals)
+
+which, with t = floor(GARD_DEBT*23/20), holds exactly when
+
+    price < ceil(t * 10**decimals / Balance)
+
+so every position has one integer liquidation price: below it the position
+can be auctioned, at or above it it is healthy. The index keeps positions in
+a skip list keyed by that price. Updating or removing a position costs
+O(log n), and a price move from p1 to p2 returns the positions it crossed
+in O(log n + crossed), without looking at the rest of the book.
+'''
+
+import random
+
+UINT64_MAX = 2**64 - 1
+
+def liquidation_price(debt, balance, decimals):
+    """
+    Lowest price at which the position is healthy, see the module docstring.
+    0 for positions start_auction can never take (no debt, or GARD_DEBT*23
+    overflows and the call fails).
+    """
+    if debt * 23 > UINT64_MAX:
+        return 0
+    threshold = debt * 23 // 20
+    if threshold == 0:
+        return 0
+    if balance == 0:
+        # Unhealthy at any uint64 price
+        return UINT64_MAX + 1
+    return -(-threshold * 10**decimals // balance)
+
+class _Node:
+    __slots__ = ("key", "account", "next")
+
+    def __init__(self, key, account, levels):
+        self.key = key
+        self.account = account
+        self.next = [None] * levels
+
+class LiquidationIndex:
+    """
+    Skip list of positions keyed by (liquidation price, account).
+
+    Call update() on NewPosition, MoreGARD and collateral changes, and remove()
+    on closes and liquidations. decimals is the oracle's, and a change of
+    decimals needs a new index.
+    """
+
+    MAX_LEVEL = 32
+    # Chance of a node reaching the next level
+    P = 0.25
+
+    def __init__(self, decimals, seed=None):
+        self.decimals = decimals
+        self.prices = {}
+        self._head = _Node(None, None, self.MAX_LEVEL)
+        self._level = 1
+        self._random = random.Random(seed)
+
+    def __len__(self):
+        return len(self.prices)
+
+    def __contains__(self, account):
+        return account in self.prices
+
+    def _random_level(self):
+        level = 1
+        while level < self.MAX_LEVEL and self._random.random() < self.P:
+            level += 1
+        return level
+
+    def _predecessors(self, key):
+        # Last node before `key` on every level
+        update = [self._head] * self.MAX_LEVEL
+        node = self._head
+        for level in range(self._level - 1, -1, -1):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            update[level] = node
+        return update
+
+    def update(self, account, debt, balance):
+        # Inserts or moves the position, returns its liquidation price
+        price = liquidation_price(debt, balance, self.decimals)
+        if self.prices.get(account) == price:
+            return price
+        if account in self.prices:
+            self.remove(account)
+        key = (price, account)
+        update = self._predecessors(key)
+        levels = self._random_level()
+        if levels > self._level:
+            self._level = levels
+        node = _Node(key, account, levels)
+        for level in range(levels):
+            node.next[level] = update[level].next[level]
+            update[level].next[level] = node
+        self.prices[account] = price
+        return price
+
+    def remove(self, account):
+        key = (self.prices.pop(account), account)
+        update = self._predecessors(key)
+        node = update[0].next[0]
+        for level in range(self._level):
+            if update[level].next[level] is not node:
+                break
+            update[level].next[level] = node.next[level]
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+
+    def _first_above(self, price):
+        # First node with a liquidation price above `price`
+        node = self._head
+        for level in range(self._level - 1, -1, -1):
+            while node.next[level] is not None and node.next[level].key[0] <= price:
+                node = node.next[level]
+        return node.next[0]
+
+    def range(self, low, high):
+        # Accounts with low < liquidation price <= high, in price order
+        node = self._first_above(low)
+        while node is not None and node.key[0] <= high:
+            yield node.account
+            node = node.next[0]
+
+    def unhealthy(self, price):
+        # Accounts start_auction accepts at `price`
+        return list(self.range(price, float("inf")))
+
+    def crossed(self, old_price, new_price):
+        """
+        Accounts whose liquidation price a move from old_price to new_price
+        crossed: those that became unhealthy on a fall, or healthy on a rise.
+        """
+        if new_price < old_price:
+            return list(self.range(new_price, old_price))
+        return list(self.range(old_price, new_price))
+
+def check(positions=5000, ticks=200, seed=0):
+    # Replays random updates, removals and price ticks against the contract reference
+    from liquidation_engine import auction_ok_ref
+    rng = random.Random(seed)
+    decimals = 6
+    index = LiquidationIndex(decimals, seed)
+    book = {}
+    def amount(high):
+        return rng.choice([0, 1, 19, 20, UINT64_MAX // 23, UINT64_MAX // 23 + 1]) if rng.random() < 0.05 else rng.randrange(high)
+    for i in range(positions):
+        book[i] = (amount(10**10), amount(10**11))
+        index.update(i, *book[i])
+    price = 1595100
+    for _ in range(ticks):
+        for _ in range(50):
+            account = rng.randrange(positions)
+            if account in book and rng.random() < 0.2:
+                del book[account]
+                index.remove(account)
+            else:
+                book[account] = (amount(10**10), amount(10**11))
+                index.update(account, *book[account])
+        new_price = max(0, price + rng.randint(-200000, 200000))
+        was = {a for a, (debt, balance) in book.items() if auction_ok_ref(debt, balance, price, decimals)}
+        now = {a for a, (debt, balance) in book.items() if auction_ok_ref(debt, balance, new_price, decimals)}
+        if set(index.crossed(price, new_price)) != was ^ now or set(index.unhealthy(new_price)) != now:
+            raise AssertionError("index and reference disagree moving from {} to {}".format(price, new_price))
+        price = new_price
+    print("{} ticks over {} positions ok".format(ticks, len(index)))
+
+if __name__ == "__main__":
+    check()
@@ -0,0 +1,65 @@
+# params_cache.py
+
+'''
+Round-scoped cache of suggested transaction parameters.
+
+Suggested params only change when a new round is produced, so one fetch per
+round is shared by every caller. The cache is invalidated by the client's
+round watcher when it sees a new round, or after a TTL when no watcher is
+running. Callers get their own copy and may set fee/flat_fee freely.
+'''
+
+import copy
+import threading
+import time
+import weakref
+import round_watcher
+
+# Roughly one block
+DEFAULT_TTL = 4.0
+
+class ParamsCache:
+
+    def __init__(self, client, ttl=DEFAULT_TTL):
+        # The client is the key of _caches, a strong reference here would keep the entry forever
+        self._client = weakref.ref(client)
+        self.ttl = ttl
+        self._params = None
+        self._fetched = 0
+        self._lock = threading.Lock()
+        round_watcher.watcher_for(client).add_listener(self._on_round)
+
+    @property
+    def client(self):
+        client = self._client()
+        if client is None:
+            raise RuntimeError("the client of this params cache was garbage collected")
+        return client
+
+    def _on_round(self, current):
+        # Params fetched for an earlier round are stale
+        with self._lock:
+            if self._params is not None and self._params.first < current:
+                self._params = None
+
+    def invalidate(self):
+        with self._lock:
+            self._params = None
+
+    def get(self):
+        with self._lock:
+            if self._params is None or time.monotonic() - self._fetched > self.ttl:
+                self._params = self.client.suggested_params()
+                self._fetched = time.monotonic()
+            return copy.copy(self._params)
+
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+def cache_for(client):
+    # One shared cache per client, dropped along with the client
+    with _caches_lock:
+        cache = _caches.get(client)
+        if cache is None:
+            cache = _caches[client] = ParamsCache(client)
+        return cache
@@ -3,7 +3,20 @@
 # on 12/23/2021
 
 from pyteal import *
-from utils import global_must_get
+from utils import global_must_get, dispatch, Memo, memoized
+from wide_math import mul_div
+
+# Opening and topping up positions are the common calls, ChangePricing is admin only
+METHOD_HOTNESS = {
+    "NewPosition": 100,
+    "MoreGARD": 80,
+    "CloseFee": 40,
+    "CloseNoFee": 20,
+    "Auction": 10,
+    "ClearApp": 5,
+    "AppCheck": 5,
+    "ChangePricing": 1,
+}
 
 # Gets reserve address, if it exists of the first element of the foreign asset array
 @Subroutine(TealType.bytes)
@@ -21,13 +34,20 @@ def get_reserve():
 @Subroutine(TealType.uint64)
 def auction_price():
     temp = ScratchVar(TealType.uint64)
+    # Local state is read once
+    debt = ScratchVar(TealType.uint64)
+    start = ScratchVar(TealType.uint64)
+    decay = ScratchVar(TealType.uint64)
     main = Seq(
-        temp.store(App.localGet(Txn.sender(), Bytes("GARD_DEBT"))*Int(23)/Int(20)),
-        If(Global.latest_timestamp() > App.localGet(Txn.sender(), Bytes("UNIX_START"))).Then(
+        debt.store(App.localGet(Txn.sender(), Bytes("GARD_DEBT"))),
+        start.store(App.localGet(Txn.sender(), Bytes("UNIX_START"))),
+        temp.store(debt.load()*Int(23)/Int(20)),
+        If(Global.latest_timestamp() > start.load()).Then(
             Seq(
-                If(temp.load() > (App.localGet(Txn.sender(), Bytes("GARD_DEBT"))*(Global.latest_timestamp() - App.localGet(Txn.sender(), Bytes("UNIX_START")))/Int(2400))).Then(
+                decay.store(debt.load()*(Global.latest_timestamp() - start.load())/Int(2400)),
+                If(temp.load() > decay.load()).Then(
                     Seq(
-                        temp.store(temp.load()-(App.localGet(Txn.sender(), Bytes("GARD_DEBT"))*(Global.latest_timestamp() - App.localGet(Txn.sender(), Bytes("UNIX_START")))/Int(2400)))
+                        temp.store(temp.load()-decay.load())
                     )
                 ).Else(
                     Seq(
@@ -45,7 +65,7 @@ def auction_price():
 def Max(a, b):
     return If(a > b, a, b)
 
-def approval_program(open_id, close_id, manager_id, stable_id):
+def approval_program(open_id, close_id, manager_id, stable_id, hotness=METHOD_HOTNESS):
 
     # pricing data from Algoracle stateful contract
     # In USD/Algo
@@ -64,6 +84,11 @@ def approval_program(open_id, close_id, manager_id, stable_id):
 
     manager_account = global_must_get(Bytes("Manager"), Int(1))
 
+    # Values the hot arms read more than once, stored at the start of those arms
+    price_memo = Memo(price)
+    scale_memo = Memo(Int(10)**decimals)
+    reserve_memo = Memo(get_reserve(), TealType.bytes)
+
     # Minutes until CDP must be closed with fee 
     no_fee_duration = Int(5)
 
@@ -82,7 +107,7 @@ def approval_program(open_id, close_id, manager_id, stable_id):
         Txn.rekey_to() == Global.zero_address(),
         # Generalizes equation with minimal division: 
         # 23/20 x GARD > collateral x (USD/mAlgo)
-        App.localGet(Txn.sender(), Bytes("GARD_DEBT"))*Int(23)/Int(20) > Btoi(BytesDiv(BytesMul(Itob(Balance(Txn.sender())),Itob(price)),Itob(Int(10)**decimals))),
+        App.localGet(Txn.sender(), Bytes("GARD_DEBT"))*Int(23)/Int(20) > mul_div(Balance(Txn.sender()), price, Int(10)**decimals),
         Seq(
             Assert(App.localGet(Txn.sender(), Bytes("GARD_DEBT")) != Int(0)),
             # Round up to the nearest odd number
@@ -92,32 +117,37 @@ def approval_program(open_id, close_id, manager_id, stable_id):
     )
 
     # asset array args[stable_id]
-    liquidate = And(
+    # Gtxn indices are relative to this call, the escrow's CloseOut at txn base,
+    # so a group can hold up to three liquidations (see cdp_escrow.cdp)
+    offsets = {k: Memo(Txn.group_index() + Int(k)) for k in range(1, 5)}
+    def rel(k):
+        return Gtxn[offsets[k].load()]
+    liquidate = memoized(And(
         Txn.rekey_to() == Global.zero_address(),
         Txn.assets[0] == Int(stable_id),
-        Gtxn[1].rekey_to() == Global.zero_address(), # may be unnecessary since close_remainder_to must be set
+        rel(1).rekey_to() == Global.zero_address(), # may be unnecessary since close_remainder_to must be set
         App.localGet(Txn.sender(), Bytes("UNIX_START")) % Int(2) == Int(1),
-        # senders: 0 = 1, 2=3=4, 1 != 2
-        Gtxn[0].sender() == Gtxn[1].sender(),
-        Gtxn[1].sender() != Gtxn[2].sender(),
-        Gtxn[2].sender() == Gtxn[3].sender(),
-        Gtxn[3].sender() == Gtxn[4].sender(),
-        Gtxn[1].type_enum() == TxnType.Payment,
-        Gtxn[1].close_remainder_to() != Global.zero_address(),
-        Gtxn[2].asset_receiver() == get_reserve(),
-        Gtxn[2].asset_amount() + Gtxn[3].asset_amount() + Gtxn[4].asset_amount() >= Max(App.localGet(Txn.sender(), Bytes("GARD_DEBT")), auction_price()), 
-        Gtxn[2].asset_amount() == App.localGet(Txn.sender(), Bytes("GARD_DEBT")),
-        Gtxn[3].asset_amount() == Gtxn[4].asset_amount()/Int(4),
-        Gtxn[3].xfer_asset() == Int(stable_id),
-        Gtxn[4].xfer_asset() == Int(stable_id),
-        Gtxn[0].fee() + Gtxn[1].fee() == Int(0),
+        # senders: base = base+1, base+2 = base+3 = base+4, base+1 != base+2
+        Txn.sender() == rel(1).sender(),
+        rel(1).sender() != rel(2).sender(),
+        rel(2).sender() == rel(3).sender(),
+        rel(3).sender() == rel(4).sender(),
+        rel(1).type_enum() == TxnType.Payment,
+        rel(1).close_remainder_to() != Global.zero_address(),
+        rel(2).asset_receiver() == get_reserve(),
+        rel(2).asset_amount() + rel(3).asset_amount() + rel(4).asset_amount() >= Max(App.localGet(Txn.sender(), Bytes("GARD_DEBT")), auction_price()), 
+        rel(2).asset_amount() == App.localGet(Txn.sender(), Bytes("GARD_DEBT")),
+        rel(3).asset_amount() == rel(4).asset_amount()/Int(4),
+        rel(3).xfer_asset() == Int(stable_id),
+        rel(4).xfer_asset() == Int(stable_id),
+        Txn.fee() + rel(1).fee() == Int(0),
         Seq(
             App.localDel(Txn.sender(), Bytes("GARD_DEBT")),
             App.localDel(Txn.sender(), Bytes("UNIX_START")),
             App.localDel(Txn.sender(), Bytes("EXTERNAL_APPCOUNT")),
             Int(1)
         )
-    )
+    ), *offsets.values())
     
     # application args["CloseFee"]
     # (asset array args[stable_id])
@@ -138,7 +168,7 @@ def approval_program(open_id, close_id, manager_id, stable_id):
         Gtxn[0].application_id() == Gtxn[2].application_id(),
         Gtxn[1].asset_amount() == App.localGet(Txn.sender(), Bytes("GARD_DEBT")), 
         # fee >= GARD x (malgo/USD) x (fee_pct (two decimals) / 1000)
-        Gtxn[3].amount() >= Btoi(BytesDiv(BytesMul(Itob(Gtxn[1].asset_amount()*closing_fee),Itob(Int(10)**decimals)), Itob(Int(1000)*price))),
+        Gtxn[3].amount() >= mul_div(Gtxn[1].asset_amount()*closing_fee, Int(10)**decimals, Int(1000)*price),
     ) 
 
     # application args["CloseNoFee"]
@@ -163,7 +193,7 @@ def approval_program(open_id, close_id, manager_id, stable_id):
 
     # application args["NewPosition", Int(unix_start)]
     # (asset array args[stable_id, account_id])
-    new_position = And(
+    new_position = memoized(And(
         Txn.applications[1] == price_app_id,
         Txn.applications[2] == open_app_id,
         Txn.assets[0] == Int(stable_id),
@@ -174,9 +204,9 @@ def approval_program(open_id, close_id, manager_id, stable_id):
         Gtxn[3].asset_amount() <= Int(60000000000000000),
         Gtxn[3].asset_amount() >= Int(1000000), 
         # fee >= GARD x (malgo/USD) x (fee_pct (two decimals) / 1000)
-        Gtxn[2].amount() >= Btoi(BytesDiv(BytesMul(Itob(Gtxn[3].asset_amount()*open_fee),Itob(Int(10)**decimals)), Itob(Int(1000)*price))),
+        Gtxn[2].amount() >= mul_div(Gtxn[3].asset_amount()*open_fee, scale_memo.load(), Int(1000)*price_memo.load()),
         # 7/5 x GARD <= collateral x (USD/mAlgo)
-        Gtxn[3].asset_amount()*Int(7)/Int(5) <= Btoi(BytesDiv(BytesMul(Itob(Balance(Int(1)) + Gtxn[1].amount()),Itob(price)),Itob(Int(10)**decimals))),
+        Gtxn[3].asset_amount()*Int(7)/Int(5) <= mul_div(Balance(Int(1)) + Gtxn[1].amount(), price_memo.load(), scale_memo.load()),
         Seq(
             Assert(App.localGet(Int(1), Bytes("GARD_DEBT")) == Int(0)),
             Assert(get_reserve() == Gtxn[3].sender()),
@@ -186,16 +216,16 @@ def approval_program(open_id, close_id, manager_id, stable_id):
             App.localPut(Int(1), Bytes("EXTERNAL_APPCOUNT"), Int(0)),
             Int(1)
         ),
-    )
+    ), price_memo, scale_memo)
 
-    more_gard = And(
+    more_gard = memoized(And(
         Txn.applications[1] == price_app_id,
         Txn.applications[2] == open_app_id,
         Txn.assets[0] == Int(stable_id),
         Txn.rekey_to() == Global.zero_address(),
         App.localGet(Txn.sender(), Bytes("GARD_DEBT")) != Int(0),
-        Gtxn[1].sender() != get_reserve(), 
-        Gtxn[2].sender() == get_reserve(), 
+        Gtxn[1].sender() != reserve_memo.load(), 
+        Gtxn[2].sender() == reserve_memo.load(), 
         Gtxn[2].sender() != Gtxn[0].sender(),
         Txn.sender() == Gtxn[0].sender(),
         Gtxn[0].fee() == Int(0),
@@ -203,14 +233,14 @@ def approval_program(open_id, close_id, manager_id, stable_id):
         # Protects against overflow
         Gtxn[2].asset_amount() <= Int(600000000000000000) - App.localGet(Txn.sender(), Bytes("GARD_DEBT")),
         # fee >= GARD x (malgo/USD) x (fee_pct (two decimals) / 1000)
-        Gtxn[1].amount() >= Btoi(BytesDiv(BytesMul(Itob(Gtxn[2].asset_amount()*open_fee),Itob(Int(10)**decimals)), Itob(Int(1000)*price))), 
+        Gtxn[1].amount() >= mul_div(Gtxn[2].asset_amount()*open_fee, scale_memo.load(), Int(1000)*price_memo.load()), 
         # 7/5 x GARD <= collateral x (USD/mAlgo)
-        (App.localGet(Txn.sender(), Bytes("GARD_DEBT")) + Gtxn[2].asset_amount())*Int(7)/Int(5) <= Btoi(BytesDiv(BytesMul(Itob(Balance(Txn.sender())),Itob(price)),Itob(Int(10)**decimals))),
+        (App.localGet(Txn.sender(), Bytes("GARD_DEBT")) + Gtxn[2].asset_amount())*Int(7)/Int(5) <= mul_div(Balance(Txn.sender()), price_memo.load(), scale_memo.load()),
         Seq(
             App.localPut(Txn.sender(), Bytes("GARD_DEBT"), App.localGet(Txn.sender(), Bytes("GARD_DEBT"))+Gtxn[2].asset_amount()),
             Int(1)
         ),
-    )
+    ), price_memo, scale_memo, reserve_memo)
 
     app_check = And(
         Txn.rekey_to() == Global.zero_address(),
@@ -249,22 +279,27 @@ def approval_program(open_id, close_id, manager_id, stable_id):
         App.localGet(Txn.sender(), Bytes("UNIX_START")) % Int(2) == Int(1),   
     )
 
-    return Cond(
+    return dispatch(
         # On app creation
-        [Txn.application_id() == Int(0), on_create],
-        [Txn.on_completion() == OnComplete.DeleteApplication, Int(0)],
-        [Txn.on_completion() == OnComplete.UpdateApplication, Int(0)],
-        [Txn.on_completion() == OnComplete.CloseOut, liquidate],
-        [Txn.on_completion() == OnComplete.OptIn, Int(1)],
-        # Must be a NoOp transaction
-        [Txn.application_args[0] == Bytes("Auction"), start_auction],
-        [Txn.application_args[0] == Bytes("CloseFee"), close_with_fee],
-        [Txn.application_args[0] == Bytes("CloseNoFee"), close_no_fee],
-        [Txn.application_args[0] == Bytes("NewPosition"), new_position],
-        [Txn.application_args[0] == Bytes("MoreGARD"), more_gard],
-        [Txn.application_args[0] == Bytes("AppCheck"), app_check],
-        [Txn.application_args[0] == Bytes("ClearApp"), clear_app],
-        [Txn.application_args[0] == Bytes("ChangePricing"), change_price]
+        on_create,
+        [
+            (OnComplete.DeleteApplication, Int(0)),
+            (OnComplete.UpdateApplication, Int(0)),
+            (OnComplete.CloseOut, liquidate),
+            (OnComplete.OptIn, Int(1)),
+        ],
+        # NoOp transactions
+        [
+            ("Auction", start_auction),
+            ("CloseFee", close_with_fee),
+            ("CloseNoFee", close_no_fee),
+            ("NewPosition", new_position),
+            ("MoreGARD", more_gard),
+            ("AppCheck", app_check),
+            ("ClearApp", clear_app),
+            ("ChangePricing", change_price),
+        ],
+        hotness
     )
 
 def clear_state_program():
@@ -8,28 +8,15 @@ a valid minting amount comes from a reserve oracle
 '''
 
 from pyteal import *
+from cdp_template import CDPTemplate, MAX_CDP_ID
 
-# Takes uint64 and returns it as uvarint array
-@Subroutine(TealType.bytes)
+# Takes a cdp_id and returns it as a uvarint. cdp_ids up to MAX_CDP_ID encode
+# to their single low byte, the only length the template has room for, so
+# reserve() checks the range instead of looping over 7-bit groups
 def Itovi(num):
-    output = ScratchVar(TealType.bytes)
-    temp = ScratchVar(TealType.uint64)
-    main = Seq([
-        output.store(Substring(Itob(num), Int(7), Int(8))),
-        If(num >= Int(128)).Then(
-            Seq([
-                temp.store(num / Int(128)),
-                While(temp.load() >= Int(128)).Do(
-                Seq([
-                    output.store(Concat(output.load(), Substring(Itob(temp.load()), Int(7), Int(8)))),
-                    temp.store(temp.load() >> Int(7))
-                    ])),
-                output.store(Concat(output.load(), Substring(Itob(temp.load()), Int(7), Int(8))))
-            ]))
-    ])
-    return Seq([main, Return(output.load())])
+    return Extract(Itob(num), Int(7), Int(1))
 
-def reserve(stable_id, valid_id, devfee_add, template):
+def reserve(stable_id, valid_id, devfee_add, template, layout):
 
     # public key of DAO Devfee address
     devfee_address = Addr(devfee_add)
@@ -39,15 +26,13 @@ def reserve(stable_id, valid_id, devfee_add, template):
     # template base64 encoding from compiling cdp("RHN53AKL3IJGOIF5BJTIUFDOH4KMPR45XS4JM63W46PWMFFR3PPZXF5DOQ", 12)
     # from cdp_escrow.py
     # address will be replaced with user address
-    contract_logic = template
-    
-    y = Concat(Bytes("Program"), Bytes("base64", contract_logic))
+    # layout holds the splice points measured by create_reserve.print_differences.
+    # The constant parts around them are cut here rather than by the program
+    contract_logic = CDPTemplate(template, layout)
+    spliced = {"user": Gtxn[0].sender(), "cdp_id": Itovi(Gtxn[0].assets[1])}
+    parts = [spliced[part] if isinstance(part, str) else Bytes(part) for part in contract_logic.parts if part]
 
-    x1 = Substring(y, Int(0), Int(30))
-    x2 = Substring(y, Int(62), Int(455)) 
-    x3 = Substring(y, Int(456), Int(561))
-
-    contract_addr = Sha512_256(Concat(x1, Gtxn[0].sender(), x2, Itovi(Gtxn[0].assets[1]), x3))
+    contract_addr = Sha512_256(Concat(*parts))
 
     # For Opt-in to GARD 
     # arg_id = 0
@@ -74,6 +59,7 @@ def reserve(stable_id, valid_id, devfee_add, template):
         Gtxn[0].application_args[0] == Bytes("NewPosition"),
         Gtxn[0].accounts[1] == Gtxn[1].receiver(),
         Gtxn[0].assets[0] == Int(stable_id),
+        Gtxn[0].assets[1] <= Int(MAX_CDP_ID),
         Gtxn[1].type_enum() == TxnType.Payment,
         Gtxn[1].sender() == Gtxn[0].sender(),
         # contract address computed by filling in template
@@ -0,0 +1,251 @@
+# round_watcher.py
+
+'''
+Shared round watcher.
+
+One background thread per client follows new blocks with a single
+status_after_block long-poll, reads each new block once and resolves the
+futures of every registered txid found in it, instead of each caller polling
+the node on its own. Transactions that are not confirmed by their last valid
+round fail with TransactionExpired.
+
+Transactions still pending after STRAGGLER_ROUNDS are looked up with
+pending_transaction_info every STRAGGLER_ROUNDS, so one the node dropped from
+its pool fails with TransactionRejected without waiting for its last round.
+'''
+
+import base64
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+import msgpack
+from algosdk import encoding
+
+# Rounds a transaction can stay valid for, used when the caller does not know last_valid
+MAX_TXN_LIFE = 1000
+# Blocks whose txids are kept, for txids registered after their block was read
+RECENT_ROUNDS = 8
+# Rounds a transaction stays pending before the node is asked about it directly
+STRAGGLER_ROUNDS = 4
+
+logger = logging.getLogger(__name__)
+
+class TransactionExpired(Exception):
+    def __init__(self, txid, last_valid):
+        super().__init__("Transaction {} not confirmed by round {}".format(txid, last_valid))
+        self.txid = txid
+        self.last_valid = last_valid
+
+class TransactionRejected(Exception):
+    def __init__(self, txid, pool_error):
+        super().__init__("Transaction {} rejected: {}".format(txid, pool_error))
+        self.txid = txid
+        self.pool_error = pool_error
+
+def block_txids(block):
+    """
+    {txid: confirmation} for the transactions of a block, as decoded from
+    /v2/blocks/{round}?format=msgpack. confirmation has the confirmed-round,
+    application-index and asset-index fields of pending_transaction_info.
+    """
+    header = block["block"]
+    rnd = header.get("rnd", 0)
+    found = {}
+    for entry in header.get("txns", []):
+        # Blocks leave the genesis hash, and the genesis id when "hgi" is set, to the header
+        txn = dict(entry["txn"])
+        txn["gh"] = header["gh"]
+        if entry.get("hgi"):
+            txn["gen"] = header["gen"]
+        txid = base64.b32encode(encoding.checksum(b"TX" + base64.b64decode(encoding.msgpack_encode(txn)))).decode()
+        info = {"confirmed-round": rnd, "pool-error": "", "txn": entry}
+        if entry.get("apid"):
+            info["application-index"] = entry["apid"]
+        if entry.get("caid"):
+            info["asset-index"] = entry["caid"]
+        found[encoding._undo_padding(txid)] = info
+    return found
+
+def _resolve(future, info=None, error=None):
+    # Futures cancelled by their caller are skipped
+    if not future.set_running_or_notify_cancel():
+        return
+    if error is None:
+        future.set_result(info)
+    else:
+        future.set_exception(error)
+
+class RoundWatcher:
+
+    def __init__(self, client, retries=5, retry_delay=1.0):
+        # Weak, since the client is also this watcher's key in _watchers
+        self._client = weakref.ref(client)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        # Last round whose block was read
+        self.round = None
+        # txid -> [futures, last_valid, round registered or last looked up]
+        self._pending = {}
+        # round -> {txid: confirmation} of the last RECENT_ROUNDS blocks read
+        self._recent = OrderedDict()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def client(self):
+        client = self._client()
+        if client is None:
+            raise RuntimeError("the client of this watcher was garbage collected")
+        return client
+
+    def watch(self, txid, last_valid=None):
+        """
+        Returns a Future resolving to the confirmation of `txid` (see
+        block_txids) once it is confirmed. Every call gets its own Future, so
+        a caller cancelling its Future does not affect the others.
+        """
+        future = Future()
+        with self._lock:
+            info = self._seen(txid)
+            if info is None:
+                entry = self._pending.get(txid)
+                if entry is None:
+                    entry = self._pending[txid] = [[], last_valid, self.round]
+                entry[0].append(future)
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="round-watcher", daemon=True)
+                    self._thread.start()
+        if info is not None:
+            _resolve(future, info)
+        return future
+
+    def add_listener(self, listener):
+        # listener(round) is called from the watcher thread on every new round it sees
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            self._listeners.remove(listener)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _seen(self, txid):
+        # Called with the lock held
+        for found in self._recent.values():
+            if txid in found:
+                return found[txid]
+        return None
+
+    def _call(self, method, *args, **kwargs):
+        # Retries transient node errors before giving up
+        for attempt in range(self.retries):
+            try:
+                return method(*args, **kwargs)
+            except Exception:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(self.retry_delay)
+
+    def _fail_all(self, error):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._thread = None
+        for futures, _, _ in pending.values():
+            for future in futures:
+                _resolve(future, error=error)
+
+    def _read_block(self, rnd):
+        found = block_txids(msgpack.unpackb(self._call(self.client.block_info, rnd, response_format="msgpack"), raw=False, strict_map_key=False))
+        with self._lock:
+            self._recent[rnd] = found
+            while len(self._recent) > RECENT_ROUNDS:
+                self._recent.popitem(last=False)
+            self.round = rnd
+            done = [(self._pending.pop(txid)[0], info) for txid, info in found.items() if txid in self._pending]
+        for futures, info in done:
+            for future in futures:
+                _resolve(future, info)
+
+    def _check_stragglers(self, current):
+        # Expired transactions, and every STRAGGLER_ROUNDS those still pending, are looked up directly
+        items = []
+        with self._lock:
+            for txid, entry in self._pending.items():
+                if entry[1] is None:
+                    entry[1] = current + MAX_TXN_LIFE
+                if entry[2] is None:
+                    entry[2] = current
+                if current > entry[1] or current - entry[2] >= STRAGGLER_ROUNDS:
+                    entry[2] = current
+                    items.append((txid, entry[1]))
+        done = []
+        for txid, last_valid in items:
+            try:
+                info = self._call(self.client.pending_transaction_info, txid)
+            except Exception:
+                # The blocks still decide, a failed lookup only matters once the transaction expired
+                info = {}
+            if info.get('confirmed-round', 0) > 0:
+                done.append((txid, info, None))
+            elif info.get('pool-error'):
+                done.append((txid, None, TransactionRejected(txid, info['pool-error'])))
+            elif current > last_valid:
+                done.append((txid, None, TransactionExpired(txid, last_valid)))
+        with self._lock:
+            done = [(self._pending.pop(txid)[0], info, error) for txid, info, error in done if txid in self._pending]
+        for futures, info, error in done:
+            for future in futures:
+                _resolve(future, info, error)
+
+    def _drop_cancelled(self):
+        # Called with the lock held, forgets txids nobody waits for anymore
+        for txid in [txid for txid, entry in self._pending.items() if all(f.cancelled() for f in entry[0])]:
+            del self._pending[txid]
+
+    def _run(self):
+        try:
+            current = self._call(self.client.status)['last-round']
+            # Blocks read before the watcher went idle are not read again
+            first = current if self.round is None else max(self.round + 1, current - RECENT_ROUNDS + 1)
+            while True:
+                for rnd in range(first, current + 1):
+                    self._read_block(rnd)
+                first = current + 1
+                self._check_stragglers(current)
+                with self._lock:
+                    self._drop_cancelled()
+                    if not self._pending:
+                        self._thread = None
+                        return
+                    listeners = list(self._listeners)
+                for listener in listeners:
+                    try:
+                        listener(current)
+                    except Exception:
+                        logger.exception("round listener %r failed", listener)
+                current = self._call(self.client.status_after_block, current)['last-round']
+        except Exception as e:
+            self._fail_all(e)
+        finally:
+            # Whatever stopped this thread, the next watch() starts a new one
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+_watchers = weakref.WeakKeyDictionary()
+_watchers_lock = threading.Lock()
+
+def watcher_for(client):
+    # One shared watcher per client, dropped along with the client
+    with _watchers_lock:
+        watcher = _watchers.get(client)
+        if watcher is None:
+            watcher = _watchers[client] = RoundWatcher(client)
+        return watcher
@@ -0,0 +1,217 @@
+# rpc_metrics.py
+
+'''
+Per-endpoint instrumentation of algod clients.
+
+instrument(client) wraps the client's algod_request, which every SDK call
+goes through, and records call counts, error counts, bytes sent and
+received and a latency histogram per endpoint, plus which helper made each
+call. Metrics export in the Prometheus text format and print as a summary
+at process exit.
+
+utils.algod_client instruments its clients when GARD_RPC_METRICS is set.
+'''
+
+import atexit
+import json
+import re
+import sys
+import threading
+import time
+import weakref
+from algosdk import error
+
+# Upper bounds in seconds, wait-for-block-after long polls land in the last ones
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Path segments replaced by placeholders so that each endpoint is one series
+_PLACEHOLDERS = [
+    (re.compile(r"/[A-Z2-7]{58}(?=/|$)"), "/{address}"),
+    (re.compile(r"/[A-Z2-7]{52}(?=/|$)"), "/{txid}"),
+    (re.compile(r"/\d+(?=/|$)"), "/{id}"),
+]
+
+# Frames from these modules are skipped when looking for the calling helper
+_INTERNAL = ("algosdk", "rpc_metrics", "round_watcher", "params_cache", "teal_cache", "txn_pipeline", "concurrent", "threading")
+
+def endpoint_name(method, requrl):
+    path = requrl.split("?", 1)[0]
+    for pattern, placeholder in _PLACEHOLDERS:
+        path = pattern.sub(placeholder, path)
+    return method + " " + path
+
+def _caller():
+    # First frame outside the SDK and the client plumbing, as module.function.
+    # Calls made from background threads (round watcher, pipeline) are
+    # attributed to the plumbing helper that made them
+    frame = sys._getframe(2)
+    fallback = "unknown"
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_INTERNAL):
+            return module + "." + frame.f_code.co_name
+        if fallback == "unknown" and not module.startswith(("algosdk", "rpc_metrics")):
+            fallback = module + "." + frame.f_code.co_name
+        frame = frame.f_back
+    return fallback
+
+class EndpointStats:
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds, sent, received, failed):
+        self.count += 1
+        self.errors += failed
+        self.bytes_sent += sent
+        self.bytes_received += received
+        self.seconds += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th quantile
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.buckets):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+class Metrics:
+
+    def __init__(self):
+        self.endpoints = {}
+        self.callers = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, caller, seconds, sent, received, failed):
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.observe(seconds, sent, received, failed)
+            key = (caller, endpoint)
+            self.callers[key] = self.callers.get(key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+            self.callers = {}
+
+    def to_prometheus(self):
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            callers = sorted(self.callers.items())
+        lines = []
+        def family(name, kind, help):
+            lines.append("# HELP {} {}".format(name, help))
+            lines.append("# TYPE {} {}".format(name, kind))
+        def labels(endpoint, **extra):
+            method, path = endpoint.split(" ", 1)
+            pairs = [("method", method), ("endpoint", path)] + list(extra.items())
+            return "{" + ",".join('{}="{}"'.format(k, v) for k, v in pairs) + "}"
+
+        family("algod_requests_total", "counter", "Requests sent to algod")
+        for endpoint, stats in endpoints:
+            lines.append("algod_requests_total{} {}".format(labels(endpoint), stats.count))
+        family("algod_request_errors_total", "counter", "Requests that raised")
+        for endpoint, stats in endpoints:
+            lines.append("algod_request_errors_total{} {}".format(labels(endpoint), stats.errors))
+        family("algod_request_bytes_total", "counter", "Request and response body bytes")
+        for endpoint, stats in endpoints:
+            lines.append("algod_request_bytes_total{} {}".format(labels(endpoint, direction="sent"), stats.bytes_sent))
+            lines.append("algod_request_bytes_total{} {}".format(labels(endpoint, direction="received"), stats.bytes_received))
+        family("algod_request_duration_seconds", "histogram", "Request latency")
+        for endpoint, stats in endpoints:
+            cumulative = 0
+            for bound, n in zip(BUCKETS, stats.buckets):
+                cumulative += n
+                lines.append("algod_request_duration_seconds_bucket{} {}".format(labels(endpoint, le=repr(bound)), cumulative))
+            lines.append("algod_request_duration_seconds_bucket{} {}".format(labels(endpoint, le="+Inf"), stats.count))
+            lines.append("algod_request_duration_seconds_sum{} {}".format(labels(endpoint), repr(stats.seconds)))
+            lines.append("algod_request_duration_seconds_count{} {}".format(labels(endpoint), stats.count))
+        family("algod_caller_requests_total", "counter", "Requests by calling helper")
+        for (caller, endpoint), n in callers:
+            lines.append("algod_caller_requests_total{} {}".format(labels(endpoint, caller=caller), n))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # For the node_exporter textfile collector
+        with open(path, "w") as f:
+            f.write(self.to_prometheus())
+
+    def summary(self):
+        with self._lock:
+            endpoints = sorted(self.endpoints.items(), key=lambda item: -item[1].seconds)
+            callers = sorted(self.callers.items(), key=lambda item: -item[1])
+        if not endpoints:
+            return "No algod requests"
+        rows = ["{:<48} {:>7} {:>6} {:>9} {:>9} {:>8} {:>8} {:>8}".format(
+            "endpoint", "calls", "errors", "sent", "received", "total s", "p50 <=", "p99 <=")]
+        for endpoint, stats in endpoints:
+            rows.append("{:<48} {:>7} {:>6} {:>9} {:>9} {:>8.3f} {:>8} {:>8}".format(
+                endpoint, stats.count, stats.errors, stats.bytes_sent, stats.bytes_received,
+                stats.seconds, stats.quantile(0.5), stats.quantile(0.99)))
+        rows.append("")
+        rows.append("{:<48} {:<40} {:>7}".format("caller", "endpoint", "calls"))
+        for (caller, endpoint), n in callers:
+            rows.append("{:<48} {:<40} {:>7}".format(caller, endpoint, n))
+        return "\n".join(rows)
+
+default_metrics = Metrics()
+
+_instrumented = weakref.WeakSet()
+_report_registered = False
+
+def _report():
+    print(default_metrics.summary(), file=sys.stderr)
+
+def instrument(client, metrics=None, report_at_exit=True):
+    """
+    Records every request `client` makes into `metrics` (default_metrics).
+    Instrumenting a client twice has no effect. Returns the client.
+    """
+    global _report_registered
+    if client in _instrumented:
+        return client
+    metrics = metrics or default_metrics
+    request = client.algod_request
+
+    def algod_request(method, requrl, params=None, data=None, headers=None, response_format="json"):
+        endpoint = endpoint_name(method, requrl)
+        caller = _caller()
+        start = time.perf_counter()
+        received = 0
+        failed = True
+        try:
+            # Raw bytes are fetched so the response size is known, then decoded as the SDK would
+            raw = request(method, requrl, params=params, data=data, headers=headers, response_format="raw")
+            received = len(raw)
+            if response_format != "json":
+                failed = False
+                return raw
+            try:
+                result = json.loads(raw)
+            except Exception as e:
+                raise error.AlgodResponseError("Failed to parse JSON response from algod") from e
+            failed = False
+            return result
+        finally:
+            metrics.observe(endpoint, caller, time.perf_counter() - start, len(data or b""), received, failed)
+
+    client.algod_request = algod_request
+    _instrumented.add(client)
+    if report_at_exit and metrics is default_metrics and not _report_registered:
+        atexit.register(_report)
+        _report_registered = True
+    return client
@@ -0,0 +1,574 @@
+# teal_asm.py
+
+'''
+Offline TEAL assembler.
+
+Assembles the TEAL that PyTeal generates for our contracts (up to version 6)
+the way algod's /v2/teal/compile does, including the constant block
+optimization algod applies from version 4 on: constants used more than once go
+into intcblock/bytecblock ordered by use count, the rest are inlined with
+pushint/pushbytes.
+
+Byte equality with algod is only established for what is saved in
+teal_asm_algod.json: algod's output for every contract, with ids that encode
+to 3 and to 5 byte varints. `python teal_asm.py --check` compares against it,
+`--record` saves a new set from an algod node after contracts change.
+
+compile() returns the same dict as AlgodClient.compile, so this module can be
+passed anywhere a client is only used for compiling.
+'''
+
+import argparse
+import base64
+import json
+import os
+import sys
+from collections import namedtuple
+from algosdk import encoding
+
+# (opcode, name, immediates, cost)
+# immediates is the number of uint8 immediates, or one of the special encodings below
+BRANCH = "branch"
+INTCBLOCK = "intcblock"
+BYTECBLOCK = "bytecblock"
+PUSHINT = "pushint"
+PUSHBYTES = "pushbytes"
+
+OPS = [
+    (0x00, "err", 0, 1),
+    (0x01, "sha256", 0, 35),
+    (0x02, "keccak256", 0, 130),
+    (0x03, "sha512_256", 0, 45),
+    (0x04, "ed25519verify", 0, 1900),
+    (0x05, "ecdsa_verify", 1, 1700),
+    (0x06, "ecdsa_pk_decompress", 1, 650),
+    (0x07, "ecdsa_pk_recover", 1, 2000),
+    (0x08, "+", 0, 1),
+    (0x09, "-", 0, 1),
+    (0x0a, "/", 0, 1),
+    (0x0b, "*", 0, 1),
+    (0x0c, "<", 0, 1),
+    (0x0d, ">", 0, 1),
+    (0x0e, "<=", 0, 1),
+    (0x0f, ">=", 0, 1),
+    (0x10, "&&", 0, 1),
+    (0x11, "||", 0, 1),
+    (0x12, "==", 0, 1),
+    (0x13, "!=", 0, 1),
+    (0x14, "!", 0, 1),
+    (0x15, "len", 0, 1),
+    (0x16, "itob", 0, 1),
+    (0x17, "btoi", 0, 1),
+    (0x18, "%", 0, 1),
+    (0x19, "|", 0, 1),
+    (0x1a, "&", 0, 1),
+    (0x1b, "^", 0, 1),
+    (0x1c, "~", 0, 1),
+    (0x1d, "mulw", 0, 1),
+    (0x1e, "addw", 0, 1),
+    (0x1f, "divmodw", 0, 20),
+    (0x20, "intcblock", INTCBLOCK, 1),
+    (0x21, "intc", 1, 1),
+    (0x22, "intc_0", 0, 1),
+    (0x23, "intc_1", 0, 1),
+    (0x24, "intc_2", 0, 1),
+    (0x25, "intc_3", 0, 1),
+    (0x26, "bytecblock", BYTECBLOCK, 1),
+    (0x27, "bytec", 1, 1),
+    (0x28, "bytec_0", 0, 1),
+    (0x29, "bytec_1", 0, 1),
+    (0x2a, "bytec_2", 0, 1),
+    (0x2b, "bytec_3", 0, 1),
+    (0x2c, "arg", 1, 1),
+    (0x2d, "arg_0", 0, 1),
+    (0x2e, "arg_1", 0, 1),
+    (0x2f, "arg_2", 0, 1),
+    (0x30, "arg_3", 0, 1),
+    (0x31, "txn", 1, 1),
+    (0x32, "global", 1, 1),
+    (0x33, "gtxn", 2, 1),
+    (0x34, "load", 1, 1),
+    (0x35, "store", 1, 1),
+    (0x36, "txna", 2, 1),
+    (0x37, "gtxna", 3, 1),
+    (0x38, "gtxns", 1, 1),
+    (0x39, "gtxnsa", 2, 1),
+    (0x3a, "gload", 2, 1),
+    (0x3b, "gloads", 1, 1),
+    (0x3c, "gaid", 1, 1),
+    (0x3d, "gaids", 0, 1),
+    (0x3e, "loads", 0, 1),
+    (0x3f, "stores", 0, 1),
+    (0x40, "bnz", BRANCH, 1),
+    (0x41, "bz", BRANCH, 1),
+    (0x42, "b", BRANCH, 1),
+    (0x43, "return", 0, 1),
+    (0x44, "assert", 0, 1),
+    (0x48, "pop", 0, 1),
+    (0x49, "dup", 0, 1),
+    (0x4a, "dup2", 0, 1),
+    (0x4b, "dig", 1, 1),
+    (0x4c, "swap", 0, 1),
+    (0x4d, "select", 0, 1),
+    (0x4e, "cover", 1, 1),
+    (0x4f, "uncover", 1, 1),
+    (0x50, "concat", 0, 1),
+    (0x51, "substring", 2, 1),
+    (0x52, "substring3", 0, 1),
+    (0x53, "getbit", 0, 1),
+    (0x54, "setbit", 0, 1),
+    (0x55, "getbyte", 0, 1),
+    (0x56, "setbyte", 0, 1),
+    (0x57, "extract", 2, 1),
+    (0x58, "extract3", 0, 1),
+    (0x59, "extract_uint16", 0, 1),
+    (0x5a, "extract_uint32", 0, 1),
+    (0x5b, "extract_uint64", 0, 1),
+    (0x60, "balance", 0, 1),
+    (0x61, "app_opted_in", 0, 1),
+    (0x62, "app_local_get", 0, 1),
+    (0x63, "app_local_get_ex", 0, 1),
+    (0x64, "app_global_get", 0, 1),
+    (0x65, "app_global_get_ex", 0, 1),
+    (0x66, "app_local_put", 0, 1),
+    (0x67, "app_global_put", 0, 1),
+    (0x68, "app_local_del", 0, 1),
+    (0x69, "app_global_del", 0, 1),
+    (0x70, "asset_holding_get", 1, 1),
+    (0x71, "asset_params_get", 1, 1),
+    (0x72, "app_params_get", 1, 1),
+    (0x73, "acct_params_get", 1, 1),
+    (0x78, "min_balance", 0, 1),
+    (0x80, "pushbytes", PUSHBYTES, 1),
+    (0x81, "pushint", PUSHINT, 1),
+    (0x88, "callsub", BRANCH, 1),
+    (0x89, "retsub", 0, 1),
+    (0x90, "shl", 0, 1),
+    (0x91, "shr", 0, 1),
+    (0x92, "sqrt", 0, 4),
+    (0x93, "bitlen", 0, 1),
+    (0x94, "exp", 0, 1),
+    (0x95, "expw", 0, 10),
+    (0x96, "bsqrt", 0, 40),
+    (0x97, "divw", 0, 1),
+    (0xa0, "b+", 0, 10),
+    (0xa1, "b-", 0, 10),
+    (0xa2, "b/", 0, 20),
+    (0xa3, "b*", 0, 20),
+    (0xa4, "b<", 0, 1),
+    (0xa5, "b>", 0, 1),
+    (0xa6, "b<=", 0, 1),
+    (0xa7, "b>=", 0, 1),
+    (0xa8, "b==", 0, 1),
+    (0xa9, "b!=", 0, 1),
+    (0xaa, "b%", 0, 20),
+    (0xab, "b|", 0, 6),
+    (0xac, "b&", 0, 6),
+    (0xad, "b^", 0, 6),
+    (0xae, "b~", 0, 4),
+    (0xaf, "bzero", 0, 1),
+    (0xb0, "log", 0, 1),
+    (0xb1, "itxn_begin", 0, 1),
+    (0xb2, "itxn_field", 1, 1),
+    (0xb3, "itxn_submit", 0, 1),
+    (0xb4, "itxn", 1, 1),
+    (0xb5, "itxna", 2, 1),
+    (0xb6, "itxn_next", 0, 1),
+    (0xb7, "gitxn", 2, 1),
+    (0xb8, "gitxna", 3, 1),
+    (0xc0, "txnas", 1, 1),
+    (0xc1, "gtxnas", 2, 1),
+    (0xc2, "gtxnsas", 1, 1),
+    (0xc3, "args", 0, 1),
+    (0xc4, "gloadss", 0, 1),
+    (0xc5, "itxnas", 1, 1),
+    (0xc6, "gitxnas", 2, 1),
+]
+
+OPCODES = {name: (opcode, immediates, cost) for opcode, name, immediates, cost in OPS}
+
+TXN_FIELDS = [
+    "Sender", "Fee", "FirstValid", "FirstValidTime", "LastValid", "Note", "Lease",
+    "Receiver", "Amount", "CloseRemainderTo", "VotePK", "SelectionPK", "VoteFirst",
+    "VoteLast", "VoteKeyDilution", "Type", "TypeEnum", "XferAsset", "AssetAmount",
+    "AssetSender", "AssetReceiver", "AssetCloseTo", "GroupIndex", "TxID",
+    "ApplicationID", "OnCompletion", "ApplicationArgs", "NumAppArgs", "Accounts",
+    "NumAccounts", "ApprovalProgram", "ClearStateProgram", "RekeyTo", "ConfigAsset",
+    "ConfigAssetTotal", "ConfigAssetDecimals", "ConfigAssetDefaultFrozen",
+    "ConfigAssetUnitName", "ConfigAssetName", "ConfigAssetURL",
+    "ConfigAssetMetadataHash", "ConfigAssetManager", "ConfigAssetReserve",
+    "ConfigAssetFreeze", "ConfigAssetClawback", "FreezeAsset", "FreezeAssetAccount",
+    "FreezeAssetFrozen", "Assets", "NumAssets", "Applications", "NumApplications",
+    "GlobalNumUint", "GlobalNumByteSlice", "LocalNumUint", "LocalNumByteSlice",
+    "ExtraProgramPages", "Nonparticipation", "Logs", "NumLogs", "CreatedAssetID",
+    "CreatedApplicationID", "LastLog", "StateProofPK",
+]
+
+GLOBAL_FIELDS = [
+    "MinTxnFee", "MinBalance", "MaxTxnLife", "ZeroAddress", "GroupSize",
+    "LogicSigVersion", "Round", "LatestTimestamp", "CurrentApplicationID",
+    "CreatorAddress", "CurrentApplicationAddress", "GroupID", "OpcodeBudget",
+    "CallerApplicationID", "CallerApplicationAddress",
+]
+
+ASSET_HOLDING_FIELDS = ["AssetBalance", "AssetFrozen"]
+
+ASSET_PARAMS_FIELDS = [
+    "AssetTotal", "AssetDecimals", "AssetDefaultFrozen", "AssetUnitName", "AssetName",
+    "AssetURL", "AssetMetadataHash", "AssetManager", "AssetReserve", "AssetFreeze",
+    "AssetClawback", "AssetCreator",
+]
+
+APP_PARAMS_FIELDS = [
+    "AppApprovalProgram", "AppClearStateProgram", "AppGlobalNumUint",
+    "AppGlobalNumByteSlice", "AppLocalNumUint", "AppLocalNumByteSlice",
+    "AppExtraProgramPages", "AppCreator", "AppAddress",
+]
+
+ACCT_PARAMS_FIELDS = ["AcctBalance", "AcctMinBalance", "AcctAuthAddr"]
+
+# Field names each op accepts as an immediate
+FIELD_NAMES = {}
+for _name in ["txn", "gtxn", "txna", "gtxna", "gtxns", "gtxnsa", "txnas", "gtxnas", "gtxnsas",
+              "itxn_field", "itxn", "itxna", "gitxn", "gitxna", "itxnas", "gitxnas"]:
+    FIELD_NAMES[_name] = TXN_FIELDS
+FIELD_NAMES["global"] = GLOBAL_FIELDS
+FIELD_NAMES["asset_holding_get"] = ASSET_HOLDING_FIELDS
+FIELD_NAMES["asset_params_get"] = ASSET_PARAMS_FIELDS
+FIELD_NAMES["app_params_get"] = APP_PARAMS_FIELDS
+FIELD_NAMES["acct_params_get"] = ACCT_PARAMS_FIELDS
+for _name in ["ecdsa_verify", "ecdsa_pk_decompress", "ecdsa_pk_recover"]:
+    FIELD_NAMES[_name] = ["Secp256k1"]
+
+# Named constants accepted by `int`
+NAMED_INTS = {
+    "unknown": 0, "pay": 1, "keyreg": 2, "acfg": 3, "axfer": 4, "afrz": 5, "appl": 6,
+    "NoOp": 0, "OptIn": 1, "CloseOut": 2, "ClearState": 3,
+    "UpdateApplication": 4, "DeleteApplication": 5,
+}
+
+# Versions from which algod moves constants into optimized blocks and allows backward branches
+OPTIMIZE_CONSTANTS_VERSION = 4
+BACK_BRANCH_VERSION = 4
+
+# One assembled instruction: pc and size are in the final program,
+# target is the label of branches and callsub
+Instruction = namedtuple("Instruction", ["op", "args", "pc", "size", "cost", "target"])
+
+class AssemblyError(Exception):
+    def __init__(self, line, message):
+        super().__init__("line {}: {}".format(line, message))
+        self.line = line
+
+def varint(num):
+    output = bytearray()
+    while num >= 128:
+        output.append((num & 127) | 128)
+        num >>= 7
+    output.append(num)
+    return bytes(output)
+
+def program_address(program):
+    # Address of a LogicSig / the "hash" returned by algod
+    return encoding.encode_address(encoding.checksum(b"Program" + program))
+
+# Parsing
+
+def _tokens(line):
+    # Splits a line on whitespace and ';', keeping quoted strings whole and dropping // comments
+    fields, current, in_string, i = [], "", False, 0
+    while i < len(line):
+        c = line[i]
+        if in_string:
+            current += c
+            if c == "\\" and i + 1 < len(line):
+                current += line[i + 1]
+                i += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            current += c
+            in_string = True
+        elif line.startswith("//", i):
+            break
+        elif c.isspace() or c == ";":
+            if current:
+                fields.append(current)
+                current = ""
+            if c == ";":
+                fields.append(";")
+        else:
+            current += c
+        i += 1
+    if current:
+        fields.append(current)
+    return fields
+
+def _string_literal(token, line):
+    body = token[1:-1]
+    output = bytearray()
+    i = 0
+    escapes = {"n": 10, "r": 13, "t": 9, "\\": 92, '"': 34}
+    while i < len(body):
+        c = body[i]
+        if c != "\\":
+            output += c.encode()
+            i += 1
+            continue
+        if i + 1 >= len(body):
+            raise AssemblyError(line, "invalid escape in " + token)
+        e = body[i + 1]
+        if e in escapes:
+            output.append(escapes[e])
+            i += 2
+        elif e == "x":
+            output.append(int(body[i + 2:i + 4], 16))
+            i += 4
+        else:
+            raise AssemblyError(line, "invalid escape in " + token)
+    return bytes(output)
+
+def _byte_literal(args, line):
+    # Accepts "string", 0xhex, base64 X, b64 X, base64(X), b64(X) and the base32 forms
+    if not args:
+        raise AssemblyError(line, "byte needs an argument")
+    arg = args[0]
+    for prefix, decode in (("base64", base64.b64decode), ("b64", base64.b64decode),
+                           ("base32", lambda s: base64.b32decode(s + "=" * (-len(s) % 8))),
+                           ("b32", lambda s: base64.b32decode(s + "=" * (-len(s) % 8)))):
+        if arg == prefix and len(args) == 2:
+            return decode(args[1])
+        if arg.startswith(prefix + "(") and arg.endswith(")"):
+            return decode(arg[len(prefix) + 1:-1])
+    if arg.startswith("0x"):
+        return bytes.fromhex(arg[2:])
+    if arg.startswith('"') and arg.endswith('"') and len(arg) >= 2:
+        return _string_literal(arg, line)
+    raise AssemblyError(line, "unknown byte literal " + arg)
+
+def _uint(arg, line):
+    try:
+        return int(arg, 0)
+    except ValueError:
+        raise AssemblyError(line, "expected an integer, got " + arg)
+
+def _parse(teal):
+    # Returns (version, items); items are ("label", name) or (op, args, line)
+    version = 1
+    items = []
+    for number, raw in enumerate(teal.splitlines(), 1):
+        stripped = raw.strip()
+        if stripped.startswith("#pragma"):
+            parts = stripped.split()
+            if len(parts) == 3 and parts[1] == "version":
+                version = int(parts[2])
+                continue
+            raise AssemblyError(number, "unknown pragma " + stripped)
+        statement = []
+        for token in _tokens(raw) + [";"]:
+            if token != ";":
+                statement.append(token)
+                continue
+            if statement and statement[0].endswith(":"):
+                items.append(("label", statement[0][:-1]))
+                statement = statement[1:]
+            if statement:
+                items.append((statement[0], statement[1:], number))
+            statement = []
+    return version, items
+
+# Assembly
+
+def _instructions(items):
+    # Turns parsed items into ("raw"|"int"|"byte"|"branch"|"label", ...) entries
+    out = []
+    for item in items:
+        if item[0] == "label":
+            out.append(item)
+            continue
+        op, args, line = item
+        if op == "int":
+            if len(args) != 1:
+                raise AssemblyError(line, "int needs one argument")
+            value = NAMED_INTS[args[0]] if args[0] in NAMED_INTS else _uint(args[0], line)
+            out.append(("int", value, line))
+            continue
+        if op == "byte":
+            out.append(("byte", _byte_literal(args, line), line))
+            continue
+        if op == "addr":
+            out.append(("byte", encoding.decode_address(args[0]), line))
+            continue
+        # Forms algod rewrites to a different opcode
+        if op == "txn" and len(args) == 2:
+            op = "txna"
+        elif op == "gtxn" and len(args) == 3:
+            op = "gtxna"
+        elif op == "arg" and len(args) == 1 and _uint(args[0], line) < 4:
+            op, args = "arg_" + args[0], []
+        if op not in OPCODES:
+            raise AssemblyError(line, "unknown opcode " + op)
+        opcode, immediates, cost = OPCODES[op]
+        if immediates == BRANCH:
+            out.append(("branch", op, args[0], line))
+        elif immediates == PUSHINT:
+            out.append(("raw", op, args, bytes([opcode]) + varint(_uint(args[0], line)), line))
+        elif immediates == PUSHBYTES:
+            value = _byte_literal(args, line)
+            out.append(("raw", op, args, bytes([opcode]) + varint(len(value)) + value, line))
+        elif immediates in (INTCBLOCK, BYTECBLOCK):
+            raise AssemblyError(line, op + " is not supported, use int/byte")
+        else:
+            if len(args) != immediates:
+                raise AssemblyError(line, "{} expects {} immediates".format(op, immediates))
+            encoded = bytearray([opcode])
+            names = FIELD_NAMES.get(op, [])
+            for arg in args:
+                value = names.index(arg) if arg in names else _uint(arg, line)
+                if not 0 <= value < 256:
+                    raise AssemblyError(line, "immediate out of range: " + arg)
+                encoded.append(value)
+            out.append(("raw", op, args, bytes(encoded), line))
+    return out
+
+def _constant_block(values, version):
+    # Mirrors algod: block of constants used more than once, most used first (ties keep first use order)
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    ordered = list(counts)
+    if version < OPTIMIZE_CONSTANTS_VERSION:
+        return ordered
+    ordered.sort(key=lambda v: -counts[v])
+    return [v for v in ordered if counts[v] > 1]
+
+def _int_reference(value, block):
+    if value in block:
+        i = block.index(value)
+        return bytes([0x22 + i]) if i < 4 else bytes([0x21, i])
+    return bytes([0x81]) + varint(value)
+
+def _byte_reference(value, block):
+    if value in block:
+        i = block.index(value)
+        return bytes([0x28 + i]) if i < 4 else bytes([0x27, i])
+    return bytes([0x80]) + varint(len(value)) + value
+
+def assemble_listing(teal):
+    """Assembles `teal`, returning (program, instructions, labels)"""
+    version, items = _parse(teal)
+    entries = _instructions(items)
+    intc = _constant_block([e[1] for e in entries if e[0] == "int"], version)
+    bytec = _constant_block([e[1] for e in entries if e[0] == "byte"], version)
+
+    header = varint(version)
+    if intc:
+        header += bytes([0x20]) + varint(len(intc)) + b"".join(varint(v) for v in intc)
+    if bytec:
+        header += bytes([0x26]) + varint(len(bytec)) + b"".join(varint(len(v)) + v for v in bytec)
+
+    # Lays out the code, branches are fixed up once every label is known
+    code = bytearray()
+    labels = {}
+    pending = []
+    listing = []
+    for entry in entries:
+        kind = entry[0]
+        pc = len(header) + len(code)
+        if kind == "label":
+            labels[entry[1]] = pc
+            continue
+        if kind == "int":
+            encoded = _int_reference(entry[1], intc)
+            listing.append(Instruction("int", [str(entry[1])], pc, len(encoded), 1, None))
+        elif kind == "byte":
+            encoded = _byte_reference(entry[1], bytec)
+            listing.append(Instruction("byte", ["0x" + entry[1].hex()], pc, len(encoded), 1, None))
+        elif kind == "branch":
+            _, op, label, line = entry
+            encoded = bytes([OPCODES[op][0], 0, 0])
+            pending.append((len(code), label, line))
+            listing.append(Instruction(op, [label], pc, 3, OPCODES[op][2], label))
+        else:
+            _, op, args, encoded, line = entry
+            listing.append(Instruction(op, args, pc, len(encoded), OPCODES[op][2], None))
+        code += encoded
+
+    for offset, label, line in pending:
+        if label not in labels:
+            raise AssemblyError(line, "reference to undefined label " + label)
+        jump = labels[label] - (len(header) + offset + 3)
+        if jump < 0 and version < BACK_BRANCH_VERSION:
+            raise AssemblyError(line, "backward branches require version " + str(BACK_BRANCH_VERSION))
+        if not -0x8000 <= jump < 0x8000:
+            raise AssemblyError(line, "branch to " + label + " is too far")
+        code[offset + 1:offset + 3] = (jump & 0xffff).to_bytes(2, "big")
+
+    return header + bytes(code), listing, labels
+
+def assemble(teal):
+    return assemble_listing(teal)[0]
+
+def compile(teal):
+    # Same response shape as AlgodClient.compile
+    program = assemble(teal)
+    return {"result": base64.b64encode(program).decode(), "hash": program_address(program)}
+
+def verify(client, teal):
+    # Checks the offline result against algod's compile endpoint
+    return client.compile(teal) == compile(teal)
+
+# Saved algod outputs
+
+ALGOD_OUTPUTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "teal_asm_algod.json")
+# First sample id for each id size in bytes, testnet ids are 3 byte varints and mainnet ones 5
+SAMPLE_ID_BASES = {3: 1000000, 5: 700000000}
+
+def sample_programs():
+    """Yields (name, teal) for every contract, built with ids of each size in SAMPLE_ID_BASES"""
+    import teal_cost
+    for size, base in sorted(SAMPLE_ID_BASES.items()):
+        ids = {name: base + i for i, name in enumerate(sorted(teal_cost.SAMPLE_IDS))}
+        for name, builder, args, mode, _ in teal_cost.programs(ids):
+            yield "{}@{}".format(name, size), teal_cost._compile(builder, args, mode).teal
+
+def record(client, path=ALGOD_OUTPUTS):
+    # Saves algod's output for sample_programs(), CRLF like the rest of the repo
+    build = client.versions()["build"]
+    programs = {name: {"teal": teal, "result": client.compile(teal)["result"]} for name, teal in sample_programs()}
+    with open(path, "w", newline="\r\n") as f:
+        json.dump({"algod": "{major}.{minor}.{build_number}".format(**build), "programs": programs}, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+def check(path=ALGOD_OUTPUTS):
+    """Returns the saved algod outputs (see record) that teal_asm does not reproduce"""
+    with open(path) as f:
+        saved = json.load(f)["programs"]
+    problems = []
+    for name, case in sorted(saved.items()):
+        try:
+            result = compile(case["teal"])["result"]
+        except AssemblyError as e:
+            problems.append("{}: {}".format(name, e))
+            continue
+        if result != case["result"]:
+            problems.append("{}: {} bytes differ from algod's {}".format(name, len(base64.b64decode(result)), len(base64.b64decode(case["result"]))))
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checks teal_asm against saved algod outputs")
+    parser.add_argument("--check", action="store_true", help="fail if any saved output is not reproduced")
+    parser.add_argument("--record", action="store_true", help="save algod's outputs for every contract")
+    parser.add_argument("--algod", help="algod address for --record")
+    parser.add_argument("--token", default="", help="algod token for --record")
+    parser.add_argument("--path", default=ALGOD_OUTPUTS)
+    args = parser.parse_args()
+
+    if args.record:
+        from utils import algod_client
+        record(algod_client(args.algod, args.token), args.path)
+    if args.check:
+        problems = check(args.path)
+        for problem in problems:
+            print("MISMATCH " + problem)
+        sys.exit(1 if problems else 0)
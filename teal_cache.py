@@ -0,0 +1,190 @@
+# teal_cache.py
+
+'''
+Content-addressed cache for compiled TEAL.
+
+Artifacts (TEAL source, assembled bytes and program hash) are keyed by a hash
+of the TEAL source and version, and kept in two tiers: a small in-memory LRU
+and a size-bounded directory that can be shared between processes. A second
+index maps a program "recipe" (builder function and its arguments) to the
+source hash, so a warm cache also skips building the PyTeal expression.
+
+Artifacts assembled offline by teal_asm are marked as such. They are not
+served to callers that pass a client: those recompile through algod, which
+replaces the offline artifact, since only algod's bytes are authoritative.
+'''
+
+import base64
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict, namedtuple
+from pyteal import compileTeal, Expr
+import teal_asm
+
+# offline is True for programs assembled by teal_asm rather than algod
+Artifact = namedtuple("Artifact", ["teal", "program", "hash", "offline"])
+
+DEFAULT_DIRECTORY = os.environ.get("GARD_TEAL_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "gard", "teal"))
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_MEMORY = 256
+
+_fingerprint = None
+
+def source_fingerprint():
+    # Hash of every module next to this one, so recipes go stale whenever contract code changes
+    global _fingerprint
+    if _fingerprint is None:
+        h = hashlib.sha256()
+        for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))):
+            with open(path, "rb") as f:
+                h.update(f.read())
+        _fingerprint = h.hexdigest()
+    return _fingerprint
+
+def source_key(teal, version):
+    return hashlib.sha256(("%d\n" % version).encode() + teal.encode()).hexdigest()
+
+def recipe_key(builder, args, kwargs, mode, version):
+    # PyTeal expressions have stable str() forms, everything else uses repr()
+    describe = lambda v: str(v) if isinstance(v, Expr) else repr(v)
+    parts = [source_fingerprint(), builder.__module__, builder.__qualname__, str(mode), str(version)]
+    parts += [describe(a) for a in args]
+    parts += [k + "=" + describe(v) for k, v in sorted(kwargs.items())]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+class TealCache:
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES, max_memory=DEFAULT_MAX_MEMORY):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_memory = max_memory
+        self._memory = OrderedDict()
+        self._recipes = {}
+        self.hits = 0
+        self.misses = 0
+
+    # Disk tier
+
+    def _path(self, kind, key):
+        return os.path.join(self.directory, kind, key[:2], key + ".json")
+
+    def _read(self, kind, key):
+        if self.directory is None:
+            return None
+        path = self._path(kind, key)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            # Reads count as use for eviction
+            os.utime(path)
+            return data
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, kind, key, data):
+        if self.directory is None:
+            return
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomic so that processes sharing the directory never see partial files
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+        self._evict()
+
+    def _evict(self):
+        # Removes least recently used artifacts until the directory fits in max_bytes
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*", "*", "*.json")):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    # Memory + disk
+
+    def get(self, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        data = self._read("artifacts", key)
+        if data is None:
+            return None
+        # Entries written before the offline flag existed may have been assembled offline
+        artifact = Artifact(data["teal"], base64.b64decode(data["program"]), data["hash"], data.get("offline", True))
+        self._remember(key, artifact)
+        return artifact
+
+    def put(self, key, artifact):
+        self._remember(key, artifact)
+        self._write("artifacts", key, {
+            "teal": artifact.teal,
+            "program": base64.b64encode(artifact.program).decode(),
+            "hash": artifact.hash,
+            "offline": artifact.offline,
+        })
+
+    def _remember(self, key, artifact):
+        self._memory[key] = artifact
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def _recipe_source(self, recipe):
+        if recipe in self._recipes:
+            return self._recipes[recipe]
+        data = self._read("recipes", recipe)
+        return data["source"] if data else None
+
+    def _save_recipe(self, recipe, key):
+        self._recipes[recipe] = key
+        self._write("recipes", recipe, {"source": key})
+
+    def compile(self, client, program, mode, version, recipe=None):
+        """
+        Returns the Artifact for `program`, compiling it only on a cache miss.
+
+        `program` is a PyTeal expression, or a zero-argument callable building one
+        when a `recipe` key is given (see recipe_key). `client` may be None to
+        assemble with teal_asm instead of algod. With a client, artifacts that
+        were assembled offline count as misses.
+        """
+        usable = lambda artifact: artifact is not None and (client is None or not artifact.offline)
+        if recipe is not None:
+            key = self._recipe_source(recipe)
+            artifact = self.get(key) if key else None
+            if usable(artifact):
+                self.hits += 1
+                return artifact
+        if callable(program):
+            program = program()
+        teal = compileTeal(program, mode, version=version)
+        key = source_key(teal, version)
+        artifact = self.get(key)
+        if not usable(artifact):
+            self.misses += 1
+            # Without a client the program is assembled offline
+            res = (client if client is not None else teal_asm).compile(teal)
+            artifact = Artifact(teal, base64.b64decode(res["result"]), res["hash"], client is None)
+            self.put(key, artifact)
+        else:
+            self.hits += 1
+        if recipe is not None:
+            self._save_recipe(recipe, key)
+        return artifact
+
+default_cache = TealCache()
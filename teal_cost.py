@@ -0,0 +1,437 @@
+# teal_cost.py
+
+'''
+Static opcode cost and size analysis of the contracts.
+
+Walks the assembled TEAL of every contract and reports, for each arm of the
+top level Cond (and of a Cond nested directly in one of its arms), the
+worst-case opcode cost of a successful call (dispatch checks before the arm
+included), the cost of every loop reachable from the arm per iteration, and
+the bytes of code the arm owns. Costs are upper
+bounds: every branch is assumed to take its most expensive side, paths
+ending in err are ignored and loops count zero iterations in the base cost.
+
+Loops are named after the subroutine holding them ("main" outside of any)
+and their order in it, e.g. checkallvotes[0], so that the names survive
+PyTeal renumbering its labels.
+
+Run `python teal_cost.py --check` as a benchmark gate: it fails when an arm
+costs more or grows compared to teal_cost_baseline.json, when a program, arm
+or loop is new or gone, or when a program breaks the opcode budget or size
+limit. `--update` rewrites the baseline.
+'''
+
+import argparse
+import base64
+import json
+import os
+import re
+import sys
+from pyteal import Mode, Int
+from algosdk.future.transaction import OnComplete
+import teal_asm
+import teal_cache
+
+# Limits per mode: (opcode budget, program bytes)
+LIMITS = {
+    Mode.Application: (700, 2048),
+    Mode.Signature: (20000, 1000),
+}
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "teal_cost_baseline.json")
+
+# Ops that leave the current path
+_TERMINAL = ("return", "err", "retsub")
+_ON_COMPLETE = {v.real: name[:-2] if name.endswith("OC") else name for name, v in OnComplete.__members__.items()}
+
+class ArmCost:
+
+    def __init__(self, name, label, cost, loops, size):
+        self.name = name
+        self.label = label
+        self.cost = cost
+        # [(loop name, cost per iteration)]
+        self.loops = loops
+        self.size = size
+
+    def describe(self):
+        cost = str(self.cost)
+        for i, (loop, per_iteration) in enumerate(self.loops):
+            cost += " + {}*n{} ({})".format(per_iteration, i, loop)
+        return cost
+
+    def to_json(self):
+        return {"cost": self.cost, "loops": {loop: c for loop, c in self.loops}, "size": self.size}
+
+class ProgramCost:
+
+    def __init__(self, name, mode, size, arms):
+        self.name = name
+        self.mode = mode
+        self.size = size
+        self.arms = arms
+
+    @property
+    def budget(self):
+        return LIMITS[self.mode][0]
+
+    @property
+    def size_limit(self):
+        return LIMITS[self.mode][1]
+
+    def to_json(self):
+        return {"size": self.size, "arms": {arm.name: arm.to_json() for arm in self.arms}}
+
+class _Graph:
+    # Control flow over the instruction listing of one program
+
+    def __init__(self, teal):
+        self.program, self.listing, labels = teal_asm.assemble_listing(teal)
+        index = {ins.pc: i for i, ins in enumerate(self.listing)}
+        # A label at the end of the program points past the last instruction
+        self.targets = {name: index.get(pc, len(self.listing)) for name, pc in labels.items()}
+        self.label_at = {}
+        for name, i in sorted(self.targets.items(), key=lambda item: item[0]):
+            self.label_at.setdefault(i, name)
+        self._longest = {}
+        self._subroutines = {}
+        self.back_edges = set()
+
+    def successors(self, i):
+        ins = self.listing[i]
+        if ins.op == "b":
+            return [self.targets[ins.target]]
+        if ins.op in ("bz", "bnz"):
+            return [i + 1, self.targets[ins.target]]
+        if ins.op in _TERMINAL:
+            return []
+        return [i + 1]
+
+    def cost(self, i):
+        ins = self.listing[i]
+        if ins.op == "callsub":
+            return ins.cost + self.subroutine(self.targets[ins.target])
+        return ins.cost
+
+    def subroutine(self, entry):
+        # Worst cost from a subroutine's entry to its retsub
+        if entry not in self._subroutines:
+            self._subroutines[entry] = None
+            self._subroutines[entry] = self.longest(entry, ("sub", entry), set())
+        cost = self._subroutines[entry]
+        if cost is None:
+            raise ValueError("recursive subroutine at " + self.label_at.get(entry, str(entry)))
+        return cost
+
+    def longest(self, i, context, stack):
+        """
+        Worst cost of a successful path from instruction i to the end of `context`
+        (the program, or the subroutine being costed). Edges back into `stack`
+        are loop back edges and are not followed, so loops count zero iterations.
+        """
+        key = (i, context)
+        if key in self._longest:
+            return self._longest[key]
+        if i >= len(self.listing):
+            return 0
+        ins = self.listing[i]
+        if ins.op == "err":
+            return None
+        if ins.op == "retsub" and context[0] != "sub":
+            return None
+        stack.add(i)
+        best = None
+        successors = self.successors(i)
+        if not successors:
+            best = 0
+        for s in successors:
+            if s in stack:
+                self.back_edges.add((i, s))
+                continue
+            rest = self.longest(s, context, stack)
+            if rest is not None and (best is None or rest > best):
+                best = rest
+        stack.discard(i)
+        result = None if best is None else self.cost(i) + best
+        self._longest[key] = result
+        return result
+
+    def reachable(self, start):
+        # Instructions reachable from start, following calls into subroutines
+        seen, todo = set(), [start]
+        while todo:
+            i = todo.pop()
+            if i in seen or i >= len(self.listing):
+                continue
+            seen.add(i)
+            todo.extend(self.successors(i))
+            if self.listing[i].op == "callsub":
+                todo.append(self.targets[self.listing[i].target])
+        return seen
+
+    def owned(self, start):
+        # Instructions reachable from start without entering subroutines
+        seen, todo = set(), [start]
+        while todo:
+            i = todo.pop()
+            if i in seen or i >= len(self.listing):
+                continue
+            seen.add(i)
+            todo.extend(self.successors(i))
+        return seen
+
+    def iteration(self, header, source):
+        # Worst cost around one loop: from the header to the back edge at source
+        memo = {}
+        def walk(i, stack):
+            if i == source:
+                return self.cost(i)
+            if i in memo:
+                return memo[i]
+            if i >= len(self.listing) or self.listing[i].op in _TERMINAL:
+                return None
+            stack.add(i)
+            best = None
+            for s in self.successors(i):
+                if s in stack or s == header:
+                    continue
+                rest = walk(s, stack)
+                if rest is not None and (best is None or rest > best):
+                    best = rest
+            stack.discard(i)
+            memo[i] = None if best is None else self.cost(i) + best
+            return memo[i]
+        return walk(header, set())
+
+    def owner(self, i):
+        # Subroutine holding instruction i, without PyTeal's numbering, or "main"
+        entries = [entry for entry in self._subroutines if entry <= i]
+        if not entries:
+            return "main"
+        return re.sub(r"_\d+$", "", self.label_at.get(max(entries), "main"))
+
+    def loops(self, start):
+        # [(name, cost per iteration)] of the loops reachable from start, in program order
+        reachable = self.reachable(start)
+        found = {}
+        names = {}
+        counts = {}
+        for header, source in sorted((header, source) for source, header in self.back_edges):
+            if header not in reachable:
+                continue
+            if header not in names:
+                owner = self.owner(header)
+                counts[owner] = counts.get(owner, -1) + 1
+                names[header] = "{}[{}]".format(owner, counts[owner])
+            # A loop with several back edges (continue) costs its longest way around
+            cost = self.iteration(header, source)
+            if cost is not None and cost > found.get(names[header], -1):
+                found[names[header]] = cost
+        return list(found.items())
+
+def _arm_name(condition):
+    # Names an arm after its selector: a byte string, an on-completion, or an Arg(0) value
+    ops = [(ins.op, ins.args) for ins in condition]
+    for op, args in ops:
+        if op == "byte":
+            value = bytes.fromhex(args[0][2:])
+            if value and all(32 <= c < 127 for c in value):
+                return value.decode()
+    if ("txn", ["ApplicationID"]) in ops:
+        return "Create"
+    if ("txn", ["OnCompletion"]) in ops:
+        for op, args in ops:
+            if op == "int":
+                return _ON_COMPLETE.get(int(args[0]), args[0])
+    if any(op == "arg_0" for op, _ in ops):
+        for op, args in ops:
+            if op == "int":
+                return "Arg0=" + args[0]
+    return None
+
+def _dispatch(graph, start, prefix, top=False):
+    """
+    Returns (name, label, cost, target) for the arms of the Cond at `start`,
+    a straight run of condition; bnz pairs ending in err. Arms that are
+    themselves such a Cond (e.g. NoOp calls dispatched on their selector) are
+    replaced by their own arms.
+    """
+    arms = []
+    condition, i = [], start
+    while i < len(graph.listing):
+        ins = graph.listing[i]
+        if ins.op in ("b", "bz") or ins.op in _TERMINAL:
+            break
+        prefix += graph.cost(i)
+        if ins.op == "bnz":
+            target = graph.targets[ins.target]
+            nested = _dispatch(graph, target, prefix)
+            if nested:
+                arms += nested
+            else:
+                rest = graph.longest(target, ("main",), set())
+                if rest is not None:
+                    arms.append((_arm_name(condition), ins.target, prefix + rest, target))
+            condition = []
+        else:
+            condition.append(ins)
+        i += 1
+    ends_in_err = i < len(graph.listing) and graph.listing[i].op == "err"
+    if not top:
+        return arms if ends_in_err and len(arms) > 1 else []
+    if i < len(graph.listing) and not ends_in_err:
+        # Code after the dispatch, or a program with no top level Cond
+        rest = graph.longest(i, ("main",), set())
+        if rest is not None:
+            arms.append((None, graph.label_at.get(i, "main"), prefix + rest, i))
+    return arms
+
+def analyze(teal, mode, name="program", arm_names=None):
+    """
+    Returns the ProgramCost of `teal`. `arm_names` overrides the names derived
+    from the Cond selectors, in arm order.
+    """
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 20000))
+    try:
+        graph = _Graph(teal)
+        graph.longest(0, ("main",), set())
+
+        arms = _dispatch(graph, 0, 0, top=True)
+        results = []
+        for n, (arm_name, label, cost, target) in enumerate(arms):
+            if arm_names and n < len(arm_names):
+                arm_name = arm_names[n]
+            size = sum(graph.listing[j].size for j in graph.owned(target))
+            results.append(ArmCost(arm_name or label, label, cost, graph.loops(target), size))
+        return ProgramCost(name, mode, len(graph.program), results)
+    finally:
+        sys.setrecursionlimit(limit)
+
+# Contracts
+
+# Mainnet sized sample arguments, so constants assemble to their deployed sizes
+SAMPLE_IDS = {"open": 700000003, "close": 700000004, "manager": 700000005, "stable": 700000006,
+              "validator": 700000007, "dao": 700000001, "staking": 700000002}
+SAMPLE_USER = "RHN53AKL3IJGOIF5BJTIUFDOH4KMPR45XS4JM63W46PWMFFR3PPZXF5DOQ"
+SAMPLE_DEVFEE = "X3U6WGN4ZH4Z7HJMQ3ZYIPGEQSJK2XQW6RXQ35I4QSK5UZYN3JRJ3J74ZI"
+SAMPLE_OTHER_USER = "XFQGRTPRRZF632IUE7UNTAHXI43YYLFC3LGWM5WFT7JIXJHSSQW5GLY74E"
+SAMPLE_CDP_ID = 12
+
+CDP_ARMS = ["Vote", "Liquidate", "RedeemStableFee", "RedeemStableNoFee", "Validator_OptIn", "More_gard", "StartAuction"]
+RESERVE_ARMS = ["OptInStable", "NewPosition", "MoreGARD"]
+
+def _cdp_template(ids=SAMPLE_IDS):
+    # The sample template and its layout, measured against a second sample as create_reserve does
+    from cdp_escrow import cdp
+    from cdp_template import find_layout
+    program = _compile(cdp, (SAMPLE_USER, SAMPLE_CDP_ID, ids["stable"], ids["validator"], SAMPLE_DEVFEE), Mode.Signature).program
+    other = _compile(cdp, (SAMPLE_OTHER_USER, SAMPLE_CDP_ID + 1, ids["stable"], ids["validator"], SAMPLE_DEVFEE), Mode.Signature).program
+    layout = find_layout(program, other, SAMPLE_USER, SAMPLE_OTHER_USER, SAMPLE_CDP_ID, SAMPLE_CDP_ID + 1)
+    return base64.b64encode(program).decode(), layout
+
+def programs(ids=SAMPLE_IDS):
+    """Yields (name, builder, args, mode, arm names) for every contract, built with `ids`"""
+    from price_validator import approval_program
+    from treasury import treasury_approval
+    from Stake import stake_program
+    from Vote_fee import vote_program, MIN_VAL, MAX_VAL
+    from Vote_manager import manager_approval
+    from cdp_escrow import cdp
+    from reserve_logic import reserve
+    yield "validator", approval_program, (ids["open"], ids["close"], ids["manager"], ids["stable"]), Mode.Application, None
+    yield "treasury", treasury_approval, (ids["manager"], ids["stable"], ids["dao"], ids["validator"]), Mode.Application, None
+    yield "stake", stake_program, (Int(ids["dao"]), SAMPLE_DEVFEE), Mode.Application, None
+    yield "vote_fee", vote_program, (ids["staking"], Int(MIN_VAL), Int(MAX_VAL)), Mode.Application, None
+    yield "vote_manager", manager_approval, (ids["staking"],), Mode.Application, None
+    yield "cdp", cdp, (SAMPLE_USER, SAMPLE_CDP_ID, ids["stable"], ids["validator"], SAMPLE_DEVFEE), Mode.Signature, CDP_ARMS
+    yield "reserve", reserve, (ids["stable"], ids["validator"], SAMPLE_DEVFEE, *_cdp_template(ids)), Mode.Signature, RESERVE_ARMS
+
+def _compile(builder, args, mode):
+    # Through the artifact cache, assembled offline
+    recipe = teal_cache.recipe_key(builder, args, {}, mode, 6)
+    return teal_cache.default_cache.compile(None, lambda: builder(*args), mode, 6, recipe=recipe)
+
+def analyze_all():
+    return [analyze(_compile(builder, args, mode).teal, mode, name, arm_names)
+            for name, builder, args, mode, arm_names in programs()]
+
+def report(results):
+    lines = []
+    for program in results:
+        lines.append("{} ({} bytes of {}, budget {})".format(program.name, program.size, program.size_limit, program.budget))
+        for arm in program.arms:
+            lines.append("    {:<20} {:>5} bytes  cost {}".format(arm.name, arm.size, arm.describe()))
+    return "\n".join(lines)
+
+def check(results, baseline):
+    """
+    Returns the list of regressions against `baseline` (see to_json), of
+    programs, arms and loops that are new or gone, and of limits broken.
+    """
+    problems = []
+    for name in sorted(set(baseline) - {program.name for program in results}):
+        problems.append("{}: in the baseline but not analyzed".format(name))
+    for program in results:
+        if program.size > program.size_limit:
+            problems.append("{}: {} bytes is over the {} byte limit".format(program.name, program.size, program.size_limit))
+        for arm in program.arms:
+            if arm.cost > program.budget:
+                problems.append("{}.{}: cost {} is over the budget of {}".format(program.name, arm.name, arm.cost, program.budget))
+        old = baseline.get(program.name)
+        if old is None:
+            problems.append("{}: not in the baseline".format(program.name))
+            continue
+        if program.size > old["size"]:
+            problems.append("{}: size {} -> {}".format(program.name, old["size"], program.size))
+        for name in sorted(set(old["arms"]) - {arm.name for arm in program.arms}):
+            problems.append("{}.{}: in the baseline but gone".format(program.name, name))
+        for arm in program.arms:
+            before = old["arms"].get(arm.name)
+            if before is None:
+                problems.append("{}.{}: not in the baseline".format(program.name, arm.name))
+                continue
+            now = arm.to_json()
+            for field in ("cost", "size"):
+                if now[field] > before[field]:
+                    problems.append("{}.{}: {} {} -> {}".format(program.name, arm.name, field, before[field], now[field]))
+            for loop in sorted(set(now["loops"]) | set(before["loops"])):
+                if loop not in before["loops"]:
+                    problems.append("{}.{}: loop {} not in the baseline".format(program.name, arm.name, loop))
+                elif loop not in now["loops"]:
+                    problems.append("{}.{}: loop {} in the baseline but gone".format(program.name, arm.name, loop))
+                elif now["loops"][loop] > before["loops"][loop]:
+                    problems.append("{}.{}: loop {} {} -> {} per iteration".format(program.name, arm.name, loop, before["loops"][loop], now["loops"][loop]))
+    return problems
+
+def to_json(results):
+    return {program.name: program.to_json() for program in results}
+
+def write_baseline(results, path=BASELINE):
+    # Keeps the line endings of an existing baseline, CRLF like the rest of the repo otherwise
+    newline = "\r\n"
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            newline = "\r\n" if b"\r\n" in f.read() else "\n"
+    with open(path, "w", newline=newline) as f:
+        json.dump(to_json(results), f, indent=4, sort_keys=True)
+        f.write("\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worst-case opcode cost and size of every contract arm")
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--update", action="store_true", help="write the current results as the baseline")
+    parser.add_argument("--baseline", default=BASELINE)
+    args = parser.parse_args()
+
+    results = analyze_all()
+    print(report(results))
+    if args.update:
+        write_baseline(results, args.baseline)
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = check(results, baseline)
+        for problem in problems:
+            print("REGRESSION " + problem)
+        sys.exit(1 if problems else 0)
@@ -3,9 +3,19 @@
 # on 1/11/2022
 
 from pyteal import *
-from utils import global_must_get
+from utils import global_must_get, dispatch, Memo, memoized
+from wide_math import mul_div
 
-def treasury_approval(manager_id, gard_id, dao_id, validator_id):
+# Swaps in both directions are the common calls, Opt_In only runs at setup
+METHOD_HOTNESS = {
+    "To_GARD": 100,
+    "To_ALGO": 100,
+    "Claim": 10,
+    "Payout": 5,
+    "Opt_In": 1,
+}
+
+def treasury_approval(manager_id, gard_id, dao_id, validator_id, hotness=METHOD_HOTNESS):
 
     stable_id = Int(gard_id)
     gain_id = Int(dao_id)
@@ -29,6 +39,10 @@ def treasury_approval(manager_id, gard_id, dao_id, validator_id):
     manager_account = global_must_get(Bytes("Manager"), Int(2))
     manager_percent = Int(18)
 
+    # Values an arm reads more than once, stored at the start of that arm
+    manager_memo = Memo(manager_account, TealType.bytes)
+    surplus_memo = Memo(Balance(Int(1))-App.globalGet(Bytes("ALGO_BALANCE")))
+
     on_create = Seq(
         App.globalPut(Bytes("ALGO_BALANCE"), Int(0)),
         App.globalPut(Bytes("Latest"), Global.latest_timestamp()),
@@ -65,7 +79,7 @@ def treasury_approval(manager_id, gard_id, dao_id, validator_id):
     )
 
     temp = ScratchVar(TealType.uint64)
-    payout = And(
+    payout = memoized(And(
         # Ensures 3 months have passed 
         Global.latest_timestamp() - global_must_get(Bytes("Latest"), Int(0)) >= Int(7889400),
         Txn.applications[1] == manager_app_id, 
@@ -74,7 +88,7 @@ def treasury_approval(manager_id, gard_id, dao_id, validator_id):
         Txn.assets[0] == stable_id,
         Seq( 
             App.globalPut(Bytes("Latest"), Global.latest_timestamp()),
-            temp.store((Balance(Int(1))-App.globalGet(Bytes("ALGO_BALANCE")))*manager_percent/Int(100)),
+            temp.store(surplus_memo.load()*manager_percent/Int(100)),
             Int(1)
         ),
         Seq(
@@ -83,7 +97,7 @@ def treasury_approval(manager_id, gard_id, dao_id, validator_id):
                 {
                     TxnField.type_enum: TxnType.Payment,
                     TxnField.receiver: founder_account,
-                    TxnField.amount: (Balance(Int(1))-App.globalGet(Bytes("ALGO_BALANCE")))*founder_percent/Int(100),
+                    TxnField.amount: surplus_memo.load()*founder_percent/Int(100),
                     TxnField.fee: Int(0),
                 }
             ),
@@ -101,7 +115,7 @@ def treasury_approval(manager_id, gard_id, dao_id, validator_id):
             App.globalPut(Bytes("ALGO_BALANCE"), Balance(Int(1))),
             Int(1)
         )
-    )
+    ), surplus_memo)
 
     gain_bal = AssetHolding.balance(Txn.accounts[1], Txn.assets[0])
     claim = And(
@@ -119,7 +133,7 @@ def treasury_approval(manager_id, gard_id, dao_id, validator_id):
                 {
                     TxnField.type_enum: TxnType.Payment,
                     TxnField.receiver: Txn.sender(),
-                    TxnField.amount: Btoi(BytesDiv(BytesMul(Itob(Balance(Int(1))),Itob(Gtxn[1].asset_amount())),Itob(initial_supply-gain_bal.value()))),
+                    TxnField.amount: mul_div(Balance(Int(1)), Gtxn[1].asset_amount(), initial_supply-gain_bal.value()),
                     TxnField.fee: Int(0),
                 }
             ),
@@ -128,12 +142,12 @@ def treasury_approval(manager_id, gard_id, dao_id, validator_id):
         )
     )
 
-    ALGO_TO_GARD = And(
+    ALGO_TO_GARD = memoized(And(
         Global.group_size() == Int(2),
         Txn.applications[1] == price_app_id,
         Txn.applications[2] == manager_app_id,
         Gtxn[1].type_enum() == TxnType.Payment,
-        Gtxn[0].sender() == manager_account,
+        Gtxn[0].sender() == manager_memo.load(),
         Gtxn[1].sender() == Gtxn[0].sender(),
         Gtxn[1].receiver() == Global.current_application_address(),
         Seq(
@@ -141,8 +155,8 @@ def treasury_approval(manager_id, gard_id, dao_id, validator_id):
             InnerTxnBuilder.SetFields(
                 {
                     TxnField.type_enum: TxnType.AssetTransfer,
-                    TxnField.asset_receiver: manager_account,
-                    TxnField.asset_amount: Btoi(BytesDiv(BytesMul(Itob(Gtxn[1].amount()),Itob(Int(10)**decimals)), Itob(price))),
+                    TxnField.asset_receiver: manager_memo.load(),
+                    TxnField.asset_amount: mul_div(Gtxn[1].amount(), Int(10)**decimals, price),
                     TxnField.xfer_asset: stable_id,
                     TxnField.fee: Int(0),
                 }
@@ -151,15 +165,15 @@ def treasury_approval(manager_id, gard_id, dao_id, validator_id):
             Int(1)
         ),
 
-    )
+    ), manager_memo)
 
-    GARD_TO_ALGO = And(
+    GARD_TO_ALGO = memoized(And(
         Global.group_size() == Int(2),
         Txn.applications[1] == price_app_id,
         Txn.applications[2] == manager_app_id,
         Gtxn[1].type_enum() == TxnType.AssetTransfer,
         Gtxn[1].xfer_asset() == stable_id,
-        Gtxn[0].sender() == manager_account,
+        Gtxn[0].sender() == manager_memo.load(),
         Gtxn[1].sender() == Gtxn[0].sender(),
         Gtxn[1].asset_receiver() == Global.current_application_address(),
         Seq(
@@ -167,30 +181,34 @@ def treasury_approval(manager_id, gard_id, dao_id, validator_id):
             InnerTxnBuilder.SetFields(
                 {
                     TxnField.type_enum: TxnType.Payment,
-                    TxnField.receiver: manager_account,
-                    TxnField.amount: Btoi(BytesDiv(BytesMul(Itob(Gtxn[1].asset_amount()),Itob(price)), Itob(Int(10)**decimals))),
+                    TxnField.receiver: manager_memo.load(),
+                    TxnField.amount: mul_div(Gtxn[1].asset_amount(), price, Int(10)**decimals),
                     TxnField.fee: Int(0),
                 }
             ),
             InnerTxnBuilder.Submit(),
             Int(1)
         )
-    )    
+    ), manager_memo)    
 
-    return Cond(
+    return dispatch(
         # On app creation
-        [Txn.application_id() == Int(0), on_create],
-        [Txn.on_completion() == OnComplete.DeleteApplication, Int(0)],
-        [Txn.on_completion() == OnComplete.UpdateApplication, Int(0)],
-        [Txn.on_completion() == OnComplete.CloseOut, Int(0)],
-        [Txn.on_completion() == OnComplete.OptIn, Int(0)],
-        # Must be a NoOp transaction
-        [Txn.application_args[0] == Bytes("To_ALGO"), GARD_TO_ALGO],
-        [Txn.application_args[0] == Bytes("To_GARD"), ALGO_TO_GARD],
-        [Txn.application_args[0] == Bytes("Opt_In"), opt_in],
-        [Txn.application_args[0] == Bytes("Claim"), claim],
-        [Txn.application_args[0] == Bytes("Payout"), payout]
-        
+        on_create,
+        [
+            (OnComplete.DeleteApplication, Int(0)),
+            (OnComplete.UpdateApplication, Int(0)),
+            (OnComplete.CloseOut, Int(0)),
+            (OnComplete.OptIn, Int(0)),
+        ],
+        # NoOp transactions
+        [
+            ("To_ALGO", GARD_TO_ALGO),
+            ("To_GARD", ALGO_TO_GARD),
+            ("Opt_In", opt_in),
+            ("Claim", claim),
+            ("Payout", payout),
+        ],
+        hotness
     )
 
 def treasury_clear_state():
@@ -0,0 +1,126 @@
+# txn_pipeline.py
+
+'''
+Pipelined transaction submission.
+
+Signed transactions and groups are sent as soon as the groups they depend on
+have confirmed, and each submission returns a future for its confirmation.
+Independent work is therefore confirmed in the same round instead of one
+round per step, as with chained send_wait_txn calls.
+'''
+
+import threading
+from concurrent.futures import CancelledError, Future, InvalidStateError, ThreadPoolExecutor
+import round_watcher
+
+class DependencyFailed(Exception):
+    def __init__(self, task, error):
+        super().__init__("{} not sent, a dependency failed: {}".format(task or "group", error))
+        self.task = task
+        self.error = error
+
+class Pipeline:
+
+    def __init__(self, client, max_sends=4):
+        self.client = client
+        self.watcher = round_watcher.watcher_for(client)
+        # Groups released by a dependency are built and sent here, not on the
+        # thread that resolved the dependency (usually the round watcher's)
+        self._executor = ThreadPoolExecutor(max_sends, thread_name_prefix="pipeline")
+
+    def close(self):
+        self._executor.shutdown()
+
+    def submit(self, stxns, after=(), task=None):
+        """
+        Sends a signed transaction, or a list of signed transactions forming a group,
+        once every future in `after` has confirmed. `stxns` may also be a
+        zero-argument callable returning them, which is only called then, for
+        groups whose contents depend on when they are sent.
+
+        Returns a Future resolving to the pending transaction info of the
+        (first) transaction once confirmed.
+        """
+        result = Future()
+        after = list(after)
+        if not after:
+            self._send(stxns, result)
+            return result
+
+        remaining = [len(after)]
+        lock = threading.Lock()
+
+        def on_dependency(dependency):
+            error = _error(dependency)
+            with lock:
+                if result.done():
+                    return
+                if error is not None:
+                    _settle(result, error=DependencyFailed(task, error))
+                    return
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                self._executor.submit(self._send, stxns, result)
+            except RuntimeError as e:
+                # The pipeline was closed
+                _settle(result, error=e)
+
+        for dependency in after:
+            dependency.add_done_callback(on_dependency)
+        return result
+
+    def _send(self, stxns, result):
+        # Nothing is sent for a result the caller cancelled meanwhile
+        if result.done():
+            return
+        try:
+            if callable(stxns):
+                stxns = stxns()
+            group = stxns if isinstance(stxns, list) else [stxns]
+            txid = self.client.send_transactions(group)
+        except Exception as e:
+            _settle(result, error=e)
+            return
+        confirmation = self.watcher.watch(txid, group[0].transaction.last_valid_round)
+        confirmation.add_done_callback(lambda f: _copy_result(f, result))
+
+def _error(future):
+    # exception() raises on a cancelled future, which counts as failed here
+    if future.cancelled():
+        return CancelledError("cancelled")
+    return future.exception()
+
+def _settle(future, info=None, error=None):
+    # Futures already resolved, or cancelled by their caller, are left as they are
+    if future.done():
+        return
+    try:
+        if error is None:
+            future.set_result(info)
+        else:
+            future.set_exception(error)
+    except InvalidStateError:
+        # Resolved or cancelled since the check above
+        pass
+
+def _copy_result(source, target):
+    error = _error(source)
+    if error is not None:
+        _settle(target, error=error)
+    else:
+        _settle(target, source.result())
+
+def wait_all(futures):
+    # Waits for every future, then returns their results or raises the first error
+    results = []
+    errors = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    if errors:
+        raise errors[0]
+    return results
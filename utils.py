@@ -1,13 +1,15 @@
 
-import json, base64
+import json, base64, os
 from algosdk.v2client import algod
 from algosdk import account, mnemonic, encoding
-from algosdk.transaction import LogicSig, calculate_group_id, LogicSigTransaction
+from algosdk.transaction import LogicSig, LogicSigTransaction
 from algosdk.future.transaction import PaymentTxn, AssetTransferTxn, OnComplete
 from pyteal import Mode, compileTeal, Seq, Int, InnerTxnBuilder, TxnField, \
 	TxnType, Global, App, Bytes, Btoi, And, Gtxn, Subroutine, TealType, Expr, \
-	Assert, Itob
-	
+	Assert, Itob, Cond, Txn, ScratchVar
+from pyteal import OnComplete as AppOnComplete
+import teal_cache, round_watcher, params_cache, rpc_metrics, account_index
+
 # TODO: When done, split out the DAO utils from unused other utils
 # TODO: At the very end, cleanup imports
 
@@ -57,44 +59,108 @@ def deposit_cond(txn_index, asset_id):
         Gtxn[txn_index].xfer_asset() == asset_id
     )
 
+class Memo:
+    """
+    An expression evaluated once per call and kept in a scratch slot.
+
+    memoized(arm, *memos) stores every value at the start of the arm, then
+    load() is a single scratch load. Only memoize values that do not change
+    during the arm (external state, constants) and that are used more than once.
+    """
+
+    def __init__(self, expr, type=TealType.uint64):
+        self.expr = expr
+        self.slot = ScratchVar(type)
+
+    def store(self):
+        return self.slot.store(self.expr)
+
+    def load(self):
+        return self.slot.load()
+
+def memoized(expr, *memos):
+    # Stores `memos` before evaluating `expr`
+    return Seq(*[memo.store() for memo in memos], expr)
+
+def dispatch(on_create, on_completion, methods, hotness=None):
+    """
+    Routes an approval program call. Creation is checked first, then NoOp calls
+    are matched on application_args[0] before any other on-completion is tested,
+    so method calls skip the on-completion checks.
+
+    Args:
+        on_create     (Expr) - runs when the app is created
+        on_completion (list) - (OnComplete, Expr) pairs for the other on-completions,
+                               every one of OptIn, CloseOut, UpdateApplication and
+                               DeleteApplication must be handled
+        methods       (list) - (selector, Expr) pairs for NoOp calls
+        hotness       (dict) - selector -> relative call frequency. Each selector compared
+                               before the matching one costs the call opcodes, so
+                               selectors are compared hottest first. Only the order
+                               matters, not the scale. Ties and selectors missing from
+                               it keep their order in `methods`, after the listed ones
+    """
+    handled = [oc.name for oc, _ in on_completion]
+    for oc in (AppOnComplete.OptIn, AppOnComplete.CloseOut, AppOnComplete.UpdateApplication, AppOnComplete.DeleteApplication):
+        if oc.name not in handled:
+            raise ValueError("on-completion {} is not handled".format(oc.name))
+    hotness = hotness or {}
+    ranked = sorted(methods, key=lambda method: -hotness.get(method[0], 0))
+    return Cond(
+        [Txn.application_id() == Int(0), on_create],
+        [Txn.on_completion() == AppOnComplete.NoOp, Cond(*[[Txn.application_args[0] == Bytes(selector), expr] for selector, expr in ranked])],
+        *[[Txn.on_completion() == oc, expr] for oc, expr in on_completion]
+    )
+
 def compile_teal(client, program, mode=Mode.Signature, version=4):
-    compiled = compileTeal(program, mode, version=version)
-    res = client.compile(compiled)
-    ex_comp = base64.decodebytes(res['result'].encode())
-    return ex_comp, {'pk': res['hash']}
+    # Compiles through the artifact cache, algod is only called on a miss
+    artifact = teal_cache.default_cache.compile(client, program, mode, version)
+    return artifact.program, {'pk': artifact.hash}
+
+def compile_program(client, builder, *args, mode=Mode.Signature, version=4, **kwargs):
+    # Like compile_teal, but takes the PyTeal builder and its arguments so a
+    # cache hit also skips building the program
+    recipe = teal_cache.recipe_key(builder, args, kwargs, mode, version)
+    artifact = teal_cache.default_cache.compile(client, lambda: builder(*args, **kwargs), mode, version, recipe=recipe)
+    return artifact.program, {'pk': artifact.hash}
 
 # Connects to testnet
 # One can obtain a free API key from PureStake at https://developer.purestake.io/signup
-def algod_client():
-    algod_address = "https://mainnet-algorand.api.purestake.io/ps2"
+# GARD_ALGOD_ADDRESS and GARD_ALGOD_TOKEN override the endpoint, e.g. to use fake_algod
+def algod_client(address=None, token=None):
+    algod_address = address or os.environ.get("GARD_ALGOD_ADDRESS", "https://mainnet-algorand.api.purestake.io/ps2")
     # algod_address = "https://testnet-algorand.api.purestake.io/ps2"
-    algod_token = ""
+    algod_token = token if token is not None else os.environ.get("GARD_ALGOD_TOKEN", "")
     headers = {
        "X-API-Key": algod_token,
     }
-    return algod.AlgodClient(algod_token, algod_address, headers)
+    client = algod.AlgodClient(algod_token, algod_address, headers)
+    # GARD_RPC_METRICS records per-endpoint calls, bytes and latency (see rpc_metrics)
+    if os.environ.get("GARD_RPC_METRICS"):
+        rpc_metrics.instrument(client)
+    return client
     
+def suggested_params(client):
+	# Copy of the suggested params for the current round, fetched at most once per round
+	return params_cache.cache_for(client).get()
+
 def get_params(client, fee=1000, flat_fee=True):
-	params = client.suggested_params()
+	params = suggested_params(client)
 	params.fee = fee
 	params.flat_fee = flat_fee
 	return params
 
 # Helper function that waits for a given txid to be confirmed by the network
-def wait_for_confirmation(client, txid):
-    last_round = client.status().get('last-round')
-    txinfo = client.pending_transaction_info(txid)
-    while not (txinfo.get('confirmed-round') and txinfo.get('confirmed-round') > 0):
-      #  print("Waiting for confirmation...")
-        last_round += 1
-        client.status_after_block(last_round)
-        txinfo = client.pending_transaction_info(txid)
+# Confirmation is tracked by the client's shared round watcher, so concurrent
+# waiters don't each poll the node
+def wait_for_confirmation(client, txid, last_valid=None):
+    txinfo = round_watcher.watcher_for(client).watch(txid, last_valid).result()
     # print("Transaction {} confirmed in round {}.".format(txid, txinfo.get('confirmed-round')))
     return txinfo
 
+# Reads the account without its asset and app lists, see account_index
 def get_min_balance(client, address):
-    info = client.account_info(address)
-    return 101000 + (100000*(len(info["apps-local-state"])+len(info["assets"])+len(info["created-assets"])+len(info["created-apps"]))) + (50000*info["apps-total-schema"]["num-byte-slice"]) + (28500*info["apps-total-schema"]["num-uint"])
+    return account_index.min_balance(account_index.account_summary(client, address))
 
 def send_wait_txn(client, stxn, task=None, multi=False):
 	
@@ -110,18 +176,10 @@ def send_wait_txn(client, stxn, task=None, multi=False):
 		message += ", action: " + task
 	# print(message)
 	
-	wait_for_confirmation(client, txid)
+	first = stxn[0] if multi else stxn
+	wait_for_confirmation(client, txid, first.transaction.last_valid_round)
 	
 	return txid
 	
 def app_address(app_id):
 	return encoding.encode_address(encoding.checksum(b'appID'+(app_id).to_bytes(8, 'big')))
-	
-def groupTxns(sender, *args):
-	# Groups transactions
-    gid = calculate_group_id(args)
-    res = []
-    for arg in args:
-        arg.group = gid
-        res.append(arg.sign(sender['key']))
-    return res
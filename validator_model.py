@@ -0,0 +1,364 @@
+# validator_model.py
+
+'''
+Offline pre-validation of CDP groups.
+
+A Python model of the arithmetic and group-shape checks of
+price_validator.approval_program (NewPosition, MoreGARD, CloseFee,
+CloseNoFee and the CloseOut liquidate arm) and of reserve_logic.reserve
+(NewPosition and MoreGARD), evaluated on unsigned algosdk transactions
+against a Context holding the chain state the contracts read.
+
+validate() returns every failing predicate by name, so a group with a
+collateral ratio just under 7/5, an open fee under the fee formula or a
+NewPosition timestamp outside +-30s is caught before it is signed and sent.
+Predicates follow TEAL semantics: fields of another transaction type read
+as zero, and uint64 overflow, underflow or a missing group index fails the
+predicate as it fails the program.
+'''
+
+from collections import namedtuple
+from algosdk import encoding
+from cdp_template import MAX_CDP_ID
+from wide_math import mul_div_ref
+
+UINT64_MAX = 2**64 - 1
+ZERO_ADDRESS = encoding.encode_address(bytes(32))
+
+# Must match price_validator.approval_program
+NO_FEE_DURATION = 5
+TIMESTAMP_TOLERANCE = 30
+MIN_MINT = 1000000
+MAX_NEW_POSITION = 60000000000000000
+MAX_DEBT = 600000000000000000
+
+# program is "validator" or "reserve", index the group index of the checked transaction
+Failure = namedtuple("Failure", ["program", "index", "predicate", "error"])
+
+class Rejected(Exception):
+    def __init__(self, failures):
+        super().__init__("; ".join("{} txn {}: {}".format(f.program, f.index, f.predicate) for f in failures))
+        self.failures = failures
+
+class Context:
+    """
+    Chain state the contracts read.
+
+    Args:
+        stable_id, validator_id, price_app_id, open_app_id, closing_app_id (int)
+        reserve  (str) - reserve address, the GARD asset's reserve
+        devfee   (str) - devfee address given to reserve()
+        template (CDPTemplate) - escrow template given to reserve()
+        price, decimals (int) - the oracle's globals
+        open_fee, closing_fee (int) - "Winner" of the fee vote apps
+        now      (int) - latest block timestamp
+        local    (dict) - address -> validator local state, accounts not opted in are absent
+        balances (dict) - address -> microAlgos
+    """
+
+    def __init__(self, stable_id, validator_id, price_app_id, open_app_id, closing_app_id, reserve, devfee,
+                 template, price, decimals, open_fee, closing_fee, now, local=None, balances=None):
+        self.stable_id = stable_id
+        self.validator_id = validator_id
+        self.price_app_id = price_app_id
+        self.open_app_id = open_app_id
+        self.closing_app_id = closing_app_id
+        self.reserve = reserve
+        self.devfee = devfee
+        self.template = template
+        self.price = price
+        self.decimals = decimals
+        self.open_fee = open_fee
+        self.closing_fee = closing_fee
+        self.now = now
+        self.local = local if local is not None else {}
+        self.balances = balances if balances is not None else {}
+
+    def local_get(self, address, key):
+        # Missing keys read as 0, accounts that have not opted in fail
+        return self.local[address].get(key, 0)
+
+    def balance(self, address):
+        return self.balances.get(address, 0)
+
+# uint64 arithmetic, failing as TEAL does
+
+def _u64(value):
+    if not 0 <= value <= UINT64_MAX:
+        raise ArithmeticError("{} is not a uint64".format(value))
+    return value
+
+def _add(*values):
+    return _u64(sum(values))
+
+def _sub(a, b):
+    return _u64(a - b)
+
+def _mul(a, b):
+    return _u64(a * b)
+
+def _scale(decimals):
+    return _u64(10**decimals)
+
+# Transaction fields as TEAL reads them, zero for other transaction types
+
+def _zero(address):
+    return address or ZERO_ADDRESS
+
+def type_enum(txn):
+    return txn.type
+
+def amount(txn):
+    return txn.amt if txn.type == "pay" else 0
+
+def receiver(txn):
+    return txn.receiver if txn.type == "pay" else ZERO_ADDRESS
+
+def close_remainder_to(txn):
+    return _zero(txn.close_remainder_to) if txn.type == "pay" else ZERO_ADDRESS
+
+def asset_amount(txn):
+    return txn.amount if txn.type == "axfer" else 0
+
+def asset_receiver(txn):
+    return txn.receiver if txn.type == "axfer" else ZERO_ADDRESS
+
+def asset_close_to(txn):
+    return _zero(txn.close_assets_to) if txn.type == "axfer" else ZERO_ADDRESS
+
+def xfer_asset(txn):
+    return txn.index if txn.type == "axfer" else 0
+
+def application_id(txn):
+    return txn.index if txn.type == "appl" else 0
+
+def on_completion(txn):
+    return int(txn.on_complete) if txn.type == "appl" else 0
+
+def rekey_to(txn):
+    return _zero(txn.rekey_to)
+
+def app_arg(txn, i):
+    return txn.app_args[i]
+
+def btoi(value):
+    if len(value) > 8:
+        raise ArithmeticError("btoi of more than 8 bytes")
+    return int.from_bytes(value, "big")
+
+# Arms, as lists of (predicate, check) in contract order
+
+def _auction_price(ctx, debt, start):
+    price = _mul(debt, 23) // 20
+    if ctx.now > start:
+        decay = _mul(debt, ctx.now - start) // 2400
+        price = price - decay if price > decay else 0
+    return price
+
+def _new_position(g, i, ctx):
+    t = g[i]
+    escrow = lambda: t.accounts[0]
+    minted = lambda: asset_amount(g[3])
+    unix_start = lambda: btoi(app_arg(g[0], 1))
+    return [
+        ("applications[1] is the price app", lambda: t.foreign_apps[0] == ctx.price_app_id),
+        ("applications[2] is the open fee app", lambda: t.foreign_apps[1] == ctx.open_app_id),
+        ("assets[0] is GARD", lambda: t.foreign_assets[0] == ctx.stable_id),
+        ("no rekey", lambda: rekey_to(t) == ZERO_ADDRESS),
+        ("timestamp arg not too far behind", lambda: ctx.now <= _add(unix_start(), TIMESTAMP_TOLERANCE)),
+        ("timestamp arg not too far ahead", lambda: ctx.now >= _sub(unix_start(), TIMESTAMP_TOLERANCE)),
+        ("minted GARD at most 6e16", lambda: minted() <= MAX_NEW_POSITION),
+        ("minted GARD at least 1 GARD", lambda: minted() >= MIN_MINT),
+        ("open fee covers GARD * open_fee / 1000 in ALGO",
+            lambda: amount(g[2]) >= mul_div_ref(_mul(minted(), ctx.open_fee), _scale(ctx.decimals), _mul(1000, ctx.price))),
+        ("collateral ratio at least 7/5",
+            lambda: _mul(minted(), 7) // 5 <= mul_div_ref(_add(ctx.balance(escrow()), amount(g[1])), ctx.price, _scale(ctx.decimals))),
+        ("escrow has no open position", lambda: ctx.local_get(escrow(), "GARD_DEBT") == 0),
+        ("GARD comes from the reserve", lambda: ctx.reserve == g[3].sender),
+    ]
+
+def _more_gard(g, i, ctx):
+    t = g[i]
+    minted = lambda: asset_amount(g[2])
+    debt = lambda: ctx.local_get(t.sender, "GARD_DEBT")
+    return [
+        ("applications[1] is the price app", lambda: t.foreign_apps[0] == ctx.price_app_id),
+        ("applications[2] is the open fee app", lambda: t.foreign_apps[1] == ctx.open_app_id),
+        ("assets[0] is GARD", lambda: t.foreign_assets[0] == ctx.stable_id),
+        ("no rekey", lambda: rekey_to(t) == ZERO_ADDRESS),
+        ("position is open", lambda: debt() != 0),
+        ("fee not paid by the reserve", lambda: g[1].sender != ctx.reserve),
+        ("GARD comes from the reserve", lambda: g[2].sender == ctx.reserve),
+        ("GARD not sent by the caller", lambda: g[2].sender != g[0].sender),
+        ("call is the first transaction", lambda: t.sender == g[0].sender),
+        ("call fee is 0", lambda: g[0].fee == 0),
+        ("minted GARD at least 1 GARD", lambda: minted() >= MIN_MINT),
+        ("debt stays at most 6e17", lambda: minted() <= _sub(MAX_DEBT, debt())),
+        ("open fee covers GARD * open_fee / 1000 in ALGO",
+            lambda: amount(g[1]) >= mul_div_ref(_mul(minted(), ctx.open_fee), _scale(ctx.decimals), _mul(1000, ctx.price))),
+        ("collateral ratio at least 7/5",
+            lambda: _mul(_add(debt(), minted()), 7) // 5 <= mul_div_ref(ctx.balance(t.sender), ctx.price, _scale(ctx.decimals))),
+    ]
+
+def _close_with_fee(g, i, ctx):
+    t = g[i]
+    return [
+        ("applications[1] is the price app", lambda: t.foreign_apps[0] == ctx.price_app_id),
+        ("applications[2] is the closing fee app", lambda: t.foreign_apps[1] == ctx.closing_app_id),
+        ("assets[0] is GARD", lambda: t.foreign_assets[0] == ctx.stable_id),
+        ("no rekey", lambda: rekey_to(t) == ZERO_ADDRESS),
+        ("repays GARD", lambda: xfer_asset(g[1]) == g[0].foreign_assets[0]),
+        ("txn 2 not rekeyed", lambda: rekey_to(g[2]) == ZERO_ADDRESS),
+        ("txn 3 not rekeyed", lambda: rekey_to(g[3]) == ZERO_ADDRESS),
+        ("repays to the reserve", lambda: asset_receiver(g[1]) == ctx.reserve),
+        ("txn 2 sent by the escrow", lambda: g[2].sender == g[0].sender),
+        ("txn 3 sent by the escrow", lambda: g[3].sender == g[2].sender),
+        ("txn 1 is an asset transfer", lambda: type_enum(g[1]) == "axfer"),
+        ("txn 3 is a payment", lambda: type_enum(g[3]) == "pay"),
+        ("escrow transactions pay no fee", lambda: _add(g[0].fee, g[2].fee, g[3].fee) == 0),
+        ("txn 2 calls the validator", lambda: application_id(g[0]) == application_id(g[2])),
+        ("repays the whole debt", lambda: asset_amount(g[1]) == ctx.local_get(t.sender, "GARD_DEBT")),
+        ("closing fee covers GARD * closing_fee / 1000 in ALGO",
+            lambda: amount(g[3]) >= mul_div_ref(_mul(asset_amount(g[1]), ctx.closing_fee), _scale(ctx.decimals), _mul(1000, ctx.price))),
+    ]
+
+def _close_no_fee(g, i, ctx):
+    t = g[i]
+    return [
+        ("no rekey", lambda: rekey_to(t) == ZERO_ADDRESS),
+        ("repays GARD", lambda: xfer_asset(g[1]) == g[0].foreign_assets[0]),
+        ("assets[0] is GARD", lambda: t.foreign_assets[0] == ctx.stable_id),
+        ("txn 2 not rekeyed", lambda: rekey_to(g[2]) == ZERO_ADDRESS),
+        ("txn 3 not rekeyed", lambda: rekey_to(g[3]) == ZERO_ADDRESS),
+        ("within the no fee window",
+            lambda: ctx.now <= _add(ctx.local_get(t.sender, "UNIX_START"), 60 * NO_FEE_DURATION)),
+        ("txn 2 sent by the escrow", lambda: g[2].sender == g[0].sender),
+        ("txn 3 sent by the escrow", lambda: g[3].sender == g[2].sender),
+        ("txn 1 is an asset transfer", lambda: type_enum(g[1]) == "axfer"),
+        ("txn 3 is a payment", lambda: type_enum(g[3]) == "pay"),
+        ("txn 3 closes the escrow", lambda: close_remainder_to(g[3]) != ZERO_ADDRESS),
+        ("txn 2 calls the validator", lambda: application_id(g[0]) == application_id(g[2])),
+        ("escrow transactions pay no fee", lambda: _add(g[0].fee, g[2].fee, g[3].fee) == 0),
+        ("repays to the reserve", lambda: asset_receiver(g[1]) == ctx.reserve),
+        ("repays the whole debt", lambda: asset_amount(g[1]) == ctx.local_get(t.sender, "GARD_DEBT")),
+    ]
+
+def _liquidate(g, i, ctx):
+    # Indices are relative to the CloseOut at i, see price_validator's liquidate
+    t = g[i]
+    rel = lambda k: g[i + k]
+    debt = lambda: ctx.local_get(t.sender, "GARD_DEBT")
+    start = lambda: ctx.local_get(t.sender, "UNIX_START")
+    return [
+        ("no rekey", lambda: rekey_to(t) == ZERO_ADDRESS),
+        ("assets[0] is GARD", lambda: t.foreign_assets[0] == ctx.stable_id),
+        ("txn +1 not rekeyed", lambda: rekey_to(rel(1)) == ZERO_ADDRESS),
+        ("auction started", lambda: start() % 2 == 1),
+        ("txn +1 sent by the escrow", lambda: t.sender == rel(1).sender),
+        ("bid not sent by the escrow", lambda: rel(1).sender != rel(2).sender),
+        ("txn +3 sent by the bidder", lambda: rel(2).sender == rel(3).sender),
+        ("txn +4 sent by the bidder", lambda: rel(3).sender == rel(4).sender),
+        ("txn +1 is a payment", lambda: type_enum(rel(1)) == "pay"),
+        ("txn +1 closes the escrow", lambda: close_remainder_to(rel(1)) != ZERO_ADDRESS),
+        ("debt repaid to the reserve", lambda: asset_receiver(rel(2)) == ctx.reserve),
+        ("bid covers max(GARD_DEBT, auction_price)",
+            lambda: _add(asset_amount(rel(2)), asset_amount(rel(3)), asset_amount(rel(4))) >= max(debt(), _auction_price(ctx, debt(), start()))),
+        ("txn +2 repays the whole debt", lambda: asset_amount(rel(2)) == debt()),
+        ("devfee leg is a quarter of the user leg", lambda: asset_amount(rel(3)) == asset_amount(rel(4)) // 4),
+        ("txn +3 sends GARD", lambda: xfer_asset(rel(3)) == ctx.stable_id),
+        ("txn +4 sends GARD", lambda: xfer_asset(rel(4)) == ctx.stable_id),
+        ("escrow transactions pay no fee", lambda: _add(t.fee, rel(1).fee) == 0),
+    ]
+
+VALIDATOR_ARMS = {
+    b"NewPosition": _new_position,
+    b"MoreGARD": _more_gard,
+    b"CloseFee": _close_with_fee,
+    b"CloseNoFee": _close_no_fee,
+}
+
+def _reserve_new_position(g, i, ctx):
+    t = g[i]
+    cdp_id = lambda: g[0].foreign_assets[1]
+    def escrow():
+        if cdp_id() > MAX_CDP_ID:
+            raise ArithmeticError("cdp_id out of range")
+        return ctx.template.address(g[0].sender, cdp_id())
+    return [
+        ("group of 4", lambda: len(g) == 4),
+        ("txn 0 is a NoOp call", lambda: on_completion(g[0]) == 0),
+        ("txn 0 calls the validator", lambda: application_id(g[0]) == ctx.validator_id),
+        ("txn 0 is NewPosition", lambda: app_arg(g[0], 0) == b"NewPosition"),
+        ("accounts[1] receives the collateral", lambda: g[0].accounts[0] == receiver(g[1])),
+        ("assets[0] is GARD", lambda: g[0].foreign_assets[0] == ctx.stable_id),
+        ("cdp_id at most {}".format(MAX_CDP_ID), lambda: cdp_id() <= MAX_CDP_ID),
+        ("txn 1 is a payment", lambda: type_enum(g[1]) == "pay"),
+        ("collateral sent by the caller", lambda: g[1].sender == g[0].sender),
+        ("collateral goes to the user's escrow", lambda: receiver(g[1]) == escrow()),
+        ("txn 2 is a payment", lambda: type_enum(g[2]) == "pay"),
+        ("fee sent by the caller", lambda: g[2].sender == g[1].sender),
+        ("fee goes to devfee", lambda: receiver(g[2]) == ctx.devfee),
+        ("txn 3 is an asset transfer", lambda: type_enum(g[3]) == "axfer"),
+        ("txn 3 sends GARD", lambda: xfer_asset(g[3]) == ctx.stable_id),
+        ("reserve pays no fee", lambda: g[3].fee == 0),
+        ("no asset close", lambda: asset_close_to(g[3]) == ZERO_ADDRESS),
+        ("no rekey", lambda: rekey_to(g[3]) == ZERO_ADDRESS),
+    ]
+
+def _reserve_more_gard(g, i, ctx):
+    return [
+        ("group of 3", lambda: len(g) == 3),
+        ("txn 0 is a NoOp call", lambda: on_completion(g[0]) == 0),
+        ("txn 0 calls the validator", lambda: application_id(g[0]) == ctx.validator_id),
+        ("txn 0 is MoreGARD", lambda: app_arg(g[0], 0) == b"MoreGARD"),
+        ("assets[0] is GARD", lambda: g[0].foreign_assets[0] == ctx.stable_id),
+        ("txn 2 is an asset transfer", lambda: type_enum(g[2]) == "axfer"),
+        ("reserve pays no fee", lambda: g[2].fee == 0),
+        ("no asset close", lambda: asset_close_to(g[2]) == ZERO_ADDRESS),
+        ("no rekey", lambda: rekey_to(g[2]) == ZERO_ADDRESS),
+    ]
+
+def _run(program, index, predicates):
+    failures = []
+    for predicate, check in predicates:
+        try:
+            if not check():
+                failures.append(Failure(program, index, predicate, None))
+        except (ArithmeticError, IndexError, KeyError, TypeError) as e:
+            failures.append(Failure(program, index, predicate, e))
+    return failures
+
+def _arms(group, ctx):
+    # (program, index, arm) for every transaction the modelled programs approve
+    for i, txn in enumerate(group):
+        if txn.type == "appl" and txn.index == ctx.validator_id:
+            completion = on_completion(txn)
+            if completion == 0:
+                selector = txn.app_args[0] if txn.app_args else None
+                if selector in VALIDATOR_ARMS:
+                    yield "validator", i, VALIDATOR_ARMS[selector]
+            elif completion == 2:
+                yield "validator", i, _liquidate
+        elif txn.sender == ctx.reserve and txn.type == "axfer" and txn.amount:
+            if len(group) == 4:
+                yield "reserve", i, _reserve_new_position
+            else:
+                yield "reserve", i, _reserve_more_gard
+
+def validate(group, ctx):
+    """
+    Returns the Failures of `group`, a list of unsigned transactions, against
+    the modelled validator arms and reserve branches. Empty if every modelled
+    check passes. Signatures, the escrow's own LogicSig and ledger rules such
+    as balances and fees are not modelled.
+    """
+    failures = []
+    for program, index, arm in _arms(group, ctx):
+        failures += _run(program, index, arm(group, index, ctx))
+    return failures
+
+def check(group, ctx):
+    # Raises Rejected with every failing predicate
+    failures = validate(group, ctx)
+    if failures:
+        raise Rejected(failures)
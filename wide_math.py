@@ -0,0 +1,201 @@
+# wide_math.py
+
+'''
+128-bit intermediate arithmetic on uint64s.
+
+mul_div(a, b, c) computes floor(a * b / c) with mulw and divw, where the
+byte-math form Btoi(BytesDiv(BytesMul(Itob(a), Itob(b)), Itob(c))) costs
+three itobs, two 20 unit byte ops and a btoi. mul_div_ceil rounds up, and
+wide_le/wide_lt compare two 128-bit products without dividing.
+
+Every helper fails the program where the byte-math form would: a zero
+divisor or a result that does not fit a uint64. The *_ref functions are the
+Python reference, raising ArithmeticError where the program fails, and
+`python wide_math.py` checks the compiled helpers against them.
+'''
+
+from pyteal import Expr, TealType, Op, TealOp, TealSimpleBlock, TealCompileError
+from pyteal.types import require_type
+
+UINT64_MAX = 2**64 - 1
+
+class _WideExpr(Expr):
+    # Evaluates `steps` in order, each either an argument Expr or an (Op, *immediates) tuple
+
+    def __init__(self, name, steps, type=TealType.uint64):
+        super().__init__()
+        for step in steps:
+            if isinstance(step, Expr):
+                require_type(step, TealType.uint64)
+        self.name = name
+        self.steps = steps
+        self.type = type
+
+    def __teal__(self, options):
+        if options.version < Op.divw.min_version:
+            raise TealCompileError("{} requires TEAL version {} or higher".format(self.name, Op.divw.min_version), self)
+        start = end = TealSimpleBlock([])
+        for step in self.steps:
+            if isinstance(step, Expr):
+                argStart, argEnd = step.__teal__(options)
+                end.setNextBlock(argStart)
+                end = argEnd
+            else:
+                block = TealSimpleBlock([TealOp(self, *step)])
+                end.setNextBlock(block)
+                end = block
+        return start, end
+
+    def __str__(self):
+        return "({} {})".format(self.name, " ".join(str(step) for step in self.steps if isinstance(step, Expr)))
+
+    def type_of(self):
+        return self.type
+
+    def has_return(self):
+        return False
+
+# Leaves the 128-bit product as big-endian bytes, high word first
+_PRODUCT_BYTES = [(Op.mulw,), (Op.swap,), (Op.itob,), (Op.swap,), (Op.itob,), (Op.concat,)]
+
+def mul_div(a, b, c):
+    """floor(a * b / c), failing if c is 0 or the result overflows a uint64"""
+    return _WideExpr("mul_div", [a, b, (Op.mulw,), c, (Op.divw,)])
+
+def mul_div_ceil(a, b, c):
+    """ceil(a * b / c), failing if c is 0 or the result overflows a uint64"""
+    return _WideExpr("mul_div_ceil", [
+        a, b, (Op.mulw,),                     # hi lo
+        c, (Op.dup,), (Op.cover, 3),          # c hi lo c
+        (Op.int, 1), (Op.minus,), (Op.addw,), # c hi carry lo'  (c - 1 fails for c = 0)
+        (Op.cover, 2), (Op.add,), (Op.swap,), # c hi' lo'
+        (Op.uncover, 2), (Op.divw,),
+    ])
+
+def wide_le(a, b, c, d):
+    """a * b <= c * d"""
+    return _WideExpr("wide_le", [a, b] + _PRODUCT_BYTES + [c, d] + _PRODUCT_BYTES + [(Op.b_le,)])
+
+def wide_lt(a, b, c, d):
+    """a * b < c * d"""
+    return _WideExpr("wide_lt", [a, b] + _PRODUCT_BYTES + [c, d] + _PRODUCT_BYTES + [(Op.b_lt,)])
+
+# Python reference
+
+def _check_uint64(*values):
+    for value in values:
+        if not 0 <= value <= UINT64_MAX:
+            raise ArithmeticError("{} is not a uint64".format(value))
+
+def mul_div_ref(a, b, c):
+    _check_uint64(a, b, c)
+    if c == 0:
+        raise ArithmeticError("division by zero")
+    result = a * b // c
+    _check_uint64(result)
+    return result
+
+def mul_div_ceil_ref(a, b, c):
+    _check_uint64(a, b, c)
+    if c == 0:
+        raise ArithmeticError("division by zero")
+    result = -(-a * b // c)
+    _check_uint64(result)
+    return result
+
+def wide_le_ref(a, b, c, d):
+    _check_uint64(a, b, c, d)
+    return int(a * b <= c * d)
+
+def wide_lt_ref(a, b, c, d):
+    _check_uint64(a, b, c, d)
+    return int(a * b < c * d)
+
+def _evaluate(teal):
+    # Runs the straight-line programs the helpers compile to, enough to check them
+    # without a node. Returns the top of the stack, raises ArithmeticError on failure
+    stack = []
+    def pop(n):
+        values = stack[-n:]
+        del stack[-n:]
+        return values
+    for line in teal.splitlines():
+        op, *args = line.split()
+        if op.startswith("#"):
+            continue
+        elif op == "int":
+            stack.append(int(args[0]))
+        elif op == "mulw":
+            x, y = pop(2)
+            stack += divmod(x * y, 2**64)
+        elif op == "addw":
+            x, y = pop(2)
+            stack += divmod(x + y, 2**64)
+        elif op == "divw":
+            hi, lo, y = pop(3)
+            if y == 0:
+                raise ArithmeticError("division by zero")
+            _check_uint64((hi * 2**64 + lo) // y)
+            stack.append((hi * 2**64 + lo) // y)
+        elif op == "+":
+            x, y = pop(2)
+            _check_uint64(x + y)
+            stack.append(x + y)
+        elif op == "-":
+            x, y = pop(2)
+            _check_uint64(x - y)
+            stack.append(x - y)
+        elif op == "dup":
+            stack.append(stack[-1])
+        elif op == "swap":
+            stack[-2:] = stack[:-3:-1]
+        elif op == "cover":
+            stack.insert(-int(args[0]), stack.pop())
+        elif op == "uncover":
+            stack.append(stack.pop(-int(args[0]) - 1))
+        elif op == "itob":
+            stack.append(stack.pop().to_bytes(8, "big"))
+        elif op == "concat":
+            x, y = pop(2)
+            stack.append(x + y)
+        elif op in ("b<=", "b<"):
+            x, y = (int.from_bytes(v, "big") for v in pop(2))
+            stack.append(int(x <= y if op == "b<=" else x < y))
+        elif op == "return":
+            break
+        else:
+            raise ValueError("unsupported op " + op)
+    return stack[-1]
+
+def check(samples=2000, seed=0):
+    # Compiles each helper on random and edge-case inputs and compares it with the reference
+    import random
+    from pyteal import compileTeal, Mode, Int
+    rng = random.Random(seed)
+    edges = [0, 1, 2, 3, 7, 10**6, 2**32 - 1, 2**32, 2**63, UINT64_MAX - 1, UINT64_MAX]
+    def operand():
+        kind = rng.random()
+        if kind < 0.3:
+            return rng.choice(edges)
+        if kind < 0.6:
+            return rng.getrandbits(rng.randint(1, 32))
+        return rng.getrandbits(64)
+    helpers = [(mul_div, mul_div_ref, 3), (mul_div_ceil, mul_div_ceil_ref, 3), (wide_le, wide_le_ref, 4), (wide_lt, wide_lt_ref, 4)]
+    for helper, reference, arity in helpers:
+        for _ in range(samples):
+            args = [operand() for _ in range(arity)]
+            try:
+                expected = reference(*args)
+            except ArithmeticError:
+                expected = None
+            teal = compileTeal(helper(*[Int(arg) for arg in args]), Mode.Application, version=6, assembleConstants=False)
+            try:
+                actual = _evaluate(teal)
+            except ArithmeticError:
+                actual = None
+            if actual != expected:
+                raise AssertionError("{}{}: got {}, expected {}".format(helper.__name__, tuple(args), actual, expected))
+        print("{:<14} {} samples ok".format(helper.__name__, samples))
+
+if __name__ == "__main__":
+    check()